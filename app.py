@@ -1,38 +1,40 @@
-from shiny import App, ui, render, reactive, Inputs, Outputs, Session
+import time
+APP_STARTED_AT = time.perf_counter()
+
+from shiny import App, ui, render, reactive, run_app, Inputs, Outputs, Session
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse
+from starlette.routing import Mount, Route
 import asyncio
 from datetime import datetime
 from pathlib import Path
 
 # Import project modules
 from config.settings import WHIConfig
-from rag.system import WHIRAGSystem
-from handlers import UIComponents, MessageHandlers, HistoryHandlers, QuestionProcessor
+from rag.startup import WHISystemStartup
+from monitoring.metrics import METRICS
+from handlers import UIComponents, MessageHandlers, HistoryHandlers, QuestionProcessor, StreamingAnswer
 from handlers.utils import UIUtils
 
-# 简化系统初始化
+# The RAG system warms up in the background while the app already serves pages
 config = WHIConfig()
-rag_system = None
-system_ready = False
-
-try:
-    rag_system = WHIRAGSystem()
-    system_ready = True
-    print("✅ RAG system initialized successfully")
-except Exception as e:
-    print(f"⚠️ RAG system initialization failed: {e}")
-    print("🔄 Using demo mode")
+startup = WHISystemStartup(started_at=APP_STARTED_AT).start()
+METRICS.add_collector(lambda: [("whi_system_ready", {}, 1 if startup.is_ready else 0)])
 
 app_ui = UIUtils.create_app_ui()
 
 def server(input: Inputs, output: Outputs, session: Session):
+    startup.record_first_page()
+    
     # Reactive values
     chat_messages = reactive.Value([])
     current_answer = reactive.Value("")
     is_processing = reactive.Value(False)
     output_language = reactive.Value("english")
+    live_answer = StreamingAnswer()  # Detailed answer while it is still being generated
     
     # Initialize processors
-    question_processor = QuestionProcessor(rag_system, system_ready)
+    question_processor = QuestionProcessor(startup.rag_system, startup.is_ready, startup)
     history_manager = HistoryHandlers()
     message_handlers = MessageHandlers(question_processor, history_manager)
     
@@ -45,7 +47,7 @@ def server(input: Inputs, output: Outputs, session: Session):
         output_language.set(new_lang)
     
     # Setup handlers
-    message_handlers.setup_handlers(input, chat_messages, current_answer, is_processing, output_language)
+    message_handlers.setup_handlers(input, chat_messages, current_answer, is_processing, output_language, live_answer)
     history_manager.setup_navigation_handlers(input)
     
     # 修改页面跳转处理器，只处理Enter键触发的事件
@@ -66,7 +68,9 @@ def server(input: Inputs, output: Outputs, session: Session):
     @output
     @render.ui
     def chat_system_status():
-        return UIComponents.chat_system_status(system_ready)
+        if not startup.is_done:
+            reactive.invalidate_later(0.5)
+        return UIComponents.chat_system_status(startup.state, startup.message, startup.progress)
     
     @output
     @render.ui
@@ -76,6 +80,13 @@ def server(input: Inputs, output: Outputs, session: Session):
     @output
     @render.ui
     def current_answer_details():
+        # Poll the streaming buffer while the latest answer is being generated
+        if is_processing.get() and history_manager.current_history_index.get() == -1:
+            reactive.invalidate_later(0.25)
+            partial_answer = live_answer.render()
+            if partial_answer:
+                return UIComponents.current_answer_details(partial_answer)
+        
         answer = history_manager.get_current_display_answer(current_answer)
         return UIComponents.current_answer_details(answer)
     
@@ -95,9 +106,16 @@ def server(input: Inputs, output: Outputs, session: Session):
             history_manager.current_history_index.get()
         )
 
-app = App(app_ui, server, static_assets=Path(__file__).parent / "static")
+shiny_app = App(app_ui, server, static_assets=Path(__file__).parent / "static")
+
+async def metrics(request):
+    """Prometheus scrape endpoint."""
+    return PlainTextResponse(METRICS.render(), media_type="text/plain; version=0.0.4")
+
+# /metrics is served next to the Shiny app, which handles every other path
+app = Starlette(routes=[Route("/metrics", metrics), Mount("/", app=shiny_app)])
 
 if __name__ == "__main__":
-    app.run()
+    run_app(app)
 
 
@@ -0,0 +1,52 @@
+"""Benchmark the document context tokens of the answer prompts, plain vs packed.
+
+Run from the repository root after `python -m vector_store.build`:
+
+    python -m benchmarks.context_packing --k 5 --k 20 --budget 1500
+
+Retrieves the documents of the load-test questions as the retrieval node does and
+counts the tokens of the plain context (every document in full) and of the packed
+one (duplicates dropped, repeated fields stated once, compact tables, within
+the token budget). Token counts use the saved tokenizer when it is there
+(`python -m rag.context_packer`), otherwise the estimate.
+"""
+import argparse
+import time
+import numpy as np
+from config.settings import WHIConfig
+from benchmarks.load_benchmark import QUESTIONS
+from rag.context_packer import WHIContextPacker
+from vector_store.manager import WHIVectorStoreManager
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--k", type=int, action="append", help="documents retrieved per question, repeatable")
+    parser.add_argument("--budget", type=int, default=WHIConfig.CONTEXT_TOKEN_BUDGET)
+    args = parser.parse_args()
+    
+    manager = WHIVectorStoreManager()
+    if not manager.load_vector_store():
+        raise Exception(f"Vector store not found at {WHIConfig.VECTOR_STORE_PATH}, build it with `python -m vector_store.build`")
+    packer = WHIContextPacker()
+    packer.counter.load()
+    print(f"{len(QUESTIONS)} questions, budget {args.budget} tokens, "
+          f"{'tokenizer ' + WHIConfig.CONTEXT_TOKENIZER_PATH if packer.counter.exact else 'estimated tokens'}")
+    
+    print(f"{'k':>4}{'plain tokens':>14}{'packed tokens':>15}{'saved':>8}{'docs kept':>11}{'duplicates':>12}{'pack ms':>10}")
+    for k in args.k or [WHIConfig.RETRIEVAL_K]:
+        plain, packed, kept, duplicates, latencies = [], [], [], [], []
+        for question in QUESTIONS:
+            documents = manager.similarity_search(question, k=k, lexical_query=question)
+            plain.append(packer.counter.count(WHIContextPacker.plain_context(documents)))
+            start = time.perf_counter()
+            _, stats = packer.pack_documents(documents, budget=args.budget)
+            latencies.append((time.perf_counter() - start) * 1000)
+            packed.append(stats["context_tokens"])
+            kept.append(stats["documents"] / max(len(documents), 1))
+            duplicates.append(stats["duplicates_dropped"])
+        print(f"{k:>4}{np.mean(plain):>14.0f}{np.mean(packed):>15.0f}{1 - sum(packed) / sum(plain):>8.1%}"
+              f"{np.mean(kept):>11.1%}{np.sum(duplicates):>12}{np.mean(latencies):>10.2f}")
+    print("Means per question; saved is the share of plain context tokens left out of the prompt")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Benchmark document construction in WHIDataProcessor against the row-by-row builder.
+
+Run from the repository root:
+
+    python -m benchmarks.document_construction --repeat 3
+
+Reports wall time and peak traced memory for the previous iterrows/f-string
+builder, the columnar create_documents and the batched iter_document_batches,
+all one document per variable row, and for create_documents merging duplicate
+variable definitions (WHIConfig.MERGE_DUPLICATE_VARIABLES).
+"""
+import argparse
+import time
+import tracemalloc
+from langchain_core.documents import Document
+from config.settings import WHIConfig
+from data.processor import WHIDataProcessor
+
+def iterrows_documents(processor):
+    """Reference implementation: the previous row-by-row builder."""
+    documents = []
+    for _, row in processor.mesa_data.iterrows():
+        content = f"""Variable Name: {row['Variable name']}
+Variable Description: {row['Variable description']}
+Variable Type: {row['Type']}
+Dataset: {row['Dataset name']}
+Study: {row['Study']}
+Database: {row['Database']}"""
+        metadata = {
+            "variable_accession": row['Variable accession'],
+            "variable_name": row['Variable name'],
+            "dataset_accession": row['Dataset accession'],
+            "dataset_name": row['Dataset name'],
+            "study": row['Study'],
+            "database": row['Database'],
+            "type": "variable"
+        }
+        documents.append(Document(page_content=content, metadata=metadata))
+    
+    for _, row in processor.dataset_desc.iterrows():
+        content = f"""Dataset Name: {row['Dataset name']}
+Dataset Description: {row['Dataset description']}
+Study: {row['Study']}
+Database: {row['Database']}
+URL: {row.get('URL', 'N/A')}"""
+        metadata = {
+            "dataset_accession": row['Dataset accession'],
+            "dataset_name": row['Dataset name'],
+            "study": row['Study'],
+            "database": row['Database'],
+            "type": "dataset"
+        }
+        documents.append(Document(page_content=content, metadata=metadata))
+    return documents
+
+def consume_batches(processor, batch_size):
+    """Walk the batched builder the way the embedding stage does, keeping one batch alive."""
+    count = 0
+    for batch in processor.iter_document_batches(batch_size):
+        count += len(batch)
+    return count
+
+def measure(func, repeat):
+    """Return (best wall time in s, peak traced memory in MB)."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak / 2**20
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--batch-size", type=int, default=WHIConfig.DOCUMENT_BATCH_SIZE)
+    args = parser.parse_args()
+    
+    WHIConfig.MERGE_DUPLICATE_VARIABLES = False
+    processor = WHIDataProcessor()
+    processor.load_data()
+    WHIConfig.MERGE_DUPLICATE_VARIABLES = True
+    merging = WHIDataProcessor()
+    merging.load_data()
+    
+    reference = iterrows_documents(processor)
+    columnar = processor.create_documents()
+    assert [(d.page_content, d.metadata) for d in reference] == [(d.page_content, d.metadata) for d in columnar], \
+        "columnar builder output differs from the reference"
+    del reference, columnar
+    
+    builders = {
+        "iterrows": lambda: iterrows_documents(processor),
+        "columnar": processor.create_documents,
+        f"batched({args.batch_size})": lambda: consume_batches(processor, args.batch_size),
+        "merged": merging.create_documents,
+    }
+    
+    print(f"{len(processor.mesa_data) + len(processor.dataset_desc)} documents, "
+          f"{len(merging.variable_definitions) + len(merging.dataset_desc)} with duplicate variable definitions merged")
+    print(f"{'builder':<16}{'best s':>10}{'peak MB':>10}")
+    for name, build in builders.items():
+        seconds, peak_mb = measure(build, args.repeat)
+        print(f"{name:<16}{seconds:>10.3f}{peak_mb:>10.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Benchmark FAISS index types against the exact flat index.
+
+Run from the repository root after `python -m vector_store.build`:
+
+    python -m benchmarks.faiss_index_types --queries 1000 --k 5
+
+Every type in WHIConfig's FAISS options is built from the stored vectors and
+queried with embedded variable descriptions. Reports build time, recall@k against
+flat, p50/p99 single-query latency, serialized size and resident memory added by
+loading the index.
+"""
+import argparse
+import gc
+import os
+import random
+import re
+import time
+import faiss
+import numpy as np
+from config.settings import WHIConfig
+from vector_store import faiss_index
+from vector_store.manager import WHIVectorStoreManager
+
+def resident_mb():
+    """Resident set size of this process in MB, None where /proc is unavailable."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        return None
+
+def query_texts(documents, n_queries, seed):
+    """Sample variable descriptions as query texts."""
+    descriptions = set()
+    for doc in documents:
+        match = re.search(r"^Variable Description: (.*)$", doc.page_content, flags=re.MULTILINE)
+        if match:
+            descriptions.add(match.group(1).strip())
+    rng = random.Random(seed)
+    return rng.sample(sorted(descriptions), min(n_queries, len(descriptions)))
+
+def search_all(index, queries, k):
+    """Return (positions per query, latencies in ms), searching one query at a time like the app."""
+    results = []
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        _, positions = index.search(query[None, :], k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        results.append(positions[0])
+    return results, np.asarray(latencies)
+
+def load_footprint(index):
+    """Return (serialized MB, resident MB added by loading the serialized index)."""
+    data = faiss.serialize_index(index)
+    gc.collect()
+    before = resident_mb()
+    loaded = faiss.deserialize_index(data)
+    after = resident_mb()
+    del loaded
+    resident = after - before if before is not None else None
+    return data.nbytes / 2**20, resident
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--k", type=int, default=WHIConfig.RETRIEVAL_K)
+    parser.add_argument("--types", nargs="+", default=list(faiss_index.INDEX_TYPES), choices=faiss_index.INDEX_TYPES)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    manager = WHIVectorStoreManager()
+    if not manager.load_vector_store():
+        raise SystemExit(f"No vector store at {WHIConfig.VECTOR_STORE_PATH}, build it with `python -m vector_store.build`")
+    if manager.index_type() not in faiss_index.LOSSLESS_TYPES:
+        raise SystemExit(f"Stored index is {manager.index_type()}, rebuild it as flat to benchmark from exact vectors")
+
+    vectors = faiss_index.reconstruct_all(manager.artifact.index)
+    texts = query_texts(manager.get_documents(), args.queries, args.seed)
+    queries = np.asarray(manager.embeddings.embed_documents(texts), dtype=np.float32)
+
+    exact = faiss_index.create_index(vectors, "flat")
+    exact.add(vectors)
+    truth, _ = search_all(exact, queries, args.k)
+
+    print(f"{len(vectors)} vectors, dim {vectors.shape[1]}, {len(queries)} queries, k={args.k}")
+    print(f"{'index':<10}{'build s':>9}{'recall@k':>10}{'p50 ms':>9}{'p99 ms':>9}{'size MB':>9}{'RSS MB':>9}")
+    for index_type in args.types:
+        start = time.perf_counter()
+        index = faiss_index.create_index(vectors, index_type)
+        index.add(vectors)
+        build_seconds = time.perf_counter() - start
+
+        results, latencies = search_all(index, queries, args.k)
+        recall = np.mean([len(set(found) & set(expected)) / args.k for found, expected in zip(results, truth)])
+        size_mb, resident = load_footprint(index)
+        resident = f"{resident:>9.1f}" if resident is not None else f"{'n/a':>9}"
+        print(f"{index_type:<10}{build_seconds:>9.2f}{recall:>10.3f}{np.percentile(latencies, 50):>9.3f}"
+              f"{np.percentile(latencies, 99):>9.3f}{size_mb:>9.1f}{resident}")
+        del index
+
+    print("Query-time settings: "
+          f"nprobe={WHIConfig.FAISS_IVF_NPROBE}, efSearch={WHIConfig.FAISS_HNSW_EF_SEARCH}")
+
+if __name__ == "__main__":
+    main()
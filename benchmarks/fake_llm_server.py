@@ -0,0 +1,154 @@
+"""Local OpenAI-compatible chat-completions server standing in for DashScope.
+
+Run from the repository root:
+
+    python -m benchmarks.fake_llm_server --port 8765 --latency-ms 400 --tokens-per-second 60
+
+and point ``WHIConfig.DASHSCOPE_BASE_URL`` at ``http://127.0.0.1:8765/v1``.
+Responses take a log-normally distributed time to the first token, then produce
+tokens at a fixed rate, streamed as server-sent events when requested. A share of
+requests can fail with HTTP 500 or 429. The reply shape follows the prompt: JSON for
+the classification call, plain text for the chat summary and markdown for the
+detailed answer, with up to ``max_tokens`` tokens. Load-test markers
+(``WHILOAD-<hex>``) found in the prompt are echoed as ``ECHO WHILOAD-<hex>``, so
+clients can tell which question an answer belongs to.
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import re
+import time
+import uuid
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+MARKER = re.compile(r"WHILOAD-[0-9a-f]+")
+
+FILLER = (
+    "The WHI variable is recorded at baseline and follow-up visits, measured in standard clinical units. "
+    "Values are coded per the form instructions, with missing data flagged separately. "
+    "Researchers should check the dataset documentation before combining cohorts. "
+).split()
+
+class FakeLLMSettings:
+    """Latency, throughput and failure behaviour of the fake server."""
+    
+    def __init__(self, latency_ms: float = 400.0, latency_sigma: float = 0.5, tokens_per_second: float = 60.0,
+                 output_tokens: int = 300, error_rate: float = 0.0, seed: int = None):
+        self.latency_ms = latency_ms  # Median time to the first token
+        self.latency_sigma = latency_sigma  # Log-normal shape, 0 for a fixed latency
+        self.tokens_per_second = tokens_per_second  # 0 sends all tokens at once
+        self.output_tokens = output_tokens  # Answer length before the request's max_tokens cap
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+    
+    def first_token_delay(self) -> float:
+        if self.latency_sigma <= 0:
+            return self.latency_ms / 1000
+        return self.random.lognormvariate(math.log(max(self.latency_ms, 1e-3) / 1000), self.latency_sigma)
+    
+    def token_delay(self) -> float:
+        return 1 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+def reply_text(messages, max_tokens: int, output_tokens: int) -> str:
+    """Plausible reply for the pipeline stage the prompt belongs to."""
+    prompt = "\n".join(str(message.get("content", "")) for message in messages)
+    echo = " ".join(f"ECHO {marker}" for marker in dict.fromkeys(MARKER.findall(prompt)))
+    if '"question_classification"' in prompt:
+        question_type = "variable" if re.search(r"\bvariable|hemoglobin|hgb\b", prompt, re.IGNORECASE) else "general"
+        return json.dumps({
+            "question_classification": {"question_type": question_type, "classification_reasoning": "load test"},
+            "context_analysis": {"is_related": False, "context_summary": "", "related_qa_indices": [], "reasoning": "load test"}
+        })
+    
+    length = max(1, min(output_tokens, max_tokens or output_tokens))
+    words = [FILLER[i % len(FILLER)] for i in range(length)]
+    if "concise answer for chat display" in prompt:
+        return " ".join([echo] + words[:max(1, length // 4)]).strip()
+    
+    # Detailed answer: markdown sections of filler text
+    lines = ["## Answer", "", echo, ""]
+    for start in range(0, len(words), 40):
+        if start and start % 120 == 0:
+            lines += ["", f"### Details {start // 120}", ""]
+        lines.append("- " + " ".join(words[start:start + 40]))
+    return "\n".join(lines)
+
+def create_app(settings: FakeLLMSettings) -> Starlette:
+    async def chat_completions(request):
+        body = await request.json()
+        messages = body.get("messages", [])
+        model = body.get("model", "fake")
+        created = int(time.time())
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        
+        await asyncio.sleep(settings.first_token_delay())
+        if settings.random.random() < settings.error_rate:
+            status = settings.random.choice((500, 429))
+            return JSONResponse({"error": {"message": "Injected failure", "type": "server_error", "code": status}}, status_code=status)
+        
+        content = reply_text(messages, body.get("max_tokens"), settings.output_tokens)
+        tokens = re.findall(r"\S+\s*|\s+", content)  # Whitespace-delimited pieces stand in for tokens
+        usage = {
+            "prompt_tokens": sum(len(str(message.get("content", ""))) for message in messages) // 4,
+            "completion_tokens": len(tokens),
+            "total_tokens": 0
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        
+        if not body.get("stream"):
+            await asyncio.sleep(settings.token_delay() * len(tokens))
+            return JSONResponse({
+                "id": completion_id, "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": usage
+            })
+        
+        include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+        
+        async def events():
+            def chunk(delta, finish_reason=None, chunk_usage=None):
+                choices = [] if chunk_usage else [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+                data = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                        "choices": choices, "usage": chunk_usage}
+                return f"data: {json.dumps(data)}\n\n"
+            
+            yield chunk({"role": "assistant", "content": ""})
+            for token in tokens:
+                await asyncio.sleep(settings.token_delay())
+                yield chunk({"content": token})
+            yield chunk({}, finish_reason="stop")
+            if include_usage:
+                yield chunk({}, chunk_usage=usage)
+            yield "data: [DONE]\n\n"
+        
+        return StreamingResponse(events(), media_type="text/event-stream")
+    
+    routes = [Route(path, chat_completions, methods=["POST"]) for path in ("/v1/chat/completions", "/chat/completions")]
+    return Starlette(routes=routes)
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--latency-ms", type=float, default=400.0, help="median time to first token")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="log-normal spread of the latency, 0 for fixed")
+    parser.add_argument("--tokens-per-second", type=float, default=60.0, help="output token rate, 0 for instant")
+    parser.add_argument("--output-tokens", type=int, default=300, help="reply length, capped by the request's max_tokens")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests failing with HTTP 500/429")
+    parser.add_argument("--seed", type=int, default=None)
+
+def settings_from_args(args) -> FakeLLMSettings:
+    return FakeLLMSettings(args.latency_ms, args.latency_sigma, args.tokens_per_second, args.output_tokens, args.error_rate, args.seed)
+
+def main():
+    import uvicorn
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_arguments(parser)
+    args = parser.parse_args()
+    uvicorn.run(create_app(settings_from_args(args)), host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
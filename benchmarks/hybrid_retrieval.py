@@ -0,0 +1,99 @@
+"""Benchmark hybrid BM25 + FAISS retrieval against dense-only search.
+
+Run from the repository root:
+
+    python -m benchmarks.hybrid_retrieval --queries 500 --k 5
+
+Queries are generated from the catalog itself: variable descriptions (relevant
+documents are every variable sharing that description) and "Form NN" keyword
+questions (relevant documents are the datasets describing that form). The
+"+type" strategies restrict the search to the document type of the relevant
+documents, as the retrieval node does for confidently classified questions.
+"""
+import argparse
+import random
+import re
+import time
+import numpy as np
+from config.settings import WHIConfig
+from data.processor import WHIDataProcessor
+from vector_store.manager import WHIVectorStoreManager
+
+def build_queries(documents, n_queries, seed):
+    """Build (query, relevant positions, document type) triples from the indexed documents."""
+    by_description = {}
+    forms = {}
+    for pos, doc in enumerate(documents):
+        if doc.metadata.get("type") == "variable":
+            match = re.search(r"^Variable Description: (.*)$", doc.page_content, flags=re.MULTILINE)
+            if match:
+                by_description.setdefault(match.group(1).strip().lower(), set()).add(pos)
+        else:
+            for form in re.findall(r"\bForm (\d+)\b", doc.page_content):
+                forms.setdefault(form, set()).add(pos)
+    
+    rng = random.Random(seed)
+    descriptions = rng.sample(sorted(by_description), min(n_queries, len(by_description)))
+    queries = [(description, by_description[description], "variable") for description in descriptions]
+    queries += [(f"What variables are collected on Form {form}?", positions, "dataset") for form, positions in sorted(forms.items())]
+    return queries
+
+def run(manager, queries, k, search):
+    """Return (recall@k, recall@k of dataset queries, latencies in ms) for one search strategy."""
+    hits = {}
+    latencies = []
+    for query, relevant, doc_type in queries:
+        start = time.perf_counter()
+        positions = search(query, k, doc_type)
+        latencies.append((time.perf_counter() - start) * 1000)
+        hits.setdefault(doc_type, []).append(bool(relevant.intersection(positions)))
+    recall = np.mean([hit for type_hits in hits.values() for hit in type_hits])
+    return recall, np.mean(hits.get("dataset", [np.nan])), np.asarray(latencies)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--queries", type=int, default=500, help="number of description queries to sample")
+    parser.add_argument("--k", type=int, default=WHIConfig.RETRIEVAL_K)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    
+    manager = WHIVectorStoreManager()
+    if not manager.load_vector_store():
+        processor = WHIDataProcessor()
+        processor.load_data()
+        manager.create_vector_store(processor.create_documents())
+    if manager.sparse_index is None:
+        manager._build_sparse_index()
+    
+    documents = manager.get_documents()
+    queries = build_queries(documents, args.queries, args.seed)
+    candidate_k = max(args.k, WHIConfig.HYBRID_CANDIDATE_K)
+    
+    strategies = {
+        "dense": lambda query, k, doc_type: manager._dense_search(query, k),
+        "bm25": lambda query, k, doc_type: manager.sparse_index.search(query, k),
+        "hybrid": lambda query, k, doc_type: manager._fuse_rankings(
+            manager._dense_search(query, candidate_k),
+            manager.sparse_index.search(query, candidate_k),
+            k
+        ),
+    }
+    if manager.partitions is not None and "type" in manager.partitions.keys:
+        print("Partitions: " + ", ".join(f"{name} {size}" for name, size in manager.partitions.sizes().items()))
+        strategies["dense+type"] = lambda query, k, doc_type: manager._dense_search(query, k, {"type": doc_type})
+        strategies["hybrid+type"] = lambda query, k, doc_type: manager._fuse_rankings(
+            manager._dense_search(query, candidate_k, {"type": doc_type}),
+            manager._sparse_search(query, candidate_k, {"type": doc_type}),
+            k
+        )
+    
+    print(f"{len(documents)} documents, {len(queries)} queries, k={args.k}")
+    print(f"{'strategy':<12}{'recall@k':>10}{'datasets':>10}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for name, search in strategies.items():
+        recall, dataset_recall, latencies = run(manager, queries, args.k, search)
+        print(f"{name:<12}{recall:>10.3f}{dataset_recall:>10.3f}{latencies.mean():>10.2f}"
+              f"{np.percentile(latencies, 50):>10.2f}{np.percentile(latencies, 95):>10.2f}")
+    print("datasets: recall@k of the dataset (Form NN) queries alone")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Check module import times against a budget.
+
+Run from the repository root:
+
+    python -m benchmarks.import_time
+
+Each module is imported in a fresh interpreter under ``python -X importtime``,
+best of ``--runs``. The script exits with status 1 when a module goes over its
+budget or pulls in one of the heavy dependencies that must load lazily.
+tests/test_import_time.py runs the same check with the budgets scaled by
+``IMPORT_BUDGET_SCALE`` (1.5 by default).
+"""
+import argparse
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+# Budget in ms for the cumulative import time of each module
+BUDGETS_MS = {
+    "app": 2500,  # Mostly Shiny itself
+    "rag.system": 600,
+    "vector_store.manager": 500,
+    "data.processor": 400,
+    "llm.qwen_client": 200,
+}
+
+# Loaded at first use only; importing any of these at module import time is a regression.
+# Shiny's chat components import the openai types themselves, so app is held to its budget only.
+LAZY_CHECKED = ("rag.system", "vector_store.manager", "data.processor", "llm.qwen_client")
+LAZY_PACKAGES = (
+    "torch", "transformers", "sentence_transformers", "langchain_huggingface", "langchain_community",
+    "langchain", "langchain_core", "langgraph", "faiss", "sklearn", "openai", "pandas", "joblib",
+)
+
+def import_tree(module: str) -> Tuple[float, List[str]]:
+    """Return (cumulative import ms, modules imported by it) for one fresh import of ``module``."""
+    # Threads started at import (the app's warm-up) would interleave their imports
+    # with the report, and they do not delay the import itself
+    code = f"import threading; threading.Thread.start = lambda self: None; import {module}"
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True, text=True
+    )
+    if completed.returncode != 0:
+        raise Exception(f"import {module} failed:\n{completed.stderr[-2000:]}")
+    
+    # Children are printed before their parent, one indentation level deeper
+    nested = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|", 2)
+        if not cumulative.strip().isdigit():
+            continue  # Header line
+        depth = (len(name) - len(name.lstrip())) // 2
+        name = name.strip()
+        if depth == 0:
+            if name == module:
+                return int(cumulative) / 1000, nested
+            nested = []  # Imported at top level by something else, e.g. a background thread
+        else:
+            nested.append(name)
+    raise Exception(f"No import time reported for {module}")
+
+def check(modules: Dict[str, float], runs: int) -> bool:
+    ok = True
+    print(f"{'module':<24}{'best ms':>10}{'budget ms':>11}  heavy imports")
+    for module, budget in modules.items():
+        results = [import_tree(module) for _ in range(runs)]
+        best = min(ms for ms, _ in results)
+        heavy_roots = []
+        if module in LAZY_CHECKED:
+            heavy_roots = sorted({name.split(".")[0] for name in results[0][1]} & set(LAZY_PACKAGES))
+        over = best > budget
+        ok = ok and not over and not heavy_roots
+        print(f"{module:<24}{best:>10.0f}{budget:>11.0f}  {', '.join(heavy_roots) or '-'}{'  OVER BUDGET' if over else ''}")
+    return ok
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3, help="fresh imports per module, the best one counts")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply all budgets, e.g. for slow CI machines")
+    args = parser.parse_args()
+    
+    budgets = {module: budget * args.scale for module, budget in BUDGETS_MS.items()}
+    if not check(budgets, args.runs):
+        print("Import time budget exceeded or heavy dependency imported eagerly")
+        sys.exit(1)
+    print("All imports within budget")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Compare LLM latency per stage and model.
+
+Run from the repository root with DASHSCOPE_API_KEY set and the vector store built:
+
+    python -m benchmarks.llm_stage_latency --questions 10
+
+The classification stage runs on the configured "classify" profile model and on
+WHIConfig.MODEL_NAME so the two can be compared, including how often they agree
+on the question type. The summary and generation stages run concurrently in the full
+workflow with the answer cache disabled. Reports p50/p95 latency per stage and model.
+"""
+import argparse
+import asyncio
+import copy
+import time
+import numpy as np
+from config.settings import WHIConfig
+from rag.question_classifier import WHIQuestionClassifier
+from rag.system import WHIRAGSystem
+
+# A related-looking history forces the LLM path of the classification node
+HISTORY = [{"question": "What variables describe blood counts?", "answer": "Hemoglobin, hematocrit and RBC variables."}]
+
+async def classify(system, questions, model):
+    """Return (latencies in ms, question types) for the classification stage on ``model``."""
+    profiles = WHIConfig.LLM_PROFILES
+    WHIConfig.LLM_PROFILES = copy.deepcopy(profiles)
+    WHIConfig.LLM_PROFILES["classify"]["model"] = model
+    try:
+        latencies, labels = [], []
+        for question in questions:
+            start = time.perf_counter()
+            result = await system._analyze_context_and_classify({"question": question, "conversation_history": HISTORY})
+            latencies.append((time.perf_counter() - start) * 1000)
+            labels.append(result["question_type"])
+        return np.asarray(latencies), labels
+    finally:
+        WHIConfig.LLM_PROFILES = profiles
+
+async def generate(system, questions):
+    """Return (summary, detailed answer) latencies in ms from full workflow runs."""
+    summary_latencies, detailed_latencies = [], []
+    for question in questions:
+        timings = (await system.aprocess_question(question)).get("node_timings", {})
+        summary_latencies.append(timings.get("generate_summary", float("nan")))
+        detailed_latencies.append(timings.get("generate_detailed_answer", float("nan")))
+    return np.asarray(summary_latencies), np.asarray(detailed_latencies)
+
+def report(stage, model, latencies):
+    print(f"{stage:<10}{model:<34}{len(latencies):>6}{np.nanpercentile(latencies, 50):>10.0f}{np.nanpercentile(latencies, 95):>10.0f}")
+
+async def run(args):
+    WHIConfig.ANSWER_CACHE_ENABLED = False
+    system = WHIRAGSystem()
+    questions, _ = WHIQuestionClassifier.load_seed_questions()
+    questions = questions[::max(1, len(questions) // args.questions)][:args.questions]
+    
+    fast_model = WHIConfig.LLM_PROFILES["classify"]["model"]
+    fast_latencies, fast_labels = await classify(system, questions, fast_model)
+    thinking_latencies, thinking_labels = await classify(system, questions, WHIConfig.MODEL_NAME)
+    summary_latencies, generate_latencies = await generate(system, questions[:args.generate])
+    
+    print(f"{'stage':<10}{'model':<34}{'calls':>6}{'p50 ms':>10}{'p95 ms':>10}")
+    report("classify", fast_model, fast_latencies)
+    report("classify", WHIConfig.MODEL_NAME, thinking_latencies)
+    report("summarize", WHIConfig.LLM_PROFILES["summarize"]["model"], summary_latencies)
+    report("generate", WHIConfig.LLM_PROFILES["generate"]["model"], generate_latencies)
+    agreement = np.mean([a == b for a, b in zip(fast_labels, thinking_labels)])
+    print(f"Classification agreement between models: {agreement:.0%}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--questions", type=int, default=10, help="questions for the classification stage")
+    parser.add_argument("--generate", type=int, default=3, help="questions for the generation stage")
+    asyncio.run(run(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
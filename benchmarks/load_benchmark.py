@@ -0,0 +1,242 @@
+"""End-to-end load test against a local stand-in for DashScope.
+
+Run from the repository root after `python -m vector_store.build`:
+
+    python -m benchmarks.load_benchmark --target rag --sessions 20 --questions 5
+    python -m benchmarks.load_benchmark --target shiny --sessions 20 --questions 3 --latency-ms 800
+
+Starts ``benchmarks.fake_llm_server`` in a subprocess, points
+``WHIConfig.DASHSCOPE_BASE_URL`` at it and runs N concurrent simulated sessions,
+each asking its questions one after another with the conversation so far. The
+``rag`` target drives ``WHIRAGSystem.astream_question`` directly; ``shiny`` serves
+app.py in this process and talks to it over the Shiny websocket like a browser.
+Reports questions/sec, p50/p95/p99 latency to the chat summary and to the full
+answer, failed questions and how long the event loop serving them was stalled.
+"""
+import argparse
+import asyncio
+import json
+import socket
+import subprocess
+import sys
+import time
+import uuid
+from typing import Dict, List
+import numpy as np
+from config.settings import WHIConfig
+from benchmarks import fake_llm_server
+
+QUESTIONS = [
+    "What are the measurement units and normal ranges for hemoglobin (HGB) variable in WHI study?",
+    "What specific indicators are included in Form 80 physical measurements in WHI study?",
+    "What are the main differences between WHI Observational Study (OS) and Clinical Trial (CT)?",
+    "Which variables record systolic and diastolic blood pressure?",
+    "How is body mass index calculated and which dataset contains it?",
+    "Which MESA variables describe total cholesterol and HDL cholesterol?",
+    "What does the dataset on dietary supplements contain?",
+    "How was smoking status collected at baseline?",
+]
+
+# Outputs on the page, all visible in a browser
+SHINY_OUTPUTS = ("chat_system_status", "chat_history", "current_answer_details", "history_indicator", "history_navigation")
+
+class LoopMonitor:
+    """Measure event loop stalls as the lateness of a short periodic sleep."""
+    
+    def __init__(self, interval: float = 0.01, threshold: float = 0.02):
+        self.interval = interval
+        self.threshold = threshold  # Lags above this count as stalls
+        self.lags = []
+        self._task = None
+    
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+    
+    async def stop(self) -> None:
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+    
+    async def _run(self) -> None:
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(0.0, time.perf_counter() - start - self.interval))
+    
+    def report(self) -> str:
+        if not self.lags:
+            return "no samples"
+        lags = np.asarray(self.lags) * 1000
+        stalls = lags[lags > self.threshold * 1000]
+        return (f"max stall {lags.max():.0f} ms, {len(stalls)} stalls over {self.threshold * 1000:.0f} ms "
+                f"totalling {stalls.sum() / 1000:.2f} s, p99 lag {np.percentile(lags, 99):.1f} ms")
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def wait_for_port(port: int, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise Exception(f"Nothing listening on port {port} after {timeout:.0f}s")
+
+def start_fake_llm(args) -> subprocess.Popen:
+    """Run the fake chat-completions server and point the LLM client configuration at it."""
+    port = free_port()
+    process = subprocess.Popen([
+        sys.executable, "-m", "benchmarks.fake_llm_server", "--port", str(port),
+        "--latency-ms", str(args.latency_ms), "--latency-sigma", str(args.latency_sigma),
+        "--tokens-per-second", str(args.tokens_per_second), "--output-tokens", str(args.output_tokens),
+        "--error-rate", str(args.error_rate)
+    ] + (["--seed", str(args.seed)] if args.seed is not None else []))
+    wait_for_port(port)
+    WHIConfig.DASHSCOPE_BASE_URL = f"http://127.0.0.1:{port}/v1"
+    WHIConfig.DASHSCOPE_API_KEY = "load-test"
+    return process
+
+def question_for(session: int, n: int):
+    """Question text carrying a marker the fake server echoes into its answers."""
+    marker = f"WHILOAD-{uuid.uuid4().hex[:12]}"
+    return f"{QUESTIONS[(session + n) % len(QUESTIONS)]} ({marker})", f"ECHO {marker}"
+
+async def rag_session(system, session: int, args, results: List[Dict]) -> None:
+    history = []
+    for n in range(args.questions):
+        question, echo = question_for(session, n)
+        start = time.perf_counter()
+        row = {"summary": None, "answer": None, "ok": False}
+        async for event in system.astream_question(question, history, "english", None if args.verbosity == "auto" else args.verbosity):
+            if event["type"] == "summary" and row["summary"] is None:
+                row["summary"] = time.perf_counter() - start
+            elif event["type"] == "result":
+                result = event["result"]
+                row["answer"] = time.perf_counter() - start
+                row["ok"] = not result.get("error") and echo in (result.get("answer") or "")
+                history.append({"question": question, "answer": result.get("summary_answer", "")})
+        results.append(row)
+
+def output_html(values: Dict, output: str) -> str:
+    value = values.get(output)
+    return value.get("html", "") if isinstance(value, dict) else ""
+
+async def shiny_session(url: str, session: int, args, results: List[Dict]) -> None:
+    import websockets
+    async with websockets.connect(url, max_size=None) as ws:
+        # Shiny only renders outputs the browser reports as visible
+        visible = {f".clientdata_output_{output}_hidden": False for output in SHINY_OUTPUTS}
+        await ws.send(json.dumps({"method": "init", "data": {
+            "chat_input": "", "answer_verbosity": args.verbosity, "send_message:shiny.action": 0, **visible
+        }}))
+        
+        # Until a question finishes, the details panel shows the previous answer or a streamed one
+        shown = ""
+        while not shown:
+            shown = output_html(json.loads(await ws.recv()).get("values") or {}, "current_answer_details")
+        
+        for n in range(args.questions):
+            question, echo = question_for(session, n)
+            start = time.perf_counter()
+            row = {"summary": None, "answer": None, "ok": False}
+            await ws.send(json.dumps({"method": "update", "data": {
+                "chat_input": question, "send_message:shiny.action": n + 1
+            }}))
+            deadline = start + args.timeout
+            while row["answer"] is None and time.perf_counter() < deadline:
+                try:
+                    message = json.loads(await asyncio.wait_for(ws.recv(), deadline - time.perf_counter()))
+                except asyncio.TimeoutError:
+                    break
+                values = message.get("values") or {}
+                if row["summary"] is None and echo in output_html(values, "chat_history"):
+                    row["summary"] = time.perf_counter() - start
+                details = output_html(values, "current_answer_details")
+                if details and details != shown and "Generating..." not in details:
+                    row["answer"] = time.perf_counter() - start
+                    row["ok"] = echo in details
+                    shown = details
+            results.append(row)
+
+async def run_sessions(session_coroutine, args) -> List[Dict]:
+    results = []
+    await asyncio.gather(*(session_coroutine(session, args, results) for session in range(args.sessions)))
+    return results
+
+async def load_rag(args):
+    from rag.system import WHIRAGSystem
+    system = await asyncio.to_thread(WHIRAGSystem)
+    monitor = LoopMonitor()
+    monitor.start()
+    start = time.perf_counter()
+    results = await run_sessions(lambda session, args, results: rag_session(system, session, args, results), args)
+    wall = time.perf_counter() - start
+    await monitor.stop()
+    return results, wall, monitor
+
+async def load_shiny(args):
+    import uvicorn
+    import app as shiny_app  # Starts the RAG system warm-up, against the fake server configured above
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(shiny_app.app, host="127.0.0.1", port=port, log_level="warning", ws_max_size=2**26))
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+    if not await shiny_app.startup.wait():
+        raise Exception(f"RAG system failed to start: {shiny_app.startup.error}")
+    
+    monitor = LoopMonitor()
+    monitor.start()
+    start = time.perf_counter()
+    url = f"ws://127.0.0.1:{port}/websocket/"
+    results = await run_sessions(lambda session, args, results: shiny_session(url, session, args, results), args)
+    wall = time.perf_counter() - start
+    await monitor.stop()
+    server.should_exit = True
+    await serving
+    return results, wall, monitor
+
+def percentiles(values) -> str:
+    values = [value for value in values if value is not None]
+    if not values:
+        return "n/a"
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return f"p50 {p50:.2f}  p95 {p95:.2f}  p99 {p99:.2f} s"
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--target", choices=("rag", "shiny"), default="rag")
+    parser.add_argument("--sessions", type=int, default=10, help="concurrent simulated users")
+    parser.add_argument("--questions", type=int, default=3, help="questions per session, asked one after another")
+    parser.add_argument("--verbosity", choices=("auto",) + WHIConfig.VERBOSITY_MODES, default="auto")
+    parser.add_argument("--timeout", type=float, default=300.0, help="seconds to wait for one answer (shiny target)")
+    fake_llm_server.add_arguments(parser)
+    args = parser.parse_args()
+    
+    fake_llm = start_fake_llm(args)
+    try:
+        load = load_rag if args.target == "rag" else load_shiny
+        results, wall, monitor = asyncio.run(load(args))
+    finally:
+        fake_llm.terminate()
+        fake_llm.wait()
+    
+    answered = [row for row in results if row["answer"] is not None]
+    failed = len(results) - sum(row["ok"] for row in results)
+    print(f"\ntarget {args.target}: {args.sessions} sessions x {args.questions} questions; fake LLM "
+          f"{args.latency_ms:.0f} ms median latency, {args.tokens_per_second:.0f} tok/s, {args.error_rate:.0%} errors")
+    print(f"questions        {len(results)} ({failed} failed or timed out)")
+    print(f"wall time        {wall:.1f} s")
+    print(f"throughput       {len(answered) / wall:.2f} questions/s")
+    print(f"summary latency  {percentiles(row['summary'] for row in results)}")
+    print(f"answer latency   {percentiles(row['answer'] for row in results)}")
+    print(f"event loop       {monitor.report()}")
+
+if __name__ == "__main__":
+    main()
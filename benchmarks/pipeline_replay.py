@@ -0,0 +1,113 @@
+"""Profile the question pipeline offline by replaying recorded LLM responses.
+
+Record once (against DashScope, or any OpenAI-compatible server configured in
+WHIConfig), then replay as often as needed with no network:
+
+    python -m benchmarks.pipeline_replay --mode record --cassette bench.jsonl
+    python -m benchmarks.pipeline_replay --mode replay --cassette bench.jsonl --rounds 5 --profile
+
+Every question runs through ``WHIRAGSystem.aprocess_question`` with the answer cache
+disabled, and its answer is rendered to HTML like the chat does. Replay returns the
+recorded responses instantly (``--latency-scale 1`` waits as long as the recorded
+calls took), so the report shows what the pipeline itself costs: per-node time
+excluding LLM calls, retrieval steps and rendering. ``--profile`` adds the functions
+with the most cumulative time under cProfile.
+"""
+import argparse
+import asyncio
+import cProfile
+import io
+import pstats
+import time
+from collections import defaultdict
+import numpy as np
+from config.settings import WHIConfig
+from benchmarks.load_benchmark import QUESTIONS
+
+async def run(system, processor, questions, rounds):
+    """Answer every question ``rounds`` times; return per-question measurements."""
+    rows = []
+    for _ in range(rounds):
+        for question in questions:
+            result = await system.aprocess_question(question)
+            if result.get("error"):
+                raise Exception(f"Question failed: {result['error']}")
+            start = time.perf_counter()
+            processor._render_result(result)
+            metrics = result["metrics"]
+            rows.append({
+                "total_ms": metrics["total_ms"],
+                "llm_ms": sum(call["ms"] for call in metrics["llm_calls"]),
+                "render_ms": (time.perf_counter() - start) * 1000,
+                "node_ms": metrics["node_ms"],
+                "retrieval": metrics["retrieval"]
+            })
+    return rows
+
+def report(rows):
+    def line(name, values):
+        values = np.asarray(values, dtype=float)
+        p50, p95 = np.percentile(values, [50, 95])
+        print(f"  {name:<36}{p50:>10.2f}{p95:>10.2f}")
+    
+    print(f"  {'':<36}{'p50 ms':>10}{'p95 ms':>10}")
+    line("question total", [row["total_ms"] for row in rows])
+    line("LLM calls (summed)", [row["llm_ms"] for row in rows])
+    line("render answer", [row["render_ms"] for row in rows])
+    nodes, steps = defaultdict(list), defaultdict(list)
+    for row in rows:
+        for node, ms in row["node_ms"].items():
+            nodes[node].append(ms)
+        for key, value in row["retrieval"].items():
+            if key.endswith("_ms"):
+                steps[key[:-3]].append(value)
+    for node, values in nodes.items():
+        line(f"node {node}", values)
+    for step, values in steps.items():
+        line(f"retrieval {step}", values)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mode", choices=("record", "replay"), default="replay")
+    parser.add_argument("--cassette", default=WHIConfig.LLM_CASSETTE_PATH)
+    parser.add_argument("--latency-scale", type=float, default=0.0, help="replay delay as a fraction of the recorded latency")
+    parser.add_argument("--questions", type=int, default=len(QUESTIONS))
+    parser.add_argument("--rounds", type=int, default=1, help="times to answer every question")
+    parser.add_argument("--profile", action="store_true", help="print the top functions by cumulative time (event loop thread only)")
+    args = parser.parse_args()
+    
+    WHIConfig.LLM_CASSETTE_MODE = args.mode
+    WHIConfig.LLM_CASSETTE_PATH = args.cassette
+    WHIConfig.LLM_CASSETTE_LATENCY = args.latency_scale
+    WHIConfig.ANSWER_CACHE_ENABLED = False  # Every question goes through the whole pipeline
+    
+    from handlers.question_processor import QuestionProcessor
+    from rag.system import WHIRAGSystem
+    system = WHIRAGSystem()
+    processor = QuestionProcessor(system, system_ready=True)
+    questions = QUESTIONS[:args.questions]
+    rounds = 1 if args.mode == "record" else args.rounds
+    
+    # One unmeasured pass warms up lazy imports and the embedding model
+    if args.mode == "replay":
+        asyncio.run(run(system, processor, questions[:1], 1))
+    
+    profiler = cProfile.Profile() if args.profile else None
+    if profiler:
+        profiler.enable()
+    start = time.perf_counter()
+    rows = asyncio.run(run(system, processor, questions, rounds))
+    wall = time.perf_counter() - start
+    if profiler:
+        profiler.disable()
+    
+    print(f"\n{args.mode} {args.cassette}: {len(rows)} questions in {wall:.2f} s, "
+          f"{len(system.llm_client.cassette)} recorded responses")
+    report(rows)
+    if profiler:
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(25)
+        print(out.getvalue())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""Benchmark loading the vector store in several worker processes at once.
+
+Run from the repository root after `python -m vector_store.build`:
+
+    python -m benchmarks.vector_store_load --workers 4 --queries 200
+
+The stored index is written both as the memory-mapped artifact and in the old
+pickled LangChain format (``FAISS.save_local``), then each format is loaded by
+``--workers`` fresh processes running side by side. Reports load time, resident
+memory added by loading and querying, how much of it is shared file-backed pages
+(one copy in the page cache for all workers) and single-query latency including
+the document lookup.
+"""
+import argparse
+import multiprocessing
+import os
+import pickle
+import shutil
+import tempfile
+import time
+import numpy as np
+from config.settings import WHIConfig
+from vector_store import faiss_index
+from vector_store.artifact import WHIVectorArtifact
+
+def memory_mb():
+    """Return (resident MB, shared file-backed MB) of this process, None where /proc is unavailable."""
+    try:
+        with open("/proc/self/statm") as f:
+            fields = f.read().split()
+    except OSError:
+        return None
+    page_mb = os.sysconf("SC_PAGE_SIZE") / 2**20
+    return int(fields[1]) * page_mb, int(fields[2]) * page_mb
+
+def write_legacy(directory, artifact):
+    """Write the artifact's index and documents the way LangChain ``FAISS.save_local`` does."""
+    from langchain_community.docstore.in_memory import InMemoryDocstore
+    from langchain_community.vectorstores import FAISS
+    pairs = artifact.documents_with_ids()
+    store = FAISS(
+        embedding_function=None,
+        index=artifact.writable_index(),
+        docstore=InMemoryDocstore(dict(pairs)),
+        index_to_docstore_id={pos: doc_id for pos, (doc_id, _) in enumerate(pairs)}
+    )
+    store.save_local(directory)
+
+def load(store_format, directory):
+    """Return (index, positions -> documents lookup) for one store format."""
+    import faiss
+    if store_format == "artifact":
+        artifact = WHIVectorArtifact.open(directory)
+        return artifact.index, artifact.documents_at
+    
+    # What FAISS.load_local does, without loading an embedding model
+    index = faiss.read_index(os.path.join(directory, "index.faiss"))
+    with open(os.path.join(directory, "index.pkl"), "rb") as f:
+        docstore, index_to_id = pickle.load(f)
+    return index, lambda positions: [docstore.search(index_to_id[pos]) for pos in positions]
+
+def worker(store_format, directory, queries, k, barrier, results):
+    before = memory_mb()
+    barrier.wait()  # Start loading together, like workers forked by a process manager
+    start = time.perf_counter()
+    index, lookup = load(store_format, directory)
+    faiss_index.configure_search(index)
+    load_ms = (time.perf_counter() - start) * 1000
+    
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        _, positions = index.search(query[None, :], k)
+        lookup([int(pos) for pos in positions[0] if pos >= 0])
+        latencies.append((time.perf_counter() - start) * 1000)
+    after = memory_mb()
+    
+    barrier.wait()  # Stay alive until every worker has measured
+    added = (after[0] - before[0], after[1] - before[1]) if before and after else None
+    results.put((load_ms, added, np.percentile(latencies, 50), np.percentile(latencies, 99)))
+
+def run(store_format, directory, queries, k, workers):
+    context = multiprocessing.get_context("spawn")  # Fresh interpreters, nothing inherited from the parent
+    barrier = context.Barrier(workers)
+    results = context.Queue()
+    processes = [
+        context.Process(target=worker, args=(store_format, directory, queries, k, barrier, results))
+        for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    rows = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=WHIConfig.RETRIEVAL_K)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    
+    artifact = WHIVectorArtifact.open(WHIConfig.VECTOR_STORE_PATH)
+    if artifact is None:
+        raise SystemExit(f"No vector store at {WHIConfig.VECTOR_STORE_PATH}, build it with `python -m vector_store.build`")
+    
+    # Stored vectors with a little noise stand in for query embeddings
+    rng = np.random.default_rng(args.seed)
+    picks = rng.choice(len(artifact), min(args.queries, len(artifact)), replace=False)
+    queries = np.vstack([artifact.index.reconstruct(int(pos)) for pos in picks]).astype(np.float32)
+    queries += rng.normal(0, 0.01, queries.shape).astype(np.float32)
+    
+    work_dir = tempfile.mkdtemp(prefix="whi_store_load_")
+    try:
+        directories = {"artifact": os.path.join(work_dir, "artifact"), "pickle": os.path.join(work_dir, "pickle")}
+        os.makedirs(directories["artifact"])
+        for name in (WHIVectorArtifact.INDEX_FILE, WHIVectorArtifact.DOCUMENTS_FILE):
+            shutil.copy(os.path.join(WHIConfig.VECTOR_STORE_PATH, name), directories["artifact"])
+        write_legacy(directories["pickle"], artifact)
+        
+        print(f"{len(artifact)} documents, {faiss_index.index_type_of(artifact.index)} index, "
+              f"{args.workers} workers, {len(queries)} queries, k={args.k}")
+        print(f"{'format':<10}{'load ms':>9}{'RSS MB':>9}{'shared MB':>11}{'private MB':>12}{'p50 ms':>9}{'p99 ms':>9}")
+        for store_format, directory in directories.items():
+            rows = run(store_format, directory, queries, args.k, args.workers)
+            load_ms = np.median([row[0] for row in rows])
+            p50 = np.median([row[2] for row in rows])
+            p99 = np.max([row[3] for row in rows])
+            if all(row[1] is not None for row in rows):
+                resident = np.mean([row[1][0] for row in rows])
+                shared = np.mean([row[1][1] for row in rows])
+                memory = f"{resident:>9.1f}{shared:>11.1f}{resident - shared:>12.1f}"
+            else:
+                memory = f"{'n/a':>9}{'n/a':>11}{'n/a':>12}"
+            print(f"{store_format:<10}{load_ms:>9.1f}{memory}{p50:>9.3f}{p99:>9.3f}")
+        print("Per worker means; private memory is paid once per worker, shared pages once per machine")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,5 @@
 import os
-from typing import Dict, Any
+from typing import Dict, Any, List
 from dotenv import load_dotenv
 
 # Load .env file
@@ -13,19 +13,108 @@ class WHIConfig:
     DASHSCOPE_BASE_URL = "https://dashscope.aliyuncs.com/compatible-mode/v1"
     MODEL_NAME = "qwen3-30b-a3b-thinking-2507"
     
+    # Per-stage model profiles. Each LLM call names its stage; None values fall back to the API defaults.
+    # Classification only returns JSON labels and the chat summary must arrive within seconds,
+    # so both run on the non-thinking sibling model.
+    LLM_PROFILES: Dict[str, Dict[str, Any]] = {
+        "classify": {"model": "qwen3-30b-a3b-instruct-2507", "max_tokens": 512, "temperature": 0.0, "timeout": 30},
+        "generate": {"model": MODEL_NAME, "max_tokens": None, "temperature": None, "timeout": 180},
+        "summarize": {"model": "qwen3-30b-a3b-instruct-2507", "max_tokens": 600, "temperature": 0.3, "timeout": 60},
+    }
+    
     # Data file paths - using relative paths
     MESA_DATA_PATH = "./whi_mesa_v2.csv"
     DATASET_DESC_PATH = "./whi_dataset_desc_with_url.csv"
     
     # Vector database configuration
     VECTOR_STORE_PATH = "./whi_vectorstore"
+    EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
     CHUNK_SIZE = 1000
     CHUNK_OVERLAP = 200
+    DOCUMENT_BATCH_SIZE = 512  # Documents built, embedded and checkpointed per batch
+    MERGE_DUPLICATE_VARIABLES = True  # One document per variable definition, listing every dataset that has it
+    MERGED_DATASETS_LISTED = 20  # Dataset names written into a merged document's text, the rest are counted
+    SOURCE_DATASETS_LISTED = 3  # Dataset names kept in a merged document's metadata and shown as its source
+    EMBEDDING_WORKERS = os.cpu_count() or 1  # Processes used by `python -m vector_store.build`
+    QUERY_EMBEDDING_CACHE_SIZE = 2048  # Query strings whose embeddings are kept in memory
+    QUERY_EMBEDDING_CACHE_PATH = os.path.join(VECTOR_STORE_PATH, "query_embeddings.npz")  # Warm set saved at exit, None to disable
+    
+    # FAISS index configuration: flat (exact), ivf_flat, hnsw, ivf_pq or sq_fp16.
+    # Compare options with `python -m benchmarks.faiss_index_types`; changing it rebuilds the index.
+    FAISS_INDEX_TYPE = "flat"
+    FAISS_IVF_NLIST = 256  # Inverted lists, capped so each has enough training points
+    FAISS_IVF_NPROBE = 16  # Lists visited per query
+    FAISS_HNSW_M = 32
+    FAISS_HNSW_EF_CONSTRUCTION = 80
+    FAISS_HNSW_EF_SEARCH = 64
+    FAISS_PQ_M = 48  # Sub-quantizers, must divide the embedding dimension
+    FAISS_PQ_NBITS = 8
+    FAISS_TRAINING_SAMPLE_SIZE = 65536  # Vectors held in memory to train IVF indexes during a streamed build
     
     # RAG configuration
     RETRIEVAL_K = 5
     SIMILARITY_THRESHOLD = 0.7
     
+    # Hybrid retrieval configuration (BM25 + FAISS merged with reciprocal-rank fusion)
+    HYBRID_SEARCH_ENABLED = True
+    HYBRID_DENSE_WEIGHT = 1.0
+    HYBRID_SPARSE_WEIGHT = 1.0
+    HYBRID_RRF_K = 60
+    HYBRID_CANDIDATE_K = 50  # Candidates taken from each search before fusion
+    BM25_K1 = 1.2
+    BM25_B = 0.75
+    
+    # Filtered retrieval: searches are routed to the documents of a database the question
+    # names, topped up from the whole store when short, and favour the question's type
+    PARTITIONED_RETRIEVAL_ENABLED = True
+    PARTITION_KEYS = ("type", "database")  # Document metadata keys searches can be filtered on
+    SOFT_PARTITION_KEYS = ("type",)  # Guessed from the question, so matching documents are favoured rather than required
+    PARTITION_INDEX_MAX_SIZE = 5000  # Partitions up to this size get their own in-memory flat index
+    DATABASE_MENTIONS = {"mesa": r"\bmesa\b", "whi": r"\bwhi\b"}  # Database -> pattern naming it in a question
+    
+    # Context packing for the answer prompts, token counts use the LLM's tokenizer
+    # (saved locally with `python -m rag.context_packer`) or an estimate without it
+    CONTEXT_PACKING_ENABLED = True
+    CONTEXT_TOKENIZER_NAME = "Qwen/Qwen3-30B-A3B-Instruct-2507"  # Same vocabulary as the other Qwen3 profiles
+    CONTEXT_TOKENIZER_PATH = "./whi_tokenizer.json"
+    CONTEXT_TOKEN_BUDGET = 1500  # Retrieved documents
+    CONTEXT_HISTORY_TOKEN_BUDGET = 600  # Related previous Q&A
+    # The chat summary runs alongside the detailed answer; giving it only the top documents
+    # keeps the second prompt from repeating the whole context
+    SUMMARY_CONTEXT_DOCUMENTS = 3
+    SUMMARY_CONTEXT_TOKEN_BUDGET = 600
+    
+    # Answer verbosity: each mode has its own prompt variant and hard output token budget
+    VERBOSITY_MODES = ("brief", "standard", "exhaustive")
+    VERBOSITY_MAX_TOKENS = {"brief": 800, "standard": 2500, "exhaustive": 8000}
+    DEFAULT_VERBOSITY = {"variable": "brief", "dataset": "standard", "general": "standard"}  # By question type
+    
+    # Local question classifier, trained with `python -m rag.question_classifier`
+    LOCAL_CLASSIFIER_ENABLED = True
+    CLASSIFIER_PATH = "./whi_question_classifier.joblib"
+    CLASSIFIER_SEED_PATH = "./data/classifier_questions.csv"
+    # Below this the LLM classifies the question; set from the held-out accuracy printed when training.
+    # Questions naming a phv or pht accession are always classified locally
+    CLASSIFIER_CONFIDENCE_THRESHOLD = 0.75
+    
+    # Answer cache configuration (repeated questions skip the LLM workflow)
+    ANSWER_CACHE_ENABLED = True
+    ANSWER_CACHE_MAX_SIZE = 512
+    ANSWER_CACHE_TTL_SECONDS = 24 * 60 * 60
+    ANSWER_CACHE_SIMILARITY_THRESHOLD = 0.95  # Cosine similarity for reusing a paraphrased question's answer
+    PROMPT_VERSION = "7"  # Bump when prompts change so cached answers are invalidated
+    
+    # LLM record/replay for reproducible benchmarks: "record" saves every response to the
+    # cassette, "replay" serves recorded responses offline, None calls the API unrecorded
+    LLM_CASSETTE_MODE = os.getenv("WHI_LLM_CASSETTE_MODE") or None
+    LLM_CASSETTE_PATH = os.getenv("WHI_LLM_CASSETTE_PATH", "./whi_llm_cassette.jsonl")
+    LLM_CASSETTE_LATENCY = float(os.getenv("WHI_LLM_CASSETTE_LATENCY", "0"))  # Replay delay as a fraction of the recorded latency
+    
+    @classmethod
+    def data_files(cls) -> List[str]:
+        """Source data files the vector store is built from."""
+        return [cls.MESA_DATA_PATH, cls.DATASET_DESC_PATH]
+    
     @classmethod
     def validate_config(cls) -> bool:
         """Validate configuration completeness."""
@@ -1,63 +1,183 @@
-import pandas as pd
-from typing import List, Dict, Any
-from langchain_core.documents import Document
+from typing import TYPE_CHECKING, List, Dict, Any, Iterator
+import numpy as np
 from config.settings import WHIConfig
 
+# pandas and langchain_core are imported when the data is loaded and documents are built,
+# importing this module stays cheap
+if TYPE_CHECKING:
+    import pandas as pd
+    from langchain_core.documents import Document
+
 class WHIDataProcessor:
     """WHI Data Processor for handling medical research data"""
     
+    # Source column -> document metadata key
+    VARIABLE_METADATA_COLUMNS = {
+        'Variable accession': 'variable_accession',
+        'Variable name': 'variable_name',
+        'Dataset accession': 'dataset_accession',
+        'Dataset name': 'dataset_name',
+        'Study': 'study',
+        'Database': 'database'
+    }
+    DATASET_METADATA_COLUMNS = {
+        'Dataset accession': 'dataset_accession',
+        'Dataset name': 'dataset_name',
+        'Study': 'study',
+        'Database': 'database'
+    }
+    # Variable rows with the same values in these columns describe the same variable
+    VARIABLE_DEFINITION_COLUMNS = ['Variable name', 'Variable description', 'Type', 'Database']
+    
     def __init__(self):
         self.mesa_data = None
         self.dataset_desc = None
+        self.variable_definitions = None  # One row per distinct variable definition when merging duplicates
+        self.variable_document_of_row = None  # mesa_data row position -> variable document position
     
     def load_data(self) -> None:
         """Load data files from configured paths"""
+        import pandas as pd
         try:
             self.mesa_data = pd.read_csv(WHIConfig.MESA_DATA_PATH)
             self.dataset_desc = pd.read_csv(WHIConfig.DATASET_DESC_PATH)
         except Exception as e:
             raise Exception(f"Data loading failed: {str(e)}")
+        self._group_variables()
+    
+    def _group_variables(self) -> None:
+        """Group variable rows sharing a definition, keeping the first row's accession as the document key"""
+        if not WHIConfig.MERGE_DUPLICATE_VARIABLES:
+            self.variable_definitions = None
+            self.variable_document_of_row = np.arange(len(self.mesa_data))
+            return
+        
+        frame = self.mesa_data
+        keys = frame[self.VARIABLE_DEFINITION_COLUMNS].fillna("nan").astype(str)
+        # Descriptions and types differ only in case or spacing between datasets ("SHARE ID NUMBER" / "SHARE ID Number")
+        for column in ('Variable description', 'Type'):
+            keys[column] = keys[column].str.casefold().str.split().str.join(" ")
+        codes = keys.groupby(self.VARIABLE_DEFINITION_COLUMNS, sort=False).ngroup().to_numpy()
+        
+        # Rows of each definition, in file order; definitions are numbered by first appearance
+        order = np.argsort(codes, kind="stable")
+        starts = np.flatnonzero(np.r_[True, np.diff(codes[order]) != 0])
+        def members(column: str) -> List[list]:
+            return [values.tolist() for values in np.split(frame[column].to_numpy()[order], starts[1:])]
+        
+        definitions = frame.iloc[order[starts]].reset_index(drop=True)
+        definitions['Dataset names'] = members('Dataset name')
+        definitions['Studies'] = [list(dict.fromkeys(studies)) for studies in members('Study')]
+        self.variable_definitions = definitions
+        self.variable_document_of_row = codes
     
-    def create_documents(self) -> List[Document]:
+    def create_documents(self) -> List["Document"]:
         """Create LangChain document objects from loaded data"""
         documents = []
+        for batch in self.iter_document_batches():
+            documents.extend(batch)
+        return documents
+    
+    def iter_document_batches(self, batch_size: int = None) -> Iterator[List["Document"]]:
+        """Yield documents in fixed-size batches so they can be embedded as they are built"""
+        batch_size = batch_size or WHIConfig.DOCUMENT_BATCH_SIZE
+        
+        # Process variable-level data, then dataset-level data
+        variables = (
+            (self.variable_definitions, self._definition_documents) if self.variable_definitions is not None
+            else (self.mesa_data, self._variable_documents)
+        )
+        for frame, build in (variables, (self.dataset_desc, self._dataset_documents)):
+            for start in range(0, len(frame), batch_size):
+                yield build(frame.iloc[start:start + batch_size])
+    
+    @staticmethod
+    def document_format() -> str:
+        """Settings that change the documents built from unchanged data files"""
+        if WHIConfig.MERGE_DUPLICATE_VARIABLES:
+            return f"merged-variables:{WHIConfig.MERGED_DATASETS_LISTED}:{WHIConfig.SOURCE_DATASETS_LISTED}"
+        return "variable-rows"
+    
+    def get_variable_document(self, position: int) -> "Document":
+        """Create one variable document by position (see ``variable_document_of_row``)"""
+        if self.variable_definitions is not None:
+            return self._definition_documents(self.variable_definitions.iloc[[position]])[0]
+        return self._variable_documents(self.mesa_data.iloc[[position]])[0]
+    
+    def get_dataset_document(self, position: int) -> "Document":
+        """Create the document for one dataset row by position"""
+        return self._dataset_documents(self.dataset_desc.iloc[[position]])[0]
+    
+    @staticmethod
+    def _text(column: "pd.Series") -> "pd.Series":
+        """Render a column as text the way an f-string renders a row value (missing -> 'nan')"""
+        return column.fillna("nan").astype(str)
+    
+    def _variable_documents(self, frame: "pd.DataFrame") -> List["Document"]:
+        """Build variable-level documents for a block of rows with column-wise string ops"""
+        contents = (
+            "Variable Name: " + self._text(frame['Variable name'])
+            + "\nVariable Description: " + self._text(frame['Variable description'])
+            + "\nVariable Type: " + self._text(frame['Type'])
+            + "\nDataset: " + self._text(frame['Dataset name'])
+            + "\nStudy: " + self._text(frame['Study'])
+            + "\nDatabase: " + self._text(frame['Database'])
+        )
+        
+        metadata = frame[list(self.VARIABLE_METADATA_COLUMNS)].rename(
+            columns=self.VARIABLE_METADATA_COLUMNS
+        ).assign(type="variable").to_dict("records")
+        
+        from langchain_core.documents import Document
+        return [Document(page_content=content, metadata=meta) for content, meta in zip(contents.tolist(), metadata)]
+    
+    def _definition_documents(self, frame: "pd.DataFrame") -> List["Document"]:
+        """Build one document per merged variable definition, listing the datasets that contain it"""
+        contents = (
+            "Variable Name: " + self._text(frame['Variable name'])
+            + "\nVariable Description: " + self._text(frame['Variable description'])
+            + "\nVariable Type: " + self._text(frame['Type'])
+            + "\n" + frame['Dataset names'].map(self._dataset_list)
+            + "\nStudy: " + frame['Studies'].map(lambda studies: ", ".join(map(str, studies)))
+            + "\nDatabase: " + self._text(frame['Database'])
+        )
+        
+        # Only the first few dataset names and a count, the full lists would be stored in every row
+        metadata = frame[list(self.VARIABLE_METADATA_COLUMNS)].rename(
+            columns=self.VARIABLE_METADATA_COLUMNS
+        ).assign(
+            type="variable",
+            dataset_count=frame['Dataset names'].map(len),
+            dataset_names=frame['Dataset names'].map(lambda names: [str(name) for name in names[:WHIConfig.SOURCE_DATASETS_LISTED]])
+        ).to_dict("records")
+        
+        from langchain_core.documents import Document
+        return [Document(page_content=content, metadata=meta) for content, meta in zip(contents.tolist(), metadata)]
+    
+    @staticmethod
+    def _dataset_list(names: List[str]) -> str:
+        """Dataset line of a merged variable document, e.g. 'Datasets (3): A, B, C'"""
+        if len(names) == 1:
+            return f"Dataset: {names[0]}"
+        listed = ", ".join(str(name) for name in names[:WHIConfig.MERGED_DATASETS_LISTED])
+        more = len(names) - WHIConfig.MERGED_DATASETS_LISTED
+        return f"Datasets ({len(names)}): {listed}" + (f" and {more} more" if more > 0 else "")
+    
+    def _dataset_documents(self, frame: "pd.DataFrame") -> List["Document"]:
+        """Build dataset-level documents for a block of rows with column-wise string ops"""
+        import pandas as pd
+        url = self._text(frame['URL']) if 'URL' in frame else pd.Series("N/A", index=frame.index)
+        contents = (
+            "Dataset Name: " + self._text(frame['Dataset name'])
+            + "\nDataset Description: " + self._text(frame['Dataset description'])
+            + "\nStudy: " + self._text(frame['Study'])
+            + "\nDatabase: " + self._text(frame['Database'])
+            + "\nURL: " + url
+        )
+        
+        metadata = frame[list(self.DATASET_METADATA_COLUMNS)].rename(
+            columns=self.DATASET_METADATA_COLUMNS
+        ).assign(type="dataset").to_dict("records")
         
-        # Process variable-level data
-        for _, row in self.mesa_data.iterrows():
-            content = f"""Variable Name: {row['Variable name']}
-Variable Description: {row['Variable description']}
-Variable Type: {row['Type']}
-Dataset: {row['Dataset name']}
-Study: {row['Study']}
-Database: {row['Database']}"""
-            
-            metadata = {
-                "variable_accession": row['Variable accession'],
-                "variable_name": row['Variable name'],
-                "dataset_accession": row['Dataset accession'],
-                "dataset_name": row['Dataset name'],
-                "study": row['Study'],
-                "type": "variable"
-            }
-            
-            documents.append(Document(page_content=content, metadata=metadata))
-        
-        # Process dataset-level data
-        for _, row in self.dataset_desc.iterrows():
-            content = f"""Dataset Name: {row['Dataset name']}
-Dataset Description: {row['Dataset description']}
-Study: {row['Study']}
-Database: {row['Database']}
-URL: {row.get('URL', 'N/A')}"""
-            
-            metadata = {
-                "dataset_accession": row['Dataset accession'],
-                "dataset_name": row['Dataset name'],
-                "study": row['Study'],
-                "database": row['Database'],
-                "type": "dataset"
-            }
-            
-            documents.append(Document(page_content=content, metadata=metadata))
-        
-        return documents
\ No newline at end of file
+        from langchain_core.documents import Document
+        return [Document(page_content=content, metadata=meta) for content, meta in zip(contents.tolist(), metadata)]
\ No newline at end of file
@@ -1,5 +1,13 @@
-from typing import TypedDict, List, Optional, Dict, Any
-from langchain.schema import Document
+from typing import TypedDict, List, Optional, Dict, Any, Annotated
+import operator
+
+def merge_timings(left: Optional[Dict[str, float]], right: Optional[Dict[str, float]]) -> Dict[str, float]:
+    """Reducer combining node timings reported by parallel branches."""
+    return {**(left or {}), **(right or {})}
+
+def keep_first_error(left: Optional[str], right: Optional[str]) -> Optional[str]:
+    """Reducer keeping the first error when parallel branches both fail."""
+    return left or right
 
 class WHIRAGState(TypedDict):
     """WHI RAG system state management."""
@@ -9,6 +17,12 @@ class WHIRAGState(TypedDict):
     # Language control
     output_language: Optional[str]  # 新增：输出语言控制
     
+    # Answer length control
+    verbosity: Optional[str]  # "brief", "standard", "exhaustive" or None for the question type default
+    
+    # Streaming control
+    stream_answer: Optional[bool]  # Emit detailed answer deltas through the graph stream
+    
     # Conversation history context
     conversation_history: Optional[List[Dict[str, Any]]]  # Historical conversation records
     context_summary: Optional[str]  # Context summary
@@ -19,10 +33,11 @@ class WHIRAGState(TypedDict):
     
     # Retrieval related
     search_query: Optional[str]
-    retrieved_documents: Optional[List[Document]]
+    retrieved_documents: Optional[List[Any]]  # langchain_core Documents, not imported so the graph stays cheap to import
     
     # Generation related
     context: Optional[str]
+    summary_context: Optional[str]  # Top documents only, for the chat summary prompt
     answer: Optional[str]
     summary_answer: Optional[str]  # Summary answer
     
@@ -30,8 +45,9 @@ class WHIRAGState(TypedDict):
     confidence_score: Optional[float]
     sources: Optional[List[Dict[str, Any]]]
     
-    # Processing steps
-    processing_steps: Optional[List[str]]
+    # Processing steps, each node returns only the steps it added
+    processing_steps: Annotated[List[str], operator.add]
+    node_timings: Annotated[Dict[str, float], merge_timings]  # Node name -> wall time in ms
     
     # Error handling
-    error: Optional[str]
\ No newline at end of file
+    error: Annotated[Optional[str], keep_first_error]
\ No newline at end of file
@@ -3,11 +3,13 @@ from .message_handlers import MessageHandlers
 from .history_handlers import HistoryHandlers
 from .question_processor import QuestionProcessor
 from .utils import UIUtils
+from .answer_stream import StreamingAnswer
 
 __all__ = [
     'UIComponents',
     'MessageHandlers', 
     'HistoryHandlers',
     'QuestionProcessor',
-    'UIUtils'
+    'UIUtils',
+    'StreamingAnswer'
 ]
\ No newline at end of file
@@ -0,0 +1,119 @@
+import markdown
+from .question_processor import QuestionProcessor
+
+class StreamingAnswer:
+    """Streaming detailed answer buffer that renders markdown incrementally"""
+    
+    MARKDOWN_EXTENSIONS = ['extra', 'codehilite', 'tables', 'toc']
+    
+    def __init__(self):
+        self.reset()
+    
+    def reset(self):
+        """Clear buffered text and rendered blocks"""
+        self._chunks = []  # Received answer text, joined when it is read
+        self.summary = None  # Formatted chat summary, available before the detailed answer finishes
+        self.active = False
+        self._committed_html = []  # Rendered HTML of finished markdown blocks
+        self._committed_chars = 0  # Length of source text already rendered into finished blocks
+        self._version = 0
+        self._rendered_version = -1
+        self._rendered_html = ""
+    
+    def start(self):
+        """Begin streaming a new answer"""
+        self.reset()
+        self.active = True
+    
+    def finish(self):
+        """Mark the stream as finished"""
+        self.active = False
+    
+    @property
+    def text(self) -> str:
+        """Answer text received so far"""
+        if len(self._chunks) > 1:
+            self._chunks = ["".join(self._chunks)]
+        return self._chunks[0] if self._chunks else ""
+    
+    def set_text(self, text: str):
+        """Replace the buffered answer text"""
+        if text != self.text:
+            self._chunks = [text]
+            self._version += 1
+    
+    def append_text(self, delta: str):
+        """Add the next piece of the streamed answer"""
+        if delta:
+            self._chunks.append(delta)
+            self._version += 1
+    
+    def set_summary(self, summary: str):
+        """Store the formatted chat summary as soon as it is generated"""
+        self.summary = summary
+    
+    def render(self) -> str:
+        """Render the answer received so far, re-rendering only the unfinished trailing block"""
+        if self._version == self._rendered_version:
+            return self._rendered_html
+        
+        if not self.text.strip():
+            self._rendered_version = self._version
+            self._rendered_html = ""
+            return ""
+        
+        # Commit blocks that are terminated by a blank line outside of a code fence
+        pending = self.text[self._committed_chars:]
+        search_from = 0
+        while True:
+            split = pending.find('\n\n', search_from)
+            if split == -1:
+                break
+            block = pending[:split]
+            if block.count('```') % 2:
+                # Still inside a fenced code block, keep it pending
+                search_from = split + 2
+                continue
+            if block.strip():
+                self._committed_html.append(self._render_block(block, first=not self._committed_html))
+            self._committed_chars += split + 2
+            pending = pending[split + 2:]
+            search_from = 0
+        
+        tail_html = self._render_block(pending, first=not self._committed_html) if pending.strip() else ""
+        
+        self._rendered_version = self._version
+        self._rendered_html = self._format_streaming_answer("".join(self._committed_html) + tail_html)
+        return self._rendered_html
+    
+    def _render_block(self, block: str, first: bool) -> str:
+        """Standardize and render one markdown block"""
+        if first:
+            block = QuestionProcessor.standardize_detailed_answer_format(block)
+        else:
+            block = QuestionProcessor.standardize_markdown_block(block)
+        return markdown.markdown(block, extensions=self.MARKDOWN_EXTENSIONS)
+    
+    def _format_streaming_answer(self, markdown_answer: str) -> str:
+        """Wrap partial answer HTML in the detailed answer container"""
+        return f"""
+        <div class="answer-container" style="
+            background: #ffffff;
+            border-radius: 8px;
+            padding: 0;
+            margin-bottom: 15px;
+            border-left: 4px solid #007bff;
+            overflow-y: auto;
+            max-height: calc(100vh - 200px);
+            box-shadow: 0 2px 8px rgba(0,0,0,0.08);
+        ">
+            <div style="display: flex; align-items: center; padding: 20px 24px 15px 24px; background: #f8fafc; border-bottom: 1px solid #e2e8f0;">
+                <span style="font-size: 1.1rem; margin-right: 8px;">📋</span>
+                <strong style="font-size: 1.05rem; color: #2c3e50;">Detailed Analysis Report</strong>
+                <span style="margin-left: auto; color: #6c757d; font-size: 0.85rem;">⏳ Generating...</span>
+            </div>
+            <div class="markdown-content document-style english-optimized">
+                {markdown_answer}
+            </div>
+        </div>
+        """
@@ -1,5 +1,4 @@
 from shiny import ui, reactive
-import asyncio
 from datetime import datetime
 
 class MessageHandlers:
@@ -9,12 +8,26 @@ class MessageHandlers:
         self.question_processor = question_processor
         self.history_manager = history_manager
     
-    def setup_handlers(self, input, chat_messages, current_answer, is_processing, output_language):
+    def setup_handlers(self, input, chat_messages, current_answer, is_processing, output_language, live_answer=None):
         """Setup all message handling events"""
         
+        @reactive.extended_task
+        async def answer_task(question, messages, language, verbosity, timestamp):
+            """Run the RAG pipeline outside the reactive flush so other sessions stay responsive"""
+            try:
+                result = await self.question_processor.process_question(
+                    question, messages, language, stream=live_answer, verbosity=verbosity
+                )
+                return question, timestamp, result, None
+            except Exception as e:
+                return question, timestamp, None, e
+            finally:
+                if live_answer is not None:
+                    live_answer.finish()
+        
         @reactive.Effect
         @reactive.event(input.send_message)
-        async def handle_send_message():
+        def handle_send_message():
             """Handle send message event"""
             question = input.chat_input().strip()
             if not question or is_processing.get():
@@ -23,50 +36,80 @@ class MessageHandlers:
             is_processing.set(True)
             timestamp = datetime.now()
             
-            try:
-                # Add user message
-                messages = chat_messages.get().copy()
-                messages.append({
-                    'type': 'user',
-                    'content': question,
-                    'timestamp': timestamp
-                })
-                chat_messages.set(messages)
-                ui.update_text_area("chat_input", value="")
-                
-                # Process question
-                result = await self.question_processor.process_question(
-                    question, messages, output_language.get()
-                )
-                
-                # Add assistant reply
-                current_messages = chat_messages.get().copy()
-                current_messages.append({
-                    'type': 'assistant',
-                    'content': result['summary_answer'],
-                    'timestamp': timestamp
-                })
-                chat_messages.set(current_messages)
-                
-                # Set detailed answer and add to history
-                current_answer.set(result['detailed_answer'])
-                self.history_manager.add_to_history(
-                    question, result['detailed_answer'], 
-                    result['summary_answer'], timestamp
-                )
-                
-            except Exception as e:
-                print(f"Error processing message: {e}")
-                # 简化错误处理
-                current_messages = chat_messages.get().copy()
-                current_messages.append({
-                    'type': 'assistant',
-                    'content': f'抱歉，处理您的问题时出现错误：{str(e)}',
-                    'timestamp': timestamp
-                })
-                chat_messages.set(current_messages)
-            finally:
-                is_processing.set(False)
+            # Add user message
+            messages = chat_messages.get().copy()
+            messages.append({
+                'type': 'user',
+                'content': question,
+                'timestamp': timestamp
+            })
+            chat_messages.set(messages)
+            ui.update_text_area("chat_input", value="")
+            
+            # Clear the previous answer before any poller sees the new question in progress
+            if live_answer is not None:
+                live_answer.start()
+            
+            # Process question in the background, "auto" verbosity defers to the question type
+            verbosity = input.answer_verbosity()
+            answer_task(question, messages, output_language.get(), None if verbosity == "auto" else verbosity, timestamp)
+        
+        def publish_reply(content, timestamp):
+            """Add the assistant reply, replacing the summary shown while the answer streamed"""
+            current_messages = chat_messages.get().copy()
+            reply = {
+                'type': 'assistant',
+                'content': content,
+                'timestamp': timestamp
+            }
+            if current_messages and current_messages[-1]['type'] == 'assistant':
+                current_messages[-1] = reply
+            else:
+                current_messages.append(reply)
+            chat_messages.set(current_messages)
+        
+        @reactive.Effect
+        def publish_summary():
+            """Show the chat summary as soon as it is ready, before the detailed answer has finished"""
+            if live_answer is None or not is_processing.get():
+                return
+            if live_answer.summary is None:
+                reactive.invalidate_later(0.25)
+                return
+            
+            with reactive.isolate():
+                current_messages = chat_messages.get()
+                if current_messages and current_messages[-1]['type'] == 'user':
+                    publish_reply(live_answer.summary, current_messages[-1]['timestamp'])
+        
+        @reactive.Effect
+        def handle_answer_ready():
+            """Publish the answer once the background task has finished"""
+            if answer_task.status() != "success":
+                return
+            
+            with reactive.isolate():
+                question, timestamp, result, error = answer_task.result()
+                try:
+                    if error is not None:
+                        raise error
+                    
+                    # Add assistant reply
+                    publish_reply(result['summary_answer'], timestamp)
+                    
+                    # Set detailed answer and add to history
+                    current_answer.set(result['detailed_answer'])
+                    self.history_manager.add_to_history(
+                        question, result['detailed_answer'], 
+                        result['summary_answer'], timestamp
+                    )
+                    
+                except Exception as e:
+                    print(f"Error processing message: {e}")
+                    # 简化错误处理
+                    publish_reply(f'抱歉，处理您的问题时出现错误：{str(e)}', timestamp)
+                finally:
+                    is_processing.set(False)
         
         # 简化示例问题处理
         example_questions = {
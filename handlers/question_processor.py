@@ -1,13 +1,16 @@
 import markdown
 import re
+import asyncio
+from monitoring.metrics import METRICS
 from .utils import StyleConstants
 
 class QuestionProcessor:
     """Question processor class for handling user queries"""
     
-    def __init__(self, rag_system=None, system_ready=False):
+    def __init__(self, rag_system=None, system_ready=False, startup=None):
         self.rag_system = rag_system
         self.system_ready = system_ready
+        self.startup = startup  # WHISystemStartup when the RAG system is built in the background
     
     @staticmethod
     def standardize_detailed_answer_format(raw_answer: str) -> str:
@@ -16,6 +19,11 @@ class QuestionProcessor:
         if not raw_answer.strip().startswith('#'):
             raw_answer = f"## Detailed Analysis\n\n{raw_answer}"
         
+        return QuestionProcessor.standardize_markdown_block(raw_answer)
+    
+    @staticmethod
+    def standardize_markdown_block(raw_answer: str) -> str:
+        """Apply title, list and numeric highlighting rules to a piece of markdown"""
         # Standardize title format
         raw_answer = re.sub(r'^#{1,6}\s*(.+)$', lambda m: f"## {m.group(1).strip()}", raw_answer, flags=re.MULTILINE)
         
@@ -93,9 +101,24 @@ class QuestionProcessor:
         
         return result.strip()
 
-    async def process_question(self, question: str, chat_messages: list, output_language: str = "english"):
-        """Main logic for processing questions with language control"""
+    async def process_question(self, question: str, chat_messages: list, output_language: str = "english", stream=None, verbosity=None):
+        """Main logic for processing questions with language and verbosity control
+        
+        When a StreamingAnswer is passed as ``stream``, the chat summary is pushed into
+        it as soon as it is ready and the detailed answer chunk by chunk while the model
+        is still generating. ``verbosity`` is "brief", "standard", "exhaustive" or None
+        for the question type default.
+        """
         try:
+            if self.startup is not None and not self.system_ready:
+                # Questions asked during warm-up wait for it instead of getting demo answers
+                if stream is not None and not self.startup.is_done:
+                    stream.set_text("*The system is still warming up, your question will be answered as soon as it is ready.*")
+                if await self.startup.wait():
+                    self.rag_system, self.system_ready = self.startup.rag_system, True
+                if stream is not None:
+                    stream.set_text("")  # Answer deltas are appended to the buffer
+            
             if self.rag_system and self.system_ready:
                 # Get conversation history
                 conversation_history = []
@@ -123,31 +146,20 @@ class QuestionProcessor:
                     conversation_history = conversation_history[-3:]
                 
                 # Process using RAG system with language parameter
-                result = self.rag_system.process_question(question, conversation_history, output_language)
-                
-                # Get detailed answer and summary answer
-                detailed_answer = result.get('answer', 'No answer generated')
-                
-                # Add format standardization
-                detailed_answer = self.standardize_detailed_answer_format(detailed_answer)
-                
-                summary_answer = result.get('summary_answer', 'No summary generated')
-                confidence = result.get('confidence_score', 0)
-                sources = result.get('sources', [])
-                
-                # Convert detailed answer to markdown format
-                markdown_answer = markdown.markdown(detailed_answer, extensions=['extra', 'codehilite', 'tables', 'toc'])
-                
-                # Format detailed answer
-                formatted_detailed_answer = self._format_detailed_answer(markdown_answer, confidence, sources)
+                if stream is None:
+                    result = await self.rag_system.aprocess_question(question, conversation_history, output_language, verbosity)
+                else:
+                    result = {}
+                    async for event in self.rag_system.astream_question(question, conversation_history, output_language, verbosity):
+                        if event["type"] == "summary":
+                            stream.set_summary(self.format_summary_answer(event["summary_answer"]))
+                        elif event["type"] == "answer_delta":
+                            stream.append_text(event["delta"])
+                        elif event["type"] == "result":
+                            result = event["result"]
                 
-                # 在返回结果前格式化summary_answer
-                formatted_summary = self.format_summary_answer(summary_answer)
-                
-                return {
-                    'summary_answer': formatted_summary,  # 返回格式化的HTML
-                    'detailed_answer': formatted_detailed_answer
-                }
+                # Regex formatting and markdown rendering are CPU-bound, keep them off the event loop
+                return await asyncio.to_thread(self._timed_render, result)
             else:
                 # Simple keyword matching fallback logic
                 return self._fallback_answer(question)
@@ -170,6 +182,37 @@ class QuestionProcessor:
                 'detailed_answer': formatted_error
             }
     
+    def _timed_render(self, result: dict) -> dict:
+        """Render a RAG result, recording the rendering time in the metrics"""
+        with METRICS.timer("whi_answer_render_duration_seconds"):
+            return self._render_result(result)
+    
+    def _render_result(self, result: dict) -> dict:
+        """Render RAG result into chat summary text and detailed answer HTML"""
+        # Get detailed answer and summary answer
+        detailed_answer = result.get('answer', 'No answer generated')
+        
+        # Add format standardization
+        detailed_answer = self.standardize_detailed_answer_format(detailed_answer)
+        
+        summary_answer = result.get('summary_answer', 'No summary generated')
+        confidence = result.get('confidence_score', 0)
+        sources = result.get('sources', [])
+        
+        # Convert detailed answer to markdown format
+        markdown_answer = markdown.markdown(detailed_answer, extensions=['extra', 'codehilite', 'tables', 'toc'])
+        
+        # Format detailed answer
+        formatted_detailed_answer = self._format_detailed_answer(markdown_answer, confidence, sources)
+        
+        # 在返回结果前格式化summary_answer
+        formatted_summary = self.format_summary_answer(summary_answer)
+        
+        return {
+            'summary_answer': formatted_summary,  # 返回格式化的HTML
+            'detailed_answer': formatted_detailed_answer
+        }
+    
     def _format_detailed_answer(self, markdown_answer: str, confidence: float, sources: list) -> str:
         """Format detailed answer with styling and metadata"""
         return f"""
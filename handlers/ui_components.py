@@ -5,14 +5,19 @@ class UIComponents:
     """UI component rendering class for creating interface elements"""
     
     @staticmethod
-    def chat_system_status(system_ready: bool):
-        """Display chat system status"""
+    def chat_system_status(state: str, message: str = "", progress: float = 0.0):
+        """Display chat system status: "warming" with progress, "ready" or "degraded" """
         status_style = "padding: 10px 15px; border-radius: 8px; font-size: 0.9rem; margin-bottom: 15px; font-weight: 600;"
-        if system_ready:
+        if state == "ready":
             return ui.div(
                 "✅ RAG System Ready",
                 style=f"{status_style} {StyleConstants.SUCCESS_STYLE}"
             )
+        elif state == "warming":
+            return ui.div(
+                f"⏳ Warming up: {message} ({progress:.0%}) - questions are queued until ready",
+                style=f"{status_style} {StyleConstants.INFO_STYLE}"
+            )
         else:
             return ui.div(
                 "⚠️ Demo Mode",
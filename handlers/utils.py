@@ -52,8 +52,18 @@ class UIUtils:
                         ],
                         style="flex: 1; text-align: center;"
                     ),
-                    # Right: Language toggle button - 简化版本
+                    # Right: Answer verbosity selector and language toggle button - 简化版本
                     ui.div(
+                        ui.div(
+                            {"class": "verbosity-select", "title": "Answer length"},
+                            ui.input_select(
+                                "answer_verbosity",
+                                None,
+                                {"auto": "📏 Auto", "brief": "Brief", "standard": "Standard", "exhaustive": "Exhaustive"},
+                                selected="auto",
+                                width="130px"
+                            )
+                        ),
                         ui.div(
                             {
                                 "class": "language-toggle-container",
@@ -78,7 +88,7 @@ class UIUtils:
                                 )
                             ]
                         ),
-                        style="flex: 0 0 auto;"
+                        style="flex: 0 0 auto; display: flex; align-items: center; gap: 12px;"
                     )
                 )
             ),
@@ -198,6 +208,23 @@ class UIUtils:
                     transform: translateY(-1px);
                 }
                 
+                /* Answer verbosity selector, sized to sit next to the language toggle */
+                .verbosity-select .form-group {
+                    margin-bottom: 0;
+                }
+                
+                .verbosity-select select {
+                    height: 30px;
+                    padding: 2px 8px;
+                    font-size: 12px;
+                    font-weight: 600;
+                    color: #451a03;
+                    border: 2px solid #451a03;
+                    border-radius: 15px;
+                    background-color: #f8f9fa;
+                    cursor: pointer;
+                }
+                
                 /* 中文模式样式 */
                 .language-toggle-container.chinese .language-slider {
                     left: 32px !important;
@@ -0,0 +1,122 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+from config.settings import WHIConfig
+
+class WHILLMCassette:
+    """Record LLM responses to a JSON-lines file and replay them offline.
+
+    Entries are keyed by a hash of the messages and the request options that shape the
+    output (model, temperature, max_tokens, ...), so streamed and non-streamed calls
+    with the same prompt share an entry. Replay can wait for the recorded latency,
+    scaled by ``latency_scale`` (0 answers immediately).
+    """
+    
+    MODES = ("record", "replay")
+    IGNORED_PARAMS = ("stream", "stream_options", "timeout")  # Do not change the response
+    
+    def __init__(self, path: str, mode: str, latency_scale: float = 0.0):
+        if mode not in self.MODES:
+            raise Exception(f"Unknown cassette mode {mode!r}, expected one of {self.MODES}")
+        self.path = path
+        self.mode = mode
+        self.latency_scale = latency_scale
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._entries[entry["key"]] = entry  # Later recordings win
+        elif mode == "replay":
+            raise Exception(f"No LLM cassette at {path}, record one first")
+    
+    @classmethod
+    def from_config(cls) -> Optional["WHILLMCassette"]:
+        """Cassette configured in WHIConfig, None when LLM calls go to the API unrecorded."""
+        if not WHIConfig.LLM_CASSETTE_MODE:
+            return None
+        return cls(WHIConfig.LLM_CASSETTE_PATH, WHIConfig.LLM_CASSETTE_MODE, WHIConfig.LLM_CASSETTE_LATENCY)
+    
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    @classmethod
+    def request_key(cls, messages: List[Dict[str, str]], params: Dict[str, Any]) -> str:
+        options = {key: value for key, value in params.items() if key not in cls.IGNORED_PARAMS}
+        canonical = json.dumps({"messages": messages, "options": options}, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+    
+    def record(self, messages: List[Dict[str, str]], params: Dict[str, Any], chunks: List[Tuple[float, str]], usage, seconds: float) -> None:
+        """Append a response; ``chunks`` are (seconds since the request, text) pairs."""
+        key = self.request_key(messages, params)
+        entry = {
+            "key": key,
+            "model": params.get("model"),
+            "messages": messages,
+            "options": {k: v for k, v in params.items() if k not in self.IGNORED_PARAMS},
+            "chunks": [[round(offset, 4), text] for offset, text in chunks],
+            "usage": {
+                "prompt_tokens": getattr(usage, "prompt_tokens", None) or 0,
+                "completion_tokens": getattr(usage, "completion_tokens", None) or 0
+            },
+            "latency": round(seconds, 4)
+        }
+        with self._lock:
+            self._entries[key] = entry
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    
+    def replay(self, messages: List[Dict[str, str]], params: Dict[str, Any]) -> Tuple[str, SimpleNamespace]:
+        """Recorded (content, usage), waiting for the scaled latency."""
+        entry = self._entry(messages, params)
+        time.sleep(entry["latency"] * self.latency_scale)
+        return self._content(entry), SimpleNamespace(**entry["usage"])
+    
+    async def areplay(self, messages: List[Dict[str, str]], params: Dict[str, Any]) -> Tuple[str, SimpleNamespace]:
+        entry = self._entry(messages, params)
+        await asyncio.sleep(entry["latency"] * self.latency_scale)
+        return self._content(entry), SimpleNamespace(**entry["usage"])
+    
+    async def astream(self, messages: List[Dict[str, str]], params: Dict[str, Any], usage_out: List) -> AsyncIterator[str]:
+        """Replay recorded chunks at their recorded pace; the usage is appended to ``usage_out``."""
+        entry = self._entry(messages, params)
+        elapsed = 0.0
+        for offset, text in self._chunks(entry):
+            await asyncio.sleep(max(0.0, offset - elapsed) * self.latency_scale)
+            elapsed = max(elapsed, offset)
+            yield text
+        usage_out.append(SimpleNamespace(**entry["usage"]))
+    
+    def _entry(self, messages: List[Dict[str, str]], params: Dict[str, Any]) -> Dict[str, Any]:
+        key = self.request_key(messages, params)
+        entry = self._entries.get(key)
+        if entry is None:
+            raise Exception(f"No recorded response for this {params.get('model')} request ({key[:12]}), re-record the cassette")
+        return entry
+    
+    @staticmethod
+    def _content(entry: Dict[str, Any]) -> str:
+        return "".join(text for _, text in entry["chunks"])
+    
+    @staticmethod
+    def _chunks(entry: Dict[str, Any]) -> Iterator[Tuple[float, str]]:
+        if len(entry["chunks"]) == 1:
+            # Recorded without streaming - spread the text over the call's latency
+            text = entry["chunks"][0][1]
+            pieces = [text[i:i + 20] for i in range(0, len(text), 20)] or [""]
+            for n, piece in enumerate(pieces, 1):
+                yield entry["latency"] * n / len(pieces), piece
+        else:
+            yield from ((offset, text) for offset, text in entry["chunks"])
@@ -0,0 +1,267 @@
+import json
+from typing import Any, Dict, List, Optional
+
+class PartialJSONStream:
+    """Incrementally parse the JSON object in LLM output that arrives in chunks.
+
+    Text before the object (thinking preambles, markdown fences, prose) and after it is
+    ignored. ``feed`` returns an event for every member value completed by the chunk, so
+    callers can act on a field before the rest of the response has been generated (the
+    classification node stops reading once ``question_classification`` is complete; the
+    detailed answer streams as markdown and does not go through this parser);
+    ``close`` returns the object with unterminated strings, lists and objects cut at the
+    current position, so a truncated or malformed response still yields its fields.
+    """
+    
+    _ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+    _LITERALS = {"true": True, "false": False, "null": None}
+    _THINK_OPEN = "<think>"
+    _THINK_CLOSE = "</think>"
+    
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0  # Index of the next unparsed character
+        self._root_start: Optional[int] = None
+        self._stack = []  # Open containers as [container, key or index of the member being parsed]
+        self._expect = "value"  # Next token: "value", "key", "colon" or "comma"
+        self._string: Optional[List[str]] = None  # Decoded parts of the string being read
+        self._string_is_key = False
+        self._literal: Optional[List[str]] = None  # Characters of the number or literal being read
+        self._events = []
+        self.value: Optional[Dict[str, Any]] = None
+        self.complete = False
+        self.error: Optional[str] = None
+    
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """Consume a chunk of raw model output and return the field events it completed.
+
+        Each event is ``{"field": dotted path, "value": value}``, e.g. the field
+        ``question_classification.question_type`` once its string is closed and then
+        ``question_classification`` once its object is.
+        """
+        self._buffer += chunk
+        self._events = []
+        if self.complete or self.error:
+            return self._events
+        
+        while self._root_start is not None or self._find_root():
+            try:
+                self._parse()
+                break
+            except ValueError as e:
+                if self.value:
+                    # Keep the fields parsed before the malformed part
+                    self.error = str(e)
+                    break
+                # A brace in the preamble, not the answer object - look for the next one
+                self._restart()
+        return self._events
+    
+    def close(self) -> Optional[Dict[str, Any]]:
+        """Finish the stream and return the (possibly partial) object, None if none was found."""
+        if self._string is not None and not self._string_is_key and not self.error:
+            self._assign("".join(self._string), new=False)  # Cut at the end of the stream
+        if self._literal is not None and self._stack and not self.error:
+            try:
+                self._end_literal()
+            except ValueError:
+                pass
+        return self.value
+    
+    def _find_root(self) -> bool:
+        """Skip to the opening brace of the object, stepping over <think> blocks."""
+        while True:
+            brace = self._buffer.find("{", self._pos)
+            think = self._buffer.find(self._THINK_OPEN, self._pos)
+            if think != -1 and (brace == -1 or think < brace):
+                end = self._buffer.find(self._THINK_CLOSE, think)
+                if end == -1:
+                    self._pos = think
+                    return False
+                self._pos = end + len(self._THINK_CLOSE)
+                continue
+            if brace == -1:
+                # Keep a tag split across chunks in view
+                self._pos = max(self._pos, len(self._buffer) - len(self._THINK_OPEN) + 1)
+                return False
+            self._root_start = self._pos = brace
+            return True
+    
+    def _restart(self) -> None:
+        self._pos = self._root_start + 1
+        self._root_start = None
+        self._stack = []
+        self._expect = "value"
+        self._string = None
+        self._literal = None
+        self.value = None
+    
+    def _parse(self) -> None:
+        buffer = self._buffer
+        pos = self._pos
+        try:
+            while pos < len(buffer) and not self.complete:
+                if self._string is not None:
+                    pos = self._read_string(buffer, pos)
+                    if self._string is not None:
+                        break  # Incomplete escape sequence, wait for more data
+                    continue
+                
+                ch = buffer[pos]
+                if self._literal is not None:
+                    if ch in ",}]" or ch.isspace():
+                        self._end_literal()
+                    else:
+                        self._literal.append(ch)
+                        pos += 1
+                    continue
+                
+                if not ch.isspace():
+                    self._token(ch)
+                pos += 1
+        finally:
+            self._pos = pos
+    
+    def _token(self, ch: str) -> None:
+        top = self._stack[-1][0] if self._stack else None
+        if self._expect == "value":
+            if ch == "{":
+                self._open({})
+            elif ch == "[":
+                self._open([])
+            elif ch == '"':
+                self._assign("", new=True)
+                self._start_string(is_key=False)
+            elif ch in "-0123456789tfn" and self._stack:
+                self._literal = [ch]
+            elif ch == "]" and isinstance(top, list):
+                self._close(ch)  # Empty list or trailing comma
+            else:
+                raise ValueError(f"Unexpected {ch!r} where a value was expected")
+        elif self._expect == "key":
+            if ch == '"':
+                self._start_string(is_key=True)
+            elif ch == "}":
+                self._close(ch)  # Empty object or trailing comma
+            else:
+                raise ValueError(f"Unexpected {ch!r} where a key was expected")
+        elif self._expect == "colon":
+            if ch != ":":
+                raise ValueError(f"Unexpected {ch!r} where ':' was expected")
+            self._expect = "value"
+        elif ch == ",":
+            self._expect = "key" if isinstance(top, dict) else "value"
+        elif ch in "}]":
+            self._close(ch)
+        else:
+            raise ValueError(f"Unexpected {ch!r} where ',' was expected")
+    
+    def _open(self, container) -> None:
+        if self._stack:
+            self._assign(container, new=True)
+        else:
+            self.value = container
+        self._stack.append([container, None])
+        self._expect = "key" if isinstance(container, dict) else "value"
+    
+    def _close(self, ch: str) -> None:
+        container = self._stack[-1][0]
+        if (ch == "}") != isinstance(container, dict):
+            raise ValueError(f"Mismatched {ch!r}")
+        self._stack.pop()
+        if self._stack:
+            self._member_done(container)
+        else:
+            self.complete = True
+    
+    def _assign(self, value: Any, new: bool) -> None:
+        """Set the value of the member being parsed; ``new`` appends a list element."""
+        frame = self._stack[-1]
+        container = frame[0]
+        if isinstance(container, dict):
+            container[frame[1]] = value
+        elif new:
+            container.append(value)
+            frame[1] = len(container) - 1
+        else:
+            container[-1] = value
+    
+    def _member_done(self, value: Any) -> None:
+        self._events.append({"field": ".".join(str(frame[1]) for frame in self._stack), "value": value})
+        self._expect = "comma"
+    
+    def _start_string(self, is_key: bool) -> None:
+        self._string = []
+        self._string_is_key = is_key
+    
+    def _end_string(self) -> None:
+        text = "".join(self._string)
+        self._string = None
+        if self._string_is_key:
+            self._stack[-1][1] = text
+            self._expect = "colon"
+        else:
+            self._assign(text, new=False)
+            self._member_done(text)
+    
+    def _end_literal(self) -> None:
+        text = "".join(self._literal)
+        self._literal = None
+        if text in self._LITERALS:
+            value = self._LITERALS[text]
+        else:
+            try:
+                value = json.loads(text)
+            except json.JSONDecodeError:
+                raise ValueError(f"Invalid literal {text!r}")
+            if not isinstance(value, (int, float)):
+                raise ValueError(f"Invalid literal {text!r}")
+        self._assign(value, new=True)
+        self._member_done(value)
+    
+    def _read_string(self, buffer: str, pos: int) -> int:
+        """Decode string characters from ``pos``, returning the position reached."""
+        parts = self._string
+        while pos < len(buffer):
+            ch = buffer[pos]
+            if ch == '"':
+                self._end_string()
+                return pos + 1
+            if ch != '\\':
+                # Copy the run of plain characters in one slice
+                end = pos + 1
+                while end < len(buffer) and buffer[end] not in '"\\':
+                    end += 1
+                parts.append(buffer[pos:end])
+                pos = end
+                continue
+            
+            # Escape sequence - wait for more data if it is incomplete
+            if pos + 1 >= len(buffer):
+                return pos
+            code = buffer[pos + 1]
+            if code == 'u':
+                if pos + 6 > len(buffer):
+                    return pos
+                try:
+                    codepoint = int(buffer[pos + 2:pos + 6], 16)
+                except ValueError:
+                    codepoint = None
+                if codepoint is not None and 0xD800 <= codepoint < 0xDC00:
+                    # High surrogate - combine with the following low surrogate
+                    if pos + 12 > len(buffer):
+                        return pos
+                    try:
+                        low = int(buffer[pos + 8:pos + 12], 16)
+                    except ValueError:
+                        low = 0
+                    if buffer[pos + 6:pos + 8] == '\\u' and 0xDC00 <= low < 0xE000:
+                        parts.append(chr(0x10000 + ((codepoint - 0xD800) << 10) + (low - 0xDC00)))
+                        pos += 12
+                        continue
+                parts.append(chr(codepoint) if codepoint is not None else buffer[pos:pos + 6])
+                pos += 6
+            else:
+                parts.append(self._ESCAPES.get(code, code))
+                pos += 2
+        return pos
@@ -1,27 +1,178 @@
-from openai import OpenAI
-from typing import List, Dict, Any
+from typing import List, Dict, Any, AsyncIterator
+from collections import defaultdict, deque
+import asyncio
+import threading
+import time
+import weakref
 from config.settings import WHIConfig
+from llm.cassette import WHILLMCassette
+from monitoring.metrics import METRICS, current_request
 
 class QwenLLMClient:
     """Qwen LLM client wrapper for medical data analysis."""
     
-    def __init__(self):
-        self.client = OpenAI(
-            api_key=WHIConfig.DASHSCOPE_API_KEY,
-            base_url=WHIConfig.DASHSCOPE_BASE_URL
-        )
+    DEFAULT_STAGE = "generate"
+    LATENCY_WINDOW = 200  # Recent calls kept per stage and model for latency stats
     
-    def generate_response(self, messages: List[Dict[str, str]], **kwargs) -> str:
+    def __init__(self, cassette: WHILLMCassette = None):
+        # Record or replay LLM responses (WHIConfig.LLM_CASSETTE_MODE); replay needs no API access
+        self.cassette = cassette if cassette is not None else WHILLMCassette.from_config()
+        self.client = None
+        if not self.replaying:
+            from openai import OpenAI  # Imported at first use, the SDK is slow to import
+            self.client = OpenAI(
+                api_key=WHIConfig.DASHSCOPE_API_KEY,
+                base_url=WHIConfig.DASHSCOPE_BASE_URL
+            )
+        # Event loop -> AsyncOpenAI; a client's connections belong to the loop that opened them
+        self._async_clients = weakref.WeakKeyDictionary()
+        self._async_clients_lock = threading.Lock()
+        self._latencies = defaultdict(lambda: deque(maxlen=self.LATENCY_WINDOW))  # (stage, model) -> seconds
+    
+    @property
+    def replaying(self) -> bool:
+        return self.cassette is not None and self.cassette.replaying
+    
+    @property
+    def async_client(self):
+        """AsyncOpenAI client of the running event loop, created on its first call."""
+        loop = asyncio.get_running_loop()
+        with self._async_clients_lock:
+            client = self._async_clients.get(loop)
+            if client is None:
+                from openai import AsyncOpenAI
+                client = self._async_clients[loop] = AsyncOpenAI(
+                    api_key=WHIConfig.DASHSCOPE_API_KEY,
+                    base_url=WHIConfig.DASHSCOPE_BASE_URL
+                )
+        return client
+    
+    def request_params(self, stage: str = None, **kwargs) -> Dict[str, Any]:
+        """Model and request options for a stage; explicit kwargs override the profile."""
+        profile = WHIConfig.LLM_PROFILES.get(stage or self.DEFAULT_STAGE, WHIConfig.LLM_PROFILES[self.DEFAULT_STAGE])
+        params = {key: value for key, value in profile.items() if value is not None}
+        params.setdefault("model", WHIConfig.MODEL_NAME)
+        params.update(kwargs)
+        return params
+    
+    def generate_response(self, messages: List[Dict[str, str]], stage: str = None, **kwargs) -> str:
         """Generate response from LLM."""
+        params = self.request_params(stage, **kwargs)
+        start = time.perf_counter()
+        usage, failed = None, True
         try:
-            completion = self.client.chat.completions.create(
-                model=WHIConfig.MODEL_NAME,
-                messages=messages,
-                **kwargs
-            )
-            return completion.choices[0].message.content
+            if self.replaying:
+                content, usage = self.cassette.replay(messages, params)
+            else:
+                completion = self.client.chat.completions.create(messages=messages, **params)
+                content, usage = completion.choices[0].message.content, completion.usage
+                self._record(messages, params, [(time.perf_counter() - start, content)], usage, start)
+            failed = False
+            return content
         except Exception as e:
             raise Exception(f"LLM call failed: {str(e)}")
+        finally:
+            self._record_call(stage, params["model"], start, usage, failed)
+    
+    async def agenerate_response(self, messages: List[Dict[str, str]], stage: str = None, **kwargs) -> str:
+        """Generate response from LLM without blocking the event loop."""
+        params = self.request_params(stage, **kwargs)
+        start = time.perf_counter()
+        usage, failed = None, True
+        try:
+            if self.replaying:
+                content, usage = await self.cassette.areplay(messages, params)
+            else:
+                completion = await self.async_client.chat.completions.create(messages=messages, **params)
+                content, usage = completion.choices[0].message.content, completion.usage
+                self._record(messages, params, [(time.perf_counter() - start, content)], usage, start)
+            failed = False
+            return content
+        except Exception as e:
+            raise Exception(f"LLM call failed: {str(e)}")
+        finally:
+            self._record_call(stage, params["model"], start, usage, failed)
+    
+    async def astream_response(self, messages: List[Dict[str, str]], stage: str = None, **kwargs) -> AsyncIterator[str]:
+        """Stream response content deltas from LLM as they are generated; closing the generator early ends the request."""
+        params = self.request_params(stage, **kwargs)
+        params.setdefault("stream_options", {"include_usage": True})  # Token counts arrive in a final chunk
+        start = time.perf_counter()
+        usage, failed = None, True
+        try:
+            if self.replaying:
+                replayed_usage = []
+                async for content in self.cassette.astream(messages, params, replayed_usage):
+                    yield content
+                usage = replayed_usage[0]
+            else:
+                chunks = []  # (seconds since the request, text) for the cassette
+                stream = await self.async_client.chat.completions.create(messages=messages, stream=True, **params)
+                try:
+                    async for chunk in stream:
+                        if chunk.usage:
+                            usage = chunk.usage
+                        if chunk.choices and chunk.choices[0].delta.content:
+                            chunks.append((time.perf_counter() - start, chunk.choices[0].delta.content))
+                            yield chunk.choices[0].delta.content
+                except GeneratorExit:
+                    # The caller stopped reading: end the request, a replay stops at the same point
+                    await stream.close()
+                    self._record(messages, params, chunks, usage, start)
+                    raise
+                self._record(messages, params, chunks, usage, start)
+            failed = False
+        except GeneratorExit:
+            failed = False
+            raise
+        except Exception as e:
+            raise Exception(f"LLM call failed: {str(e)}")
+        finally:
+            self._record_call(stage, params["model"], start, usage, failed)
+    
+    def latency_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Per stage and model: call count and p50/p95 latency in ms over recent calls."""
+        import numpy as np
+        stats = {}
+        for (stage, model), seconds in list(self._latencies.items()):
+            latencies = np.asarray(seconds) * 1000
+            stats[f"{stage}:{model}"] = {
+                "calls": len(latencies),
+                "p50_ms": float(np.percentile(latencies, 50)),
+                "p95_ms": float(np.percentile(latencies, 95))
+            }
+        return stats
+    
+    def _record(self, messages: List[Dict[str, str]], params: Dict[str, Any], chunks, usage, start: float) -> None:
+        """Save a successful response when recording a cassette."""
+        if self.cassette is not None and not self.cassette.replaying:
+            self.cassette.record(messages, params, chunks, usage, time.perf_counter() - start)
+    
+    def _record_call(self, stage: str, model: str, start: float, usage=None, failed: bool = False) -> None:
+        """Record latency and token usage of one call in the stats, the metrics and the current question."""
+        seconds = time.perf_counter() - start
+        stage = stage or self.DEFAULT_STAGE
+        self._latencies[(stage, model)].append(seconds)
+        
+        status = "error" if failed else "ok"
+        METRICS.observe("whi_llm_request_duration_seconds", seconds, stage=stage, model=model, status=status)
+        prompt_tokens = getattr(usage, "prompt_tokens", None) or 0
+        completion_tokens = getattr(usage, "completion_tokens", None) or 0
+        if prompt_tokens:
+            METRICS.inc("whi_llm_tokens_total", prompt_tokens, stage=stage, model=model, kind="prompt")
+        if completion_tokens:
+            METRICS.inc("whi_llm_tokens_total", completion_tokens, stage=stage, model=model, kind="completion")
+        
+        record = current_request()
+        if record is not None:
+            record["llm_calls"].append({
+                "stage": stage,
+                "model": model,
+                "status": status,
+                "ms": seconds * 1000,
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens
+            })
     
     def generate_embedding_query(self, text: str) -> str:
         """Generate optimized query for retrieval."""
@@ -29,4 +180,4 @@ class QwenLLMClient:
             {"role": "system", "content": "You are a professional medical research assistant, skilled at converting user questions into precise retrieval queries."},
             {"role": "user", "content": f"Please convert the following question into keyword queries suitable for retrieval in WHI medical data: {text}"}
         ]
-        return self.generate_response(messages)
\ No newline at end of file
+        return self.generate_response(messages, stage="classify")
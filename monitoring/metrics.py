@@ -0,0 +1,147 @@
+import contextvars
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+class WHIMetrics:
+    """Process-wide counters and latency histograms, rendered in the Prometheus text format.
+
+    Values read from other components at scrape time (cache sizes and counters) come
+    from collectors. Every process keeps its own registry, so with several workers
+    each one reports only the questions it answered.
+    """
+    
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+    
+    # name -> (type, help); every exported metric is declared here
+    DEFINITIONS = {
+        "whi_questions_total": ("counter", "Questions answered, by outcome (answered, cached, error)"),
+        "whi_question_duration_seconds": ("histogram", "Wall time to answer a question, by outcome"),
+        "whi_node_duration_seconds": ("histogram", "Wall time per LangGraph node"),
+        "whi_llm_request_duration_seconds": ("histogram", "LLM call latency, by stage, model and status"),
+        "whi_llm_tokens_total": ("counter", "LLM tokens reported by the API, by stage, model and kind"),
+        "whi_retrieval_step_duration_seconds": ("histogram", "Retrieval step latency (embed, dense, sparse, documents, pack)"),
+        "whi_context_tokens_total": ("counter", "Document context tokens, by kind (retrieved, packed into the answer prompt, summary prompt)"),
+        "whi_retrievals_total": ("counter", "Document retrievals, by source (lookup, vector)"),
+        "whi_retrieved_documents_total": ("counter", "Documents returned by retrieval, by source"),
+        "whi_answer_render_duration_seconds": ("histogram", "Markdown to HTML rendering time of a finished answer"),
+        "whi_answer_cache_lookups_total": ("counter", "Answer cache lookups, by result"),
+        "whi_answer_cache_evictions_total": ("counter", "Answer cache entries evicted or expired, by reason"),
+        "whi_answer_cache_entries": ("gauge", "Answers currently cached"),
+        "whi_query_embedding_cache_lookups_total": ("counter", "Query embedding cache lookups, by result"),
+        "whi_query_embedding_cache_entries": ("gauge", "Query embeddings currently cached"),
+        "whi_system_ready": ("gauge", "1 once the RAG system is loaded, 0 while warming up or degraded"),
+    }
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(float)  # (name, labels) -> value
+        self._histograms = {}  # (name, labels) -> [cumulative count per bucket..., total count, sum]
+        self._collectors = []  # Callables returning (name, labels dict, value) samples
+    
+    def inc(self, name: str, value: float = 1.0, **labels) -> None:
+        with self._lock:
+            self._counters[(name, self._label_key(labels))] += value
+    
+    def observe(self, name: str, seconds: float, **labels) -> None:
+        key = (name, self._label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [0] * (len(self.BUCKETS) + 1) + [0.0]
+            for i, bound in enumerate(self.BUCKETS):
+                if seconds <= bound:
+                    histogram[i] += 1
+            histogram[-2] += 1
+            histogram[-1] += seconds
+    
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """Observe the wall time of the block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+    
+    def add_collector(self, collector: Callable[[], Iterable[Tuple[str, Dict[str, str], float]]]) -> None:
+        """Register a callable sampled at every scrape."""
+        with self._lock:
+            self._collectors.append(collector)
+    
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        samples = defaultdict(list)  # name -> lines
+        with self._lock:
+            counters = list(self._counters.items())
+            histograms = [(key, list(values)) for key, values in self._histograms.items()]
+            collectors = list(self._collectors)
+        
+        for (name, labels), value in counters:
+            samples[name].append(f"{name}{self._format_labels(labels)} {value:g}")
+        for (name, labels), values in histograms:
+            for bound, count in zip(self.BUCKETS, values):
+                samples[name].append(f"{name}_bucket{self._format_labels(labels + (('le', f'{bound:g}'),))} {count}")
+            samples[name].append(f"{name}_bucket{self._format_labels(labels + (('le', '+Inf'),))} {values[-2]}")
+            samples[name].append(f"{name}_sum{self._format_labels(labels)} {values[-1]:g}")
+            samples[name].append(f"{name}_count{self._format_labels(labels)} {values[-2]}")
+        for collector in collectors:
+            try:
+                for name, labels, value in collector():
+                    samples[name].append(f"{name}{self._format_labels(self._label_key(labels))} {value:g}")
+            except Exception as e:
+                print(f"Metrics collector failed: {str(e)}")
+        
+        lines = []
+        for name in sorted(samples):
+            kind, help_text = self.DEFINITIONS.get(name, ("untyped", name))
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(samples[name])
+        return "\n".join(lines) + "\n"
+    
+    @staticmethod
+    def _label_key(labels: Dict[str, Any]) -> Tuple[Tuple[str, str], ...]:
+        return tuple(sorted((key, str(value)) for key, value in labels.items()))
+    
+    @staticmethod
+    def _format_labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+        if not labels:
+            return ""
+        escaped = (value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, value in labels)
+        return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + "}"
+
+METRICS = WHIMetrics()
+
+# Measurements of the question being answered; asyncio tasks and worker threads started
+# while answering copy the context, so they all add to the same record
+_request = contextvars.ContextVar("whi_request_metrics", default=None)
+
+def start_request() -> Tuple[Dict[str, Any], contextvars.Token]:
+    """Begin recording the measurements of one question.
+
+    Returns the record and the token to pass to ``end_request`` once the question is answered.
+    """
+    record = {"llm_calls": [], "retrieval": {}}
+    return record, _request.set(record)
+
+def end_request(token: contextvars.Token) -> None:
+    """Stop recording into the record ``start_request`` returned ``token`` for."""
+    try:
+        _request.reset(token)
+    except ValueError:
+        # An abandoned async generator is closed from another context; clear that one instead
+        _request.set(None)
+
+def current_request() -> Optional[Dict[str, Any]]:
+    """Record of the question being answered, None outside a question."""
+    return _request.get()
+
+def add_to_request(key: str, value: float) -> None:
+    """Add to a total in the retrieval section of the current record."""
+    record = _request.get()
+    if record is not None:
+        retrieval = record["retrieval"]
+        retrieval[key] = retrieval.get(key, 0) + value
@@ -0,0 +1,123 @@
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from config.settings import WHIConfig
+
+class WHIAnswerCache:
+    """LRU + TTL cache of workflow results keyed on normalized question text and a scope.
+
+    The scope holds the other request settings that shape an answer (output language,
+    verbosity). Exact matches are looked up by key; paraphrases fall back to cosine
+    similarity over question embeddings. Entries are dropped when the cache version
+    (corpus fingerprints, prompt and model versions) changes.
+    """
+    
+    def __init__(self, max_size: int = None, ttl_seconds: float = None, similarity_threshold: float = None):
+        self.max_size = max_size or WHIConfig.ANSWER_CACHE_MAX_SIZE
+        self.ttl_seconds = ttl_seconds or WHIConfig.ANSWER_CACHE_TTL_SECONDS
+        self.similarity_threshold = similarity_threshold or WHIConfig.ANSWER_CACHE_SIMILARITY_THRESHOLD
+        self.version = None
+        self._entries = OrderedDict()  # (scope, normalized question) -> entry dict, oldest first
+        self._lock = threading.Lock()
+        self._counters = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+    
+    @staticmethod
+    def normalize(question: str) -> str:
+        """Case-, width- and whitespace-insensitive form of a question, without trailing punctuation."""
+        text = unicodedata.normalize("NFKC", question).lower()
+        text = re.sub(r"\s+", " ", text).strip()
+        return text.rstrip("?？!！.。 ")
+    
+    @staticmethod
+    def _numbers(text: str) -> List[str]:
+        """Numbers and accessions in a question; paraphrases must agree on them to share an answer."""
+        return sorted(re.findall(r"\d+(?:\.\d+)?", text))
+    
+    def set_version(self, version: str) -> None:
+        """Set the corpus/prompt version, clearing all entries if it changed."""
+        with self._lock:
+            if version != self.version:
+                self._entries.clear()
+                self.version = version
+    
+    def get(self, question: str, scope: str) -> Optional[Dict[str, Any]]:
+        """Return the cached result for an exact (normalized) match, None on a miss."""
+        key = (scope, self.normalize(question))
+        with self._lock:
+            entry = self._live_entry(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            self._counters["exact_hits"] += 1
+            return entry["result"]
+    
+    def get_similar(self, question: str, scope: str, vector: List[float]) -> Optional[Tuple[Dict[str, Any], float]]:
+        """Return (result, similarity) of the closest cached paraphrase above the threshold.
+
+        Counts a miss when nothing qualifies, so call it after ``get``.
+        """
+        query = self._unit(vector)
+        numbers = self._numbers(self.normalize(question))
+        with self._lock:
+            candidates = [
+                (key, entry) for key, entry in list(self._entries.items())
+                if key[0] == scope and entry["numbers"] == numbers and entry["vector"] is not None
+                and self._live_entry(key) is not None
+            ]
+            if candidates:
+                similarities = np.vstack([entry["vector"] for _, entry in candidates]) @ query
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.similarity_threshold:
+                    key, entry = candidates[best]
+                    self._entries.move_to_end(key)
+                    self._counters["semantic_hits"] += 1
+                    return entry["result"], float(similarities[best])
+            self._counters["misses"] += 1
+            return None
+    
+    def put(self, question: str, scope: str, result: Dict[str, Any], vector: List[float] = None) -> None:
+        """Store a workflow result, evicting the least recently used entries beyond the size cap."""
+        normalized = self.normalize(question)
+        key = (scope, normalized)
+        with self._lock:
+            self._entries[key] = {
+                "result": result,
+                "vector": self._unit(vector) if vector is not None else None,
+                "numbers": self._numbers(normalized),
+                "expires_at": time.monotonic() + self.ttl_seconds
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._counters["evictions"] += 1
+    
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters, current size and hit rate."""
+        with self._lock:
+            stats = dict(self._counters, size=len(self._entries))
+        lookups = stats["exact_hits"] + stats["semantic_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["exact_hits"] + stats["semantic_hits"]) / lookups if lookups else 0.0
+        return stats
+    
+    def _live_entry(self, key) -> Optional[Dict[str, Any]]:
+        """Entry for key, dropping it if expired. Caller holds the lock."""
+        entry = self._entries.get(key)
+        if entry is not None and entry["expires_at"] <= time.monotonic():
+            del self._entries[key]
+            self._counters["expirations"] += 1
+            return None
+        return entry
+    
+    @staticmethod
+    def _unit(vector: List[float]) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
@@ -0,0 +1,230 @@
+"""Token-budgeted packing of retrieved documents into the answer prompts.
+
+Save the tokenizer used for counting from the repository root (needs network once):
+
+    python -m rag.context_packer
+
+Documents are packed in relevance order: repeats of a higher-ranked document
+(same accession, or the same text for documents without one) are dropped and
+the rest is written as one compact table per document type, with fields that
+have the same value in every row (Study, Database, ...) stated once above it,
+until the token budget is used up. When that takes more tokens than the
+documents in full, the documents are passed in full.
+"""
+import argparse
+import math
+import os
+import re
+import threading
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+from config.settings import WHIConfig
+from vector_store.manifest import WHIIndexManifest
+
+if TYPE_CHECKING:
+    from langchain_core.documents import Document
+
+FIELD_PATTERN = re.compile(r"^([A-Z][A-Za-z ]*?)(?: \((\d+)\))?: (.*)$")
+
+GROUP_TITLES = {"variable": "Variables", "dataset": "Datasets"}
+
+class WHITokenCounter:
+    """Token counts from the saved LLM tokenizer, or an estimate of 4 bytes per token without it."""
+    
+    def __init__(self):
+        self.tokenizer = None
+        self._lock = threading.Lock()
+        self._loaded = False
+    
+    def load(self, path: str = None) -> bool:
+        """Load the tokenizer file, False when it is missing and counts are estimated."""
+        path = path or WHIConfig.CONTEXT_TOKENIZER_PATH
+        with self._lock:
+            self._loaded = True
+            if not path or not os.path.exists(path):
+                return False
+            try:
+                from tokenizers import Tokenizer  # Imported at first use
+                self.tokenizer = Tokenizer.from_file(path)
+                return True
+            except Exception as e:
+                print(f"Failed to load tokenizer: {str(e)}")
+                return False
+    
+    @property
+    def exact(self) -> bool:
+        return self.tokenizer is not None
+    
+    def count(self, text: str) -> int:
+        if not self._loaded:
+            self.load()
+        if self.tokenizer is None:
+            return math.ceil(len(text.encode("utf-8")) / 4)
+        return len(self.tokenizer.encode(text, add_special_tokens=False).ids)
+    
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Longest prefix of ``text`` within ``max_tokens``."""
+        if max_tokens <= 0:
+            return ""
+        if self.count(text) <= max_tokens:
+            return text
+        if self.tokenizer is None:
+            return text.encode("utf-8")[:max_tokens * 4].decode("utf-8", errors="ignore")
+        offsets = self.tokenizer.encode(text, add_special_tokens=False).offsets
+        return text[:offsets[max_tokens - 1][1]]
+
+class WHIContextPacker:
+    """Pack retrieved documents and related Q&A into the prompt within token budgets."""
+    
+    def __init__(self, counter: WHITokenCounter = None):
+        self.counter = counter or WHITokenCounter()
+    
+    def pack_documents(self, documents: List["Document"], budget: int = None) -> Tuple[str, Dict[str, Any]]:
+        """Return (context text, stats) for documents in relevance order.
+        
+        The plain context is returned instead when it takes no more tokens than the
+        packed one, as with a few short documents.
+        """
+        budget = budget or WHIConfig.CONTEXT_TOKEN_BUDGET
+        plain = self.plain_context(documents)
+        raw_tokens = self.counter.count(plain)
+        if not documents:
+            return plain, self._stats(0, 0, 0, raw_tokens, raw_tokens)
+        
+        parsed = self._deduplicate([self._parse(doc, rank) for rank, doc in enumerate(documents, 1)])
+        duplicates = len(documents) - len(parsed)
+        
+        # Fill the budget in relevance order, skipping documents that no longer fit
+        selected, text = [], ""
+        for entry in parsed:
+            candidate = self._render(selected + [entry])
+            if self.counter.count(candidate) <= budget:
+                selected.append(entry)
+                text = candidate
+        if not selected:
+            text = self.counter.truncate(self._render(parsed[:1]), budget)
+            selected = parsed[:1]
+        
+        context_tokens = self.counter.count(text)
+        if raw_tokens <= context_tokens:
+            return plain, self._stats(len(documents), 0, 0, raw_tokens, raw_tokens)
+        return text, self._stats(len(selected), duplicates, len(parsed) - len(selected), raw_tokens, context_tokens)
+    
+    def _stats(self, documents: int, duplicates: int, over_budget: int, raw_tokens: int, context_tokens: int) -> Dict[str, Any]:
+        """Packing stats, the same keys whichever context is returned."""
+        return {
+            "documents": documents,
+            "duplicates_dropped": duplicates,
+            "over_budget_dropped": over_budget,
+            "raw_tokens": raw_tokens,
+            "context_tokens": context_tokens,
+            "exact_tokens": self.counter.exact
+        }
+    
+    def pack_history(self, related_qa: List[Dict[str, str]], budget: int = None) -> List[Dict[str, str]]:
+        """Related Q&A within the history budget, most recent first, answers cut to what is left."""
+        budget = budget or WHIConfig.CONTEXT_HISTORY_TOKEN_BUDGET
+        packed = []
+        for qa in reversed(related_qa):
+            question_tokens = self.counter.count(qa["question"])
+            answer = self.counter.truncate(qa["answer"], budget - question_tokens)
+            if not answer:
+                break
+            packed.append({**qa, "answer": answer if answer == qa["answer"] else answer + " ..."})
+            budget -= question_tokens + self.counter.count(answer)
+        return packed[::-1]
+    
+    @staticmethod
+    def plain_context(documents: List["Document"]) -> str:
+        """Every document in full, the context format without packing."""
+        if not documents:
+            return "No relevant information found."
+        return "\n".join(f"Information {i}:\n{doc.page_content}\n" for i, doc in enumerate(documents, 1))
+    
+    @staticmethod
+    def _parse(doc: "Document", rank: int) -> Dict[str, Any]:
+        """Split "Field: value" lines into ordered fields; other lines continue the previous value."""
+        fields = {}
+        last = None
+        for line in doc.page_content.splitlines():
+            match = FIELD_PATTERN.match(line)
+            if match:
+                name, count, value = match.groups()
+                if count:
+                    # "Datasets (37): ..." and "Dataset: ..." share a column
+                    name, value = name.removesuffix("s"), f"({count}) {value}"
+                fields[name] = value.strip()
+                last = name
+            elif last is not None and line.strip():
+                fields[last] += " " + line.strip()
+        if not fields:
+            fields = {"Content": " ".join(doc.page_content.split())}
+        return {"rank": rank, "kind": doc.metadata.get("type", "document"), "fields": fields, "key": WHIContextPacker._document_key(doc)}
+    
+    @staticmethod
+    def _document_key(doc: "Document") -> Tuple[str, str]:
+        """Identity of a document: its variable or dataset accession, or its whitespace-normalized text without one."""
+        try:
+            return "accession", WHIIndexManifest.document_key(doc)
+        except KeyError:
+            return "content", " ".join(doc.page_content.split())
+    
+    @staticmethod
+    def _deduplicate(entries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Drop repeats of a higher-ranked document; different variables or datasets are always kept, however alike."""
+        kept, seen = [], set()
+        for entry in entries:
+            if entry["key"] not in seen:
+                seen.add(entry["key"])
+                kept.append(entry)
+        return kept
+    
+    @staticmethod
+    def _render(entries: List[Dict[str, Any]]) -> str:
+        """One markdown table per document type, rows numbered by retrieval rank; fields equal in every row are stated once above it."""
+        def cell(value: Optional[str]) -> str:
+            if value is None or value in ("nan", ""):
+                return "-"
+            return value.replace("|", "/")
+        
+        groups = {}  # kind -> [(rank, fields)], in order of the best-ranked document of each kind
+        for entry in entries:
+            groups.setdefault(entry["kind"], []).append((entry["rank"], entry["fields"]))
+        
+        parts = []
+        for kind, rows in groups.items():
+            shared = {}
+            if len(rows) > 1:
+                shared = {
+                    name: value for name, value in rows[0][1].items()
+                    if all(fields.get(name) == value for _, fields in rows[1:])
+                }
+            columns = []
+            for _, fields in rows:
+                columns += [name for name in fields if name not in shared and name not in columns]
+            
+            lines = [f"{GROUP_TITLES.get(kind, kind.capitalize() + 's')}:"]
+            if shared:
+                lines.append("All rows: " + "; ".join(f"{name}: {cell(value)}" for name, value in shared.items()))
+            lines += [
+                "| # | " + " | ".join(columns) + " |",
+                "|---" * (len(columns) + 1) + "|"
+            ]
+            lines += [f"| {rank} | " + " | ".join(cell(fields.get(name)) for name in columns) + " |" for rank, fields in rows]
+            parts.append("\n".join(lines))
+        return "\n\n".join(parts)
+
+def main():
+    parser = argparse.ArgumentParser(description="Save the tokenizer used to count context tokens.")
+    parser.add_argument("--name", default=WHIConfig.CONTEXT_TOKENIZER_NAME, help="Hugging Face model whose tokenizer to save")
+    parser.add_argument("--path", default=WHIConfig.CONTEXT_TOKENIZER_PATH)
+    args = parser.parse_args()
+    
+    from tokenizers import Tokenizer
+    tokenizer = Tokenizer.from_pretrained(args.name)
+    tmp_path = f"{args.path}.tmp"
+    tokenizer.save(tmp_path)
+    os.replace(tmp_path, args.path)
+    print(f"Saved the {args.name} tokenizer to {args.path}")
+
+if __name__ == "__main__":
+    main()
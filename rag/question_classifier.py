@@ -0,0 +1,232 @@
+"""Local question classifier for the WHI RAG system.
+
+Train and save the artifact from the repository root:
+
+    python -m rag.question_classifier
+
+The RAG system trains and saves it at startup when it is missing or was saved by
+another scikit-learn version, so this is only needed to see the held-out accuracy.
+
+The classifier is TF-IDF (word and character n-grams) + logistic regression,
+trained on the hand-labeled questions in data/classifier_questions.csv plus
+questions generated from the variable and dataset catalog. General questions are
+generated about the same catalog topics, so the classes are balanced and a topic
+word alone is no evidence for a variable or dataset question.
+"""
+import argparse
+import os
+import random
+import re
+from typing import TYPE_CHECKING, List, Optional, Tuple
+import numpy as np
+from config.settings import WHIConfig
+from data.processor import WHIDataProcessor
+from vector_store.lookup_index import WHILookupIndex
+
+# scikit-learn, joblib and pandas are imported at first use, importing this module stays cheap
+if TYPE_CHECKING:
+    from sklearn.pipeline import Pipeline
+
+VARIABLE_TEMPLATES = [
+    "What does the variable {name} measure?",
+    "What are the units of {description}?",
+    "Which variable records {description}?",
+    "How is {description} coded in the data?",
+    "What values can {name} take?",
+]
+
+DATASET_TEMPLATES = [
+    "What is in the {name} dataset?",
+    "Which dataset contains {description}?",
+    "Which data table covers {description}?",
+    "What variables are collected in {name}?",
+]
+
+GENERAL_TEMPLATES = [
+    "What did WHI find about {topic}?",
+    "How is {topic} related to heart disease in women?",
+    "What is known about {topic} after menopause?",
+    "Why does {topic} matter for women's health?",
+    "How should I interpret study results on {topic}?",
+    "Did hormone therapy change {topic}?",
+]
+
+# A named variable or dataset accession decides the type without the model
+ACCESSION_TYPES = {"phv": "variable", "pht": "dataset"}
+
+# Variable descriptions that read like a health topic, e.g. "breast cancer" or "lysine"
+TOPIC_PATTERN = r"[a-z][a-z ,'-]{3,60}"
+
+class WHIQuestionClassifier:
+    """Classifies questions as variable, dataset or general without an LLM call."""
+    
+    VERSION = 2
+    
+    def __init__(self):
+        self.pipeline: Optional["Pipeline"] = None
+        self._last = None  # (question, prediction); retrieval and classification both classify each question
+    
+    @property
+    def is_ready(self) -> bool:
+        return self.pipeline is not None
+    
+    def train(self, questions: List[str], labels: List[str]) -> None:
+        """Fit the classifier on labeled questions."""
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.linear_model import LogisticRegression
+        from sklearn.pipeline import FeatureUnion, Pipeline
+        features = FeatureUnion([
+            ("words", TfidfVectorizer(ngram_range=(1, 2), sublinear_tf=True)),
+            # Character n-grams cover accessions, abbreviations and Chinese text
+            ("chars", TfidfVectorizer(analyzer="char_wb", ngram_range=(2, 4), sublinear_tf=True))
+        ])
+        self.pipeline = Pipeline([
+            ("features", features),
+            ("model", LogisticRegression(max_iter=1000, class_weight="balanced"))
+        ])
+        self.pipeline.fit(questions, labels)
+    
+    def predict(self, question: str) -> Tuple[str, float]:
+        """Return (question type, probability of that type), certain for a question naming an accession."""
+        if self.pipeline is None:
+            raise Exception("Question classifier not trained")
+        last = self._last
+        if last is not None and last[0] == question:
+            return last[1]
+        
+        for match in WHILookupIndex.ACCESSION_PATTERN.finditer(question):
+            question_type = ACCESSION_TYPES.get(match.group(1)[:3].lower())
+            if question_type is not None:
+                self._last = (question, (question_type, 1.0))
+                return question_type, 1.0
+        
+        probabilities = self.pipeline.predict_proba([question])[0]
+        best = int(np.argmax(probabilities))
+        prediction = str(self.pipeline.classes_[best]), float(probabilities[best])
+        self._last = (question, prediction)
+        return prediction
+    
+    def save(self, path: str = None) -> None:
+        """Write the trained classifier atomically."""
+        import joblib
+        import sklearn
+        path = path or WHIConfig.CLASSIFIER_PATH
+        tmp_path = f"{path}.tmp"
+        joblib.dump({"version": self.VERSION, "sklearn": sklearn.__version__, "pipeline": self.pipeline}, tmp_path)
+        os.replace(tmp_path, path)
+    
+    def load(self, path: str = None) -> bool:
+        """Load a trained classifier, False if missing or built with another scikit-learn."""
+        import joblib
+        import sklearn
+        path = path or WHIConfig.CLASSIFIER_PATH
+        if not os.path.exists(path):
+            return False
+        try:
+            artifact = joblib.load(path)
+        except Exception as e:
+            print(f"Failed to load question classifier: {str(e)}")
+            return False
+        
+        if artifact.get("version") != self.VERSION or artifact.get("sklearn") != sklearn.__version__:
+            print("Question classifier was built with another version")
+            return False
+        self.pipeline = artifact["pipeline"]
+        return True
+    
+    def load_or_train(self, data_processor: WHIDataProcessor, path: str = None) -> bool:
+        """Load the saved classifier, or train one on the loaded catalog and save it.
+        
+        Returns True if it was trained.
+        """
+        if self.load(path):
+            return False
+        self.train(*self.training_questions(data_processor))
+        try:
+            self.save(path)
+        except Exception as e:
+            print(f"Failed to save question classifier: {str(e)}")
+        return True
+    
+    @classmethod
+    def training_questions(cls, data_processor: WHIDataProcessor, per_label: int = 600) -> Tuple[List[str], List[str]]:
+        """Catalog-generated plus hand-labeled questions, the full training set."""
+        catalog_questions, catalog_labels = cls.catalog_questions(data_processor, per_label)
+        seed_questions, seed_labels = cls.load_seed_questions()
+        return catalog_questions + seed_questions, catalog_labels + seed_labels
+    
+    @staticmethod
+    def load_seed_questions(path: str = None) -> Tuple[List[str], List[str]]:
+        """Hand-labeled questions shipped with the repository."""
+        import pandas as pd
+        seed = pd.read_csv(path or WHIConfig.CLASSIFIER_SEED_PATH)
+        return seed["question"].tolist(), seed["label"].tolist()
+    
+    @staticmethod
+    def catalog_questions(data_processor: WHIDataProcessor, per_label: int = 600, seed: int = 0) -> Tuple[List[str], List[str]]:
+        """Generate variable, dataset and general questions from the catalog."""
+        rng = random.Random(seed)
+        questions, labels = [], []
+        
+        variables = data_processor.mesa_data[["Variable name", "Variable description"]].dropna()
+        for name, description in variables.sample(min(per_label, len(variables)), random_state=seed).itertuples(index=False):
+            template = rng.choice(VARIABLE_TEMPLATES)
+            questions.append(template.format(name=name, description=str(description).lower()))
+            labels.append("variable")
+        
+        datasets = data_processor.dataset_desc[["Dataset name", "Dataset description"]].dropna()
+        for _ in range(min(per_label, len(datasets) * len(DATASET_TEMPLATES))):
+            name, description = datasets.iloc[rng.randrange(len(datasets))]
+            # First clause of the description reads like a topic
+            description = re.split(r"[.;:(]| - ", str(description))[0].strip().lower()
+            questions.append(rng.choice(DATASET_TEMPLATES).format(name=name, description=description))
+            labels.append("dataset")
+        
+        topics = variables["Variable description"].astype(str).str.lower().str.split(r"[.;:(]| - ", regex=True).str[0].str.strip()
+        topics = topics[topics.str.fullmatch(TOPIC_PATTERN)].drop_duplicates()
+        for topic in topics.sample(min(per_label, len(topics)), random_state=seed):
+            questions.append(rng.choice(GENERAL_TEMPLATES).format(topic=topic))
+            labels.append("general")
+        
+        return questions, labels
+
+def main():
+    from sklearn.model_selection import StratifiedKFold
+    parser = argparse.ArgumentParser(description="Train the local WHI question classifier.")
+    parser.add_argument("--per-label", type=int, default=600, help="catalog-generated questions per label")
+    parser.add_argument("--folds", type=int, default=5, help="cross-validation folds over the seed questions")
+    args = parser.parse_args()
+    
+    processor = WHIDataProcessor()
+    processor.load_data()
+    seed_questions, seed_labels = WHIQuestionClassifier.load_seed_questions()
+    catalog_questions, catalog_labels = WHIQuestionClassifier.catalog_questions(processor, args.per_label)
+    
+    # Evaluate on held-out hand-labeled questions, generated ones are always in training
+    correct = confident = confident_correct = 0
+    folds = StratifiedKFold(n_splits=args.folds, shuffle=True, random_state=0)
+    for train_idx, test_idx in folds.split(seed_questions, seed_labels):
+        classifier = WHIQuestionClassifier()
+        classifier.train(
+            catalog_questions + [seed_questions[i] for i in train_idx],
+            catalog_labels + [seed_labels[i] for i in train_idx]
+        )
+        for i in test_idx:
+            label, probability = classifier.predict(seed_questions[i])
+            correct += label == seed_labels[i]
+            if probability >= WHIConfig.CLASSIFIER_CONFIDENCE_THRESHOLD:
+                confident += 1
+                confident_correct += label == seed_labels[i]
+    
+    total = len(seed_questions)
+    print(f"Held-out accuracy: {correct / total:.1%} on {total} labeled questions")
+    print(f"Above threshold {WHIConfig.CLASSIFIER_CONFIDENCE_THRESHOLD}: {confident / total:.1%} of questions, "
+          f"{confident_correct / max(confident, 1):.1%} accurate")
+    
+    classifier = WHIQuestionClassifier()
+    classifier.train(*WHIQuestionClassifier.training_questions(processor, args.per_label))
+    classifier.save()
+    print(f"Question classifier saved to {WHIConfig.CLASSIFIER_PATH}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+import asyncio
+import threading
+import time
+from typing import Callable, Optional
+
+class WHISystemStartup:
+    """Builds the RAG system in a background thread so the app serves pages while it warms up."""
+    
+    WARMING = "warming"
+    READY = "ready"
+    DEGRADED = "degraded"  # Initialization failed, questions get demo-mode answers
+    
+    def __init__(self, factory: Callable = None, started_at: float = None):
+        self._factory = factory
+        self.started_at = started_at if started_at is not None else time.perf_counter()
+        self.state = self.WARMING
+        self.message = "Starting up"
+        self.progress = 0.0
+        self.rag_system = None
+        self.error: Optional[str] = None
+        self.ready_seconds: Optional[float] = None  # From start until ready or degraded
+        self.first_page_seconds: Optional[float] = None  # From start until the first session connected
+        self._done = threading.Event()
+    
+    @property
+    def is_ready(self) -> bool:
+        return self.state == self.READY
+    
+    @property
+    def is_done(self) -> bool:
+        return self._done.is_set()
+    
+    def start(self) -> "WHISystemStartup":
+        """Start initialization in a daemon thread."""
+        threading.Thread(target=self._run, name="whi-startup", daemon=True).start()
+        return self
+    
+    async def wait(self) -> bool:
+        """Wait until initialization has finished without blocking the event loop, True if ready."""
+        while not self._done.is_set():
+            await asyncio.sleep(0.1)
+        return self.is_ready
+    
+    def record_first_page(self) -> None:
+        """Report the time to the first served page, once per process."""
+        if self.first_page_seconds is not None:
+            return
+        self.first_page_seconds = time.perf_counter() - self.started_at
+        print(f"🌐 First page served {self.first_page_seconds:.1f}s after start, system {self.state} ({self.progress:.0%})")
+    
+    def _update(self, message: str, progress: float) -> None:
+        self.message = message
+        self.progress = progress
+    
+    def _run(self) -> None:
+        try:
+            factory = self._factory
+            if factory is None:
+                # Imported here so the app module does not pay for the RAG stack before serving
+                from rag.system import WHIRAGSystem
+                factory = WHIRAGSystem
+            self.rag_system = factory(progress=self._update)
+            self.state = self.READY
+            self._update("Ready", 1.0)
+            self.ready_seconds = time.perf_counter() - self.started_at
+            print(f"✅ RAG system initialized successfully in {self.ready_seconds:.1f}s")
+        except Exception as e:
+            self.error = str(e)
+            self.state = self.DEGRADED
+            self.ready_seconds = time.perf_counter() - self.started_at
+            print(f"⚠️ RAG system initialization failed: {e}")
+            print("🔄 Using demo mode")
+        finally:
+            self._done.set()
@@ -1,78 +1,270 @@
-from langgraph.graph import StateGraph, END
-from typing import Dict, Any, List
+from typing import Dict, Any, List, AsyncIterator, Callable
 from graph.state import WHIRAGState
 from llm.qwen_client import QwenLLMClient
+from llm.json_stream import PartialJSONStream
 from vector_store.manager import WHIVectorStoreManager
+from vector_store.lookup_index import WHILookupIndex
+from vector_store.manifest import WHIIndexManifest
 from data.processor import WHIDataProcessor
 from config.settings import WHIConfig
+from rag.answer_cache import WHIAnswerCache
+from rag.question_classifier import WHIQuestionClassifier
+from rag.context_packer import WHIContextPacker
+from monitoring.metrics import METRICS, add_to_request, current_request, end_request, start_request
+import atexit
+import contextlib
+import hashlib
 import json
 import re
+import asyncio
+import threading
+import time
 from datetime import datetime
 
 class WHIRAGSystem:
     """Core WHI RAG system for medical data analysis and question answering."""
     
-    def __init__(self):
+    # Prompt variants for the detailed answer, per verbosity mode
+    VERBOSITY_INSTRUCTIONS = {
+        "brief": """**For detailed_answer, be BRIEF and DIRECT:**
+1. Answer the question in the first sentence
+2. Give only the key facts: variable or dataset names, units, codes and ranges
+3. Use at most one heading and a short list, about 150 words in total
+4. Leave out background, methodology and clinical discussion unless asked""",
+        "standard": """**For detailed_answer, provide a FOCUSED analysis:**
+1. Answer the question directly, then support it with the relevant details
+2. Include specific numbers, units and data sources from the document context
+3. Add brief background only where it helps interpret the answer
+4. Use a few clear sections, about 300-500 words in total""",
+        "exhaustive": """**CRITICAL: For detailed_answer, provide COMPREHENSIVE and THOROUGH analysis:**
+1. **No Length Restrictions**: Provide as much detail as necessary to fully address the question
+2. **Complete Coverage**: Include all relevant background information, methodology, and statistical details
+3. **Rich Context**: Provide comprehensive medical and research context
+4. **Detailed Data**: Include specific numbers, percentages, research findings, and comparative analysis
+5. **Clinical Implications**: Thoroughly discuss clinical significance and practical applications
+6. **Structured Organization**: Use clear headings, subheadings, and well-organized sections
+7. **Comprehensive Analysis**: Cover all aspects of the question with in-depth explanations
+
+IMPORTANT: The detailed_answer should be as comprehensive and thorough as possible. Provide complete, in-depth analysis that fully addresses all aspects of the question."""
+    }
+    
+    def __init__(self, progress: Callable[[str, float], None] = None):
+        # progress(message, fraction) is called as initialization advances
+        self._progress = progress or (lambda message, fraction: None)
+        self._progress("Loading embedding model", 0.0)
         self.llm_client = QwenLLMClient()
         self.vector_manager = WHIVectorStoreManager()
         self.data_processor = WHIDataProcessor()
+        self.lookup_index = WHILookupIndex(self.data_processor)
+        self.answer_cache = WHIAnswerCache()
+        self.question_classifier = WHIQuestionClassifier()
+        self.context_packer = WHIContextPacker()
         self.workflow = None
         self.conversation_memory = []  # Conversation memory storage
         self.max_history_length = 10  # Maximum number of historical conversations to keep
+        self._sync_loop = None  # Event loop thread behind process_question, started on first use
+        self._sync_loop_lock = threading.Lock()
         self._initialize_system()
         self._build_workflow()
+        METRICS.add_collector(self._cache_metrics)
     
     def _initialize_system(self) -> None:
         """Initialize the RAG system components."""
         try:
             # Load data
+            self._progress("Loading data files", 0.25)
             self.data_processor.load_data()
-            
-            # Try to load existing vector store
+            self._progress("Building lookup index", 0.45)
+            self.lookup_index.build()
+            if WHIConfig.LOCAL_CLASSIFIER_ENABLED:
+                self._progress("Loading question classifier", 0.55)
+                try:
+                    if self.question_classifier.load_or_train(self.data_processor):
+                        print(f"Local question classifier trained and saved to {WHIConfig.CLASSIFIER_PATH}")
+                    else:
+                        print("Local question classifier loaded")
+                except Exception as e:
+                    print(f"Local question classifier not available, questions are classified by the LLM: {str(e)}")
+            if WHIConfig.CONTEXT_PACKING_ENABLED:
+                self._progress("Loading tokenizer", 0.6)
+                if not self.context_packer.counter.load():
+                    print(f"Tokenizer not found at {WHIConfig.CONTEXT_TOKENIZER_PATH}, context tokens are estimated "
+                          "(save it with `python -m rag.context_packer`)")
+            
+            # The index is built offline with `python -m vector_store.build`
+            self._progress("Loading vector store", 0.65)
             if not self.vector_manager.load_vector_store():
-                print("Creating new vector store...") 
-                documents = self.data_processor.create_documents()
-                self.vector_manager.create_vector_store(documents)
-                print("Vector store creation completed") 
-            else:
-                print("Vector store loaded successfully")  
+                raise Exception(
+                    f"Vector store not found at {WHIConfig.VECTOR_STORE_PATH}, "
+                    "build it with `python -m vector_store.build`"
+                )
+            print("Vector store loaded successfully")  
+            
+            # Query embeddings seen in this run warm the cache of the next one
+            warm_queries = self.vector_manager.query_cache_stats()["size"]
+            if warm_queries:
+                print(f"Loaded {warm_queries} cached query embeddings")
+            atexit.register(self.vector_manager.save_query_cache)
+            
+            self._progress("Checking index manifest", 0.9)
+            manifest = WHIIndexManifest.load(WHIConfig.VECTOR_STORE_PATH)
+            fingerprints = WHIIndexManifest.fingerprint_sources(WHIConfig.data_files(), WHIDataProcessor.document_format())
+            if not manifest or not manifest.is_current(WHIConfig.EMBEDDING_MODEL_NAME, fingerprints, WHIConfig.FAISS_INDEX_TYPE):
+                print("⚠️ Vector store is out of date with the data files or index settings, run `python -m vector_store.build` to update it")
+            
+            # Cached answers are only valid for this corpus, prompt and the models of every stage
+            self.answer_cache.set_version(hashlib.sha1(json.dumps([
+                WHIConfig.PROMPT_VERSION, WHIConfig.MODEL_NAME, json.dumps(WHIConfig.LLM_PROFILES, sort_keys=True),
+                WHIConfig.EMBEDDING_MODEL_NAME, sorted(fingerprints.items())
+            ]).encode("utf-8")).hexdigest())
         except Exception as e:
             print(f"System initialization failed: {str(e)}")  
             raise
     
-    def process_question(self, question: str, conversation_history: List[Dict] = None, output_language: str = "english") -> Dict[str, Any]:
+    def process_question(self, question: str, conversation_history: List[Dict] = None, output_language: str = "english", verbosity: str = None) -> Dict[str, Any]:
+        """Process user question synchronously (for scripts and CLI tools)."""
+        # Every call runs on the same loop, so async clients and their connections are reused
+        future = asyncio.run_coroutine_threadsafe(
+            self.aprocess_question(question, conversation_history, output_language, verbosity), self._background_loop()
+        )
+        return future.result()
+    
+    def _background_loop(self) -> asyncio.AbstractEventLoop:
+        """Long-lived event loop in a daemon thread for the synchronous API."""
+        with self._sync_loop_lock:
+            if self._sync_loop is None:
+                self._sync_loop = asyncio.new_event_loop()
+                threading.Thread(target=self._sync_loop.run_forever, name="whi-sync-loop", daemon=True).start()
+        return self._sync_loop
+    
+    async def aprocess_question(self, question: str, conversation_history: List[Dict] = None, output_language: str = "english", verbosity: str = None) -> Dict[str, Any]:
         """Process user question with conversation context and language support."""
+        record, token = start_request()
+        start = time.perf_counter()
         try:
-            # Initialize state with conversation history and language
-            initial_state = {
-                "question": question,
-                "conversation_history": conversation_history or [],
-                "output_language": output_language,
-                "processing_steps": []
-            }
+            scope = self._cache_scope(output_language, verbosity)
+            cached, vector = await self._cached_answer(question, conversation_history, scope)
+            if cached is not None:
+                self._save_to_memory(question, cached)
+                return self._finish_request(cached, record, start)
+            
+            initial_state = self._initial_state(question, conversation_history, output_language, verbosity)
             
             # Run workflow
-            result = self.workflow.invoke(initial_state)
+            result = await self.workflow.ainvoke(initial_state)
+            self._log_timings(result, (time.perf_counter() - start) * 1000)
+            self._cache_answer(question, conversation_history, scope, result, vector)
             
             # Save to conversation memory
             self._save_to_memory(question, result)
             
-            return result
+            return self._finish_request(result, record, start)
         except Exception as e:
-            # 添加详细的错误日志
-            print(f"详细错误信息: {str(e)}")
-            print(f"错误类型: {type(e).__name__}")
-            import traceback
-            print(f"错误堆栈: {traceback.format_exc()}")
-            
-            return {
-                "error": f"Question processing failed: {str(e)}",
-                "answer": "Sorry, an error occurred while processing your question.",
-                "summary_answer": "The system is temporarily unable to process your question. Please try again later.",
-                "confidence_score": 0.0,
-                "sources": [],
-                "processing_steps": [f"Error: {str(e)}"]
-            }
+            return self._finish_request(self._error_result(e), record, start)
+        finally:
+            end_request(token)
+    
+    async def astream_question(self, question: str, conversation_history: List[Dict] = None, output_language: str = "english", verbosity: str = None) -> AsyncIterator[Dict[str, Any]]:
+        """Process user question, yielding detailed answer deltas as they are generated.
+        
+        Yields a ``{"type": "summary", ...}`` event once the chat summary is ready,
+        ``{"type": "answer_delta", "delta": ...}`` events with each new piece of the
+        detailed answer while it streams and finishes with a single ``{"type": "result", "result": ...}`` event.
+        """
+        # The generator body runs in the iterating caller's context, so the record is
+        # reset once the question is answered rather than left set in the caller
+        record, token = start_request()
+        start = time.perf_counter()
+        try:
+            try:
+                scope = self._cache_scope(output_language, verbosity)
+                result, vector = await self._cached_answer(question, conversation_history, scope)
+                if result is None:
+                    initial_state = self._initial_state(question, conversation_history, output_language, verbosity)
+                    initial_state["stream_answer"] = True
+                    
+                    result = {}
+                    async for mode, chunk in self.workflow.astream(initial_state, stream_mode=["custom", "values"]):
+                        if mode == "custom":
+                            yield chunk
+                        else:
+                            result = chunk
+                    self._log_timings(result, (time.perf_counter() - start) * 1000)
+                    self._cache_answer(question, conversation_history, scope, result, vector)
+                
+                self._save_to_memory(question, result)
+            except Exception as e:
+                result = self._error_result(e)
+            result = self._finish_request(result, record, start)
+        finally:
+            end_request(token)
+        yield {"type": "result", "result": result}
+    
+    @staticmethod
+    def _cache_scope(output_language: str, verbosity: str) -> str:
+        """Answer cache scope: the request settings that change the answer for the same question."""
+        return f"{output_language}:{verbosity if verbosity in WHIConfig.VERBOSITY_MODES else 'auto'}"
+    
+    async def _cached_answer(self, question: str, conversation_history: List[Dict], scope: str):
+        """Look up a cached answer, returning (result or None, question embedding for storing a miss).
+        
+        Follow-up questions may depend on earlier turns, so only questions asked without
+        conversation history are served from the cache.
+        """
+        if not WHIConfig.ANSWER_CACHE_ENABLED or conversation_history:
+            return None, None
+        
+        result = self.answer_cache.get(question, scope)
+        if result is not None:
+            return self._cache_hit(result, "exact", "exact match"), None
+        
+        vector = await asyncio.to_thread(self.vector_manager.embed_query, question)
+        match = self.answer_cache.get_similar(question, scope, vector)
+        if match is not None:
+            result, similarity = match
+            return self._cache_hit(result, "similar", f"similar question, similarity {similarity:.2f}"), None
+        return None, vector
+    
+    def _cache_hit(self, result: Dict[str, Any], kind: str, reason: str) -> Dict[str, Any]:
+        """Copy of a cached result recording how it was served."""
+        stats = self.answer_cache.stats()
+        print(f"💾 Answer cache hit ({reason}), hit rate {stats['hit_rate']:.0%} over {stats['exact_hits'] + stats['semantic_hits'] + stats['misses']} lookups")
+        return {**result, "processing_steps": [f"Answer served from cache ({reason})"], "node_timings": {}, "answer_cache": kind}
+    
+    def _cache_answer(self, question: str, conversation_history: List[Dict], scope: str, result: Dict[str, Any], vector) -> None:
+        """Cache a successful answer that did not depend on conversation history."""
+        if not WHIConfig.ANSWER_CACHE_ENABLED or conversation_history or vector is None:
+            return
+        if result.get("error") or not result.get("answer"):
+            return
+        self.answer_cache.put(question, scope, result, vector)
+    
+    def _initial_state(self, question: str, conversation_history: List[Dict], output_language: str, verbosity: str = None) -> Dict[str, Any]:
+        """Initialize state with conversation history, language and verbosity."""
+        return {
+            "question": question,
+            "conversation_history": conversation_history or [],
+            "output_language": output_language,
+            "verbosity": verbosity if verbosity in WHIConfig.VERBOSITY_MODES else None,
+            "processing_steps": []
+        }
+    
+    def _error_result(self, e: Exception) -> Dict[str, Any]:
+        """Build the result returned when the workflow itself fails."""
+        # 添加详细的错误日志
+        print(f"详细错误信息: {str(e)}")
+        print(f"错误类型: {type(e).__name__}")
+        import traceback
+        print(f"错误堆栈: {traceback.format_exc()}")
+        
+        return {
+            "error": f"Question processing failed: {str(e)}",
+            "answer": "Sorry, an error occurred while processing your question.",
+            "summary_answer": "The system is temporarily unable to process your question. Please try again later.",
+            "confidence_score": 0.0,
+            "sources": [],
+            "processing_steps": [f"Error: {str(e)}"]
+        }
     
     def _save_to_memory(self, question: str, result: Dict[str, Any]):
         """Save conversation to memory."""
@@ -96,31 +288,121 @@ class WHIRAGSystem:
     
     def _build_workflow(self) -> None:
         """Build optimized LangGraph workflow with reduced LLM calls."""
+        from langgraph.graph import StateGraph, START, END  # Imported at first use, like the other heavy dependencies
         workflow = StateGraph(WHIRAGState)
         
-        # Add optimized nodes - reduced from 6 to 4 nodes
-        workflow.add_node("analyze_context_and_classify", self._analyze_context_and_classify)
-        workflow.add_node("retrieve_documents", self._retrieve_documents)
-        workflow.add_node("generate_and_summarize_answer", self._generate_and_summarize_answer)
-        workflow.add_node("validate_answer", self._validate_answer)
-        
-        # Set optimized edges - simplified workflow
-        workflow.set_entry_point("analyze_context_and_classify")
-        workflow.add_edge("analyze_context_and_classify", "retrieve_documents")
-        workflow.add_edge("retrieve_documents", "generate_and_summarize_answer")
-        workflow.add_edge("generate_and_summarize_answer", "validate_answer")
+        # Add optimized nodes - one LLM call for classification, two concurrent calls for the answer
+        workflow.add_node("analyze_context_and_classify", self._timed("analyze_context_and_classify", self._analyze_context_and_classify))
+        workflow.add_node("retrieve_documents", self._timed("retrieve_documents", self._retrieve_documents))
+        workflow.add_node("generate_summary", self._timed("generate_summary", self._generate_summary))
+        workflow.add_node("generate_detailed_answer", self._timed("generate_detailed_answer", self._generate_detailed_answer))
+        workflow.add_node("validate_answer", self._timed("validate_answer", self._validate_answer))
+        
+        # Retrieval does not depend on the classification, so both run concurrently
+        # and join before generation
+        workflow.add_edge(START, "analyze_context_and_classify")
+        workflow.add_edge(START, "retrieve_documents")
+        
+        # The short chat summary and the detailed answer are generated concurrently,
+        # so the summary can be shown while the detailed answer is still streaming
+        retrieval = ["analyze_context_and_classify", "retrieve_documents"]
+        workflow.add_edge(retrieval, "generate_summary")
+        workflow.add_edge(retrieval, "generate_detailed_answer")
+        workflow.add_edge(["generate_summary", "generate_detailed_answer"], "validate_answer")
         workflow.add_edge("validate_answer", END)
         
         self.workflow = workflow.compile()
     
-    def _analyze_context_and_classify(self, state: WHIRAGState) -> Dict[str, Any]:
+    @staticmethod
+    def _timed(name: str, node):
+        """Wrap a node so it reports its wall time in ``node_timings`` and the metrics."""
+        async def timed_node(state: WHIRAGState) -> Dict[str, Any]:
+            start = time.perf_counter()
+            update = await node(state)
+            seconds = time.perf_counter() - start
+            METRICS.observe("whi_node_duration_seconds", seconds, node=name)
+            return {**update, "node_timings": {name: seconds * 1000}}
+        return timed_node
+    
+    def _finish_request(self, result: Dict[str, Any], record: Dict[str, Any], start: float) -> Dict[str, Any]:
+        """Count the question in the metrics and attach its measurements as ``result["metrics"]``."""
+        seconds = time.perf_counter() - start
+        if result.get("answer_cache"):
+            outcome = "cached"
+        elif result.get("error"):
+            outcome = "error"
+        else:
+            outcome = "answered"
+        METRICS.inc("whi_questions_total", outcome=outcome)
+        METRICS.observe("whi_question_duration_seconds", seconds, outcome=outcome)
+        
+        llm_calls = record["llm_calls"]
+        return {**result, "metrics": {
+            "outcome": outcome,
+            "total_ms": seconds * 1000,
+            "answer_cache": result.get("answer_cache") or "miss",
+            "node_ms": dict(result.get("node_timings") or {}),
+            "llm_calls": llm_calls,
+            "prompt_tokens": sum(call["prompt_tokens"] for call in llm_calls),
+            "completion_tokens": sum(call["completion_tokens"] for call in llm_calls),
+            "retrieval": record["retrieval"]
+        }}
+    
+    def _cache_metrics(self):
+        """Answer and query-embedding cache samples for the metrics endpoint."""
+        answers = self.answer_cache.stats()
+        queries = self.vector_manager.query_cache_stats()
+        return [
+            ("whi_answer_cache_lookups_total", {"result": "exact_hit"}, answers["exact_hits"]),
+            ("whi_answer_cache_lookups_total", {"result": "semantic_hit"}, answers["semantic_hits"]),
+            ("whi_answer_cache_lookups_total", {"result": "miss"}, answers["misses"]),
+            ("whi_answer_cache_evictions_total", {"reason": "size"}, answers["evictions"]),
+            ("whi_answer_cache_evictions_total", {"reason": "ttl"}, answers["expirations"]),
+            ("whi_answer_cache_entries", {}, answers["size"]),
+            ("whi_query_embedding_cache_lookups_total", {"result": "hit"}, queries["hits"]),
+            ("whi_query_embedding_cache_lookups_total", {"result": "miss"}, queries["misses"]),
+            ("whi_query_embedding_cache_entries", {}, queries["size"]),
+        ]
+    
+    def _log_timings(self, result: Dict[str, Any], total_ms: float) -> None:
+        """Report per-node timings and the wall time saved by the parallel fan-out."""
+        timings = result.get("node_timings") or {}
+        if not timings:
+            return
+        
+        # Run as a chain, the nodes of each fan-out would have added up
+        saved = {}
+        for stage, nodes in (("retrieval", ("analyze_context_and_classify", "retrieve_documents")),
+                             ("generation", ("generate_summary", "generate_detailed_answer"))):
+            fan_out = [timings.get(node, 0.0) for node in nodes]
+            saved[stage] = sum(fan_out) - max(fan_out)
+        summary = ", ".join(f"{name} {ms:.0f}ms" for name, ms in timings.items())
+        step = (f"Timings: {summary}; total {total_ms:.0f}ms, parallel retrieval saved {saved['retrieval']:.0f}ms, "
+                f"parallel generation saved {saved['generation']:.0f}ms")
+        print(f"⏱️ {step}")
+        result.setdefault("processing_steps", []).append(step)
+    
+    async def _analyze_context_and_classify(self, state: WHIRAGState) -> Dict[str, Any]:
         """Combined context analysis and question classification - First LLM call."""
         try:
             question = state["question"]
             history = state.get("conversation_history", [])
-            processing_steps = state.get("processing_steps", [])
+            processing_steps = []
             processing_steps.append("Starting combined context analysis and question classification")
             
+            # Without history there is no context to analyse, a confident local label makes the LLM call unnecessary
+            local_result = await asyncio.to_thread(self._classify_locally, question, history)
+            if local_result is not None:
+                question_type, probability = local_result
+                processing_steps.append(f"Question classified locally as {question_type} ({probability:.2f}), LLM call skipped")
+                return {
+                    "context_summary": "",
+                    "related_previous_qa": [],
+                    "is_context_related": False,
+                    "question_type": question_type,
+                    "processing_steps": processing_steps
+                }
+            
             # Build comprehensive prompt for both tasks
             if not history:
                 context_info = "No historical conversation context available."
@@ -148,17 +430,17 @@ Classify the question into one of these categories:
 - "dataset": Questions about datasets, studies, or data collection methods  
 - "general": General questions about WHI research, methodology, or interpretation
 
-Please return results in JSON format:
+Please return results in JSON format, with question_classification first:
 {{
+    "question_classification": {{
+        "question_type": "variable/dataset/general",
+        "classification_reasoning": "reasoning for classification"
+    }},
     "context_analysis": {{
         "is_related": true/false,
         "context_summary": "summary text",
         "related_qa_indices": [0, 1],
         "reasoning": "detailed reasoning"
-    }},
-    "question_classification": {{
-        "question_type": "variable/dataset/general",
-        "classification_reasoning": "reasoning for classification"
     }}
 }}
 """
@@ -169,25 +451,30 @@ Please return results in JSON format:
             ]
             
             try:
-                combined_result = self.llm_client.generate_response(messages)
-                # Clean possible markdown format
-                if "```json" in combined_result:
-                    combined_result = combined_result.split("```json")[1].split("```")[0].strip()
-                elif "```" in combined_result:
-                    combined_result = combined_result.split("```")[1].strip()
-                
-                # 尝试解析JSON
-                try:
-                    result = json.loads(combined_result)
-                    context_analysis = result.get("context_analysis", {})
-                    question_classification = result.get("question_classification", {})
-                except json.JSONDecodeError as json_error:
-                    print(f"JSON解析失败: {json_error}")
+                # 尝试解析JSON while it streams - fences and preambles are skipped, a truncated object keeps its complete fields
+                parser = PartialJSONStream()
+                combined_result = ""
+                async with contextlib.aclosing(self.llm_client.astream_response(messages, stage="classify")) as deltas:
+                    async for delta in deltas:
+                        combined_result += delta
+                        events = parser.feed(delta)
+                        # Without history the context analysis has nothing to say, stop once the classification is in
+                        if parser.complete:
+                            break
+                        if not history and any(event["field"] == "question_classification" for event in events):
+                            processing_steps.append("Classification read from the streamed reply, rest of the response skipped")
+                            break
+                result = parser.close()
+                if result:
+                    context_analysis = result.get("context_analysis") or {}
+                    question_classification = result.get("question_classification") or {}
+                else:
+                    print("JSON解析失败")
                     print(f"尝试解析的内容: {combined_result}")
                     # 使用fallback方法
                     context_analysis = self._enhanced_context_analysis(question, history)
                     question_classification = {"question_type": "general", "classification_reasoning": "JSON解析失败，使用fallback"}
-                
+            
             except Exception as e:
                 print(f"LLM调用失败: {str(e)}")
                 # Fallback to enhanced analysis if LLM fails
@@ -198,7 +485,7 @@ Please return results in JSON format:
             related_qa = []
             if context_analysis.get("is_related", False):
                 for idx in context_analysis.get("related_qa_indices", []):
-                    if 0 <= idx < len(history):
+                    if isinstance(idx, int) and 0 <= idx < len(history):
                         related_qa.append({
                             "question": history[idx]["question"],
                             "answer": history[idx]["answer"]
@@ -217,7 +504,7 @@ Please return results in JSON format:
                 "question_type": question_type,
                 "processing_steps": processing_steps
             }
-            
+        
         except Exception as e:
             return {
                 "context_summary": "Analysis failed",
@@ -228,6 +515,16 @@ Please return results in JSON format:
                 "processing_steps": processing_steps + [f"Combined analysis failed: {str(e)}"]
             }
     
+    def _classify_locally(self, question: str, history: List[Dict]):
+        """Return (question type, probability) from the local classifier, None when the LLM is needed."""
+        if history or not WHIConfig.LOCAL_CLASSIFIER_ENABLED or not self.question_classifier.is_ready:
+            return None
+        
+        question_type, probability = self.question_classifier.predict(question)
+        if probability < WHIConfig.CLASSIFIER_CONFIDENCE_THRESHOLD:
+            return None
+        return question_type, probability
+    
     def _enhanced_context_analysis(self, question: str, history: List[Dict]) -> Dict[str, Any]:
         """Enhanced context analysis using keyword matching and semantic similarity."""
         question_lower = question.lower()
@@ -260,29 +557,64 @@ Please return results in JSON format:
             "reasoning": "Enhanced analysis based on keyword matching and medical term recognition"
         }
     
-    def _retrieve_documents(self, state: WHIRAGState) -> Dict[str, Any]:
+    async def _retrieve_documents(self, state: WHIRAGState) -> Dict[str, Any]:
         """Document retrieval node."""
         try:
             question = state["question"]
-            question_type = state.get("question_type", "general")
-            processing_steps = state.get("processing_steps", [])
+            processing_steps = []
             processing_steps.append("Starting document retrieval")
             
-            # Generate optimized search query
-            search_query = self._generate_search_query(question, question_type)
-            processing_steps.append(f"Generated search query: {search_query}")
-            
-            # Execute similarity search
-            retrieved_docs = self.vector_manager.similarity_search(
-                search_query, 
-                k=WHIConfig.RETRIEVAL_K
-            )
-            
+            # Accessions and variable names named in the question come from the exact lookup
+            # index; a resolved accession is answered from it alone, other hits share the
+            # context with the vector search results
+            # (CPU and SQLite work below runs in worker threads, keeping the event loop free)
+            identifiers = self.lookup_index.extract_identifiers(question)
+            lookup_docs = await asyncio.to_thread(self.lookup_index.search, question, WHIConfig.RETRIEVAL_K, identifiers)
+            filters = {}
+            if lookup_docs:
+                processing_steps.append(f"Exact lookup matched: {', '.join(identifiers)}")
+            if lookup_docs and self.lookup_index.names_accession(identifiers):
+                search_query = question
+                retrieved_docs = lookup_docs
+            else:
+                # Generate optimized search query
+                search_query = self._generate_search_query(question)
+                processing_steps.append(f"Generated search query: {search_query}")
+                
+                # Execute similarity search, favouring the question's document type and restricted to its database
+                filters = await asyncio.to_thread(self._retrieval_filters, question)
+                if filters:
+                    processing_steps.append(f"Search filtered on {', '.join(f'{key}={value}' for key, value in filters.items())}")
+                vector_docs = await self.vector_manager.asimilarity_search(
+                    search_query, 
+                    k=WHIConfig.RETRIEVAL_K,
+                    lexical_query=question,
+                    filters=filters
+                )
+                retrieved_docs = self._merge_documents(lookup_docs, vector_docs, WHIConfig.RETRIEVAL_K)
             processing_steps.append(f"Retrieved {len(retrieved_docs)} relevant documents")
+            lookup_ids = {id(doc) for doc in lookup_docs}
+            lookup_count = sum(id(doc) in lookup_ids for doc in retrieved_docs)
+            vector_count = len(retrieved_docs) - lookup_count
+            for source, count in (("lookup", lookup_count), ("vector", vector_count)):
+                if count:
+                    METRICS.inc("whi_retrievals_total", source=source)
+                    METRICS.inc("whi_retrieved_documents_total", count, source=source)
+            record = current_request()
+            if record is not None:
+                record["retrieval"].update(documents=len(retrieved_docs), lookup_documents=lookup_count)
+                if filters:
+                    record["retrieval"]["filters"] = filters
+            
+            # Packed here, once per answer prompt and before the LLM calls wait on it
+            context = await asyncio.to_thread(self._pack_context, retrieved_docs, processing_steps)
+            summary_context = await asyncio.to_thread(self._pack_summary_context, retrieved_docs)
             
             return {
                 "search_query": search_query,
                 "retrieved_documents": retrieved_docs,
+                "context": context,
+                "summary_context": summary_context,
                 "processing_steps": processing_steps
             }
         except Exception as e:
@@ -292,7 +624,74 @@ Please return results in JSON format:
                 "processing_steps": processing_steps + [f"Document retrieval failed: {str(e)}"]
             }
     
-    def _generate_search_query(self, question: str, question_type: str) -> str:
+    @staticmethod
+    def _merge_documents(lookup_docs: List, vector_docs: List, k: int) -> List:
+        """Up to ``k`` documents: at most half from the exact lookup, then the vector results they do not cover.
+
+        The cap keeps a name matching hundreds of rows from pushing out the semantically relevant results.
+        """
+        merged = list(lookup_docs[:max(k // 2, 1)])
+        seen = {doc.page_content for doc in merged}
+        for doc in vector_docs:
+            if len(merged) >= k:
+                break
+            if doc.page_content not in seen:
+                seen.add(doc.page_content)
+                merged.append(doc)
+        return merged
+    
+    def _pack_context(self, documents: List, processing_steps: List[str]) -> str:
+        """Document context for the answer prompts, packed into the token budget when enabled."""
+        if not WHIConfig.CONTEXT_PACKING_ENABLED:
+            return self._build_context(documents)
+        
+        start = time.perf_counter()
+        context, stats = self.context_packer.pack_documents(documents)
+        seconds = time.perf_counter() - start
+        METRICS.observe("whi_retrieval_step_duration_seconds", seconds, step="pack")
+        add_to_request("pack_ms", seconds * 1000)
+        METRICS.inc("whi_context_tokens_total", stats["raw_tokens"], kind="retrieved")
+        METRICS.inc("whi_context_tokens_total", stats["context_tokens"], kind="packed")
+        add_to_request("raw_context_tokens", stats["raw_tokens"])
+        add_to_request("context_tokens", stats["context_tokens"])
+        processing_steps.append(
+            f"Packed {stats['documents']} of {len(documents)} documents into {stats['context_tokens']} tokens "
+            f"(from {stats['raw_tokens']}, {stats['duplicates_dropped']} duplicates dropped)"
+        )
+        return context
+    
+    def _pack_summary_context(self, documents: List) -> str:
+        """Smaller document context for the chat summary: the top documents within their own budget."""
+        documents = documents[:WHIConfig.SUMMARY_CONTEXT_DOCUMENTS]
+        if not WHIConfig.CONTEXT_PACKING_ENABLED:
+            return self._build_context(documents)
+        
+        context, stats = self.context_packer.pack_documents(documents, WHIConfig.SUMMARY_CONTEXT_TOKEN_BUDGET)
+        METRICS.inc("whi_context_tokens_total", stats["context_tokens"], kind="summary")
+        add_to_request("summary_context_tokens", stats["context_tokens"])
+        return context
+    
+    def _retrieval_filters(self, question: str) -> Dict[str, str]:
+        """Metadata filters for the vector search: the document type the question asks about and the database it names.
+        
+        Retrieval runs alongside classification, so the type comes from the local classifier
+        and only when it is confident; general questions search every document type. The
+        type only favours matching documents (``WHIConfig.SOFT_PARTITION_KEYS``), since a
+        question can ask about both variables and datasets.
+        """
+        if not WHIConfig.PARTITIONED_RETRIEVAL_ENABLED:
+            return {}
+        
+        filters = {}
+        local_result = self._classify_locally(question, [])
+        if local_result is not None and local_result[0] in ("variable", "dataset"):
+            filters["type"] = local_result[0]
+        mentioned = [database for database, pattern in WHIConfig.DATABASE_MENTIONS.items() if re.search(pattern, question, re.IGNORECASE)]
+        if len(mentioned) == 1:
+            filters["database"] = mentioned[0]
+        return filters
+    
+    def _generate_search_query(self, question: str) -> str:
         """Generate optimized search query without LLM call."""
         # Simple keyword extraction without LLM call to save resources
         import re
@@ -311,159 +710,243 @@ Please return results in JSON format:
         else:
             return question  # Fallback to original question
     
-    def _generate_and_summarize_answer(self, state: WHIRAGState) -> Dict[str, Any]:
-        """Combined answer generation and summarization - Second LLM call."""
+    def _answer_inputs(self, state: WHIRAGState, summary: bool = False) -> Dict[str, str]:
+        """Prompt pieces shared by the chat summary and the detailed answer.
+        
+        With ``summary`` the document context holds only the top documents.
+        """
+        related_qa = state.get("related_previous_qa", [])
+        if WHIConfig.CONTEXT_PACKING_ENABLED and related_qa:
+            related_qa = self.context_packer.pack_history(related_qa)
+        context_summary = state.get("context_summary", "")
+        
+        # Build prompt with historical context
+        context_info = ""
+        if related_qa:
+            context_info = "\n\n**Related Historical Conversations:**\n"
+            for i, qa in enumerate(related_qa, 1):
+                context_info += f"{i}. Q: {qa['question']}\n   A: {qa['answer']}\n\n"
+        
+        if context_summary and context_summary != "No historical conversation context":
+            context_info += f"\n**Conversation Context Summary:**\n{context_summary}\n\n"
+        
+        # Language-specific instructions
+        if state.get("output_language", "english") == "chinese":
+            language_instruction = "请用中文回答。确保所有回答内容都使用中文，包括医学术语的中文表达。"
+            system_content = "你是一位专业的WHI医学数据分析助手，能够结合历史对话上下文提供准确答案。请严格遵循markdown格式要求，同时保持专业的回答风格。请用中文回答所有问题。"
+        else:
+            language_instruction = "Please respond in English. Ensure all content is in English, including medical terminology."
+            system_content = "You are a professional medical data analysis assistant who can provide accurate answers by combining historical conversation context. Please strictly follow markdown format requirements while maintaining a professional answering style. Please respond in English."
+        
+        if summary:
+            context = state.get("summary_context") or self._build_context(
+                (state.get("retrieved_documents") or [])[:WHIConfig.SUMMARY_CONTEXT_DOCUMENTS]
+            )
+        else:
+            context = state.get("context") or self._build_context(state.get("retrieved_documents", []))
+        
+        return {
+            "context": context,
+            "context_info": context_info,
+            "language_instruction": language_instruction,
+            "system_content": system_content
+        }
+    
+    async def _generate_summary(self, state: WHIRAGState) -> Dict[str, Any]:
+        """Chat summary generation - runs alongside the detailed answer on a fast model."""
+        processing_steps = []
         try:
-            question = state["question"]
-            retrieved_docs = state.get("retrieved_documents", [])
-            related_qa = state.get("related_previous_qa", [])
-            context_summary = state.get("context_summary", "")
-            output_language = state.get("output_language", "english")
-            processing_steps = state.get("processing_steps", [])
-            processing_steps.append("Starting combined answer generation and summarization")
-            
-            # Build document context
-            context = self._build_context(retrieved_docs)
-            
-            # Build prompt with historical context
-            context_info = ""
-            if related_qa:
-                context_info = "\n\n**Related Historical Conversations:**\n"
-                for i, qa in enumerate(related_qa, 1):
-                    context_info += f"{i}. Q: {qa['question']}\n   A: {qa['answer']}\n\n"
-            
-            if context_summary and context_summary != "No historical conversation context":
-                context_info += f"\n**Conversation Context Summary:**\n{context_summary}\n\n"
-            
-            # Language-specific instructions
-            if output_language == "chinese":
-                language_instruction = "请用中文回答。确保所有回答内容都使用中文，包括医学术语的中文表达。"
-                system_content = "你是一位专业的WHI医学数据分析助手，能够结合历史对话上下文提供准确答案。请严格遵循markdown格式要求，同时保持专业的回答风格。请用中文回答所有问题。"
-            else:
-                language_instruction = "Please respond in English. Ensure all content is in English, including medical terminology."
-                system_content = "You are a professional medical data analysis assistant who can provide accurate answers by combining historical conversation context. Please strictly follow markdown format requirements while maintaining a professional answering style. Please respond in English."
+            processing_steps.append("Starting summary generation")
+            inputs = self._answer_inputs(state, summary=True)
             
-            # 在_generate_and_summarize_answer方法中，将combined_prompt修改为：
-            combined_prompt = f"""
-            {language_instruction}
+            summary_prompt = f"""
+            {inputs["language_instruction"]}
             
-            You are a professional WHI medical data analysis assistant. Please provide BOTH a comprehensive detailed answer and a concise summary.
+            You are a professional WHI medical data analysis assistant. Please give a concise answer for chat display.
             
-            User's current question: {question}
+            User's current question: {state["question"]}
             
             Document context:
-            {context}
-            {context_info}
-            
-            **Please provide your response in the following JSON format:**
-            {{
-                "detailed_answer": "Your comprehensive, professional answer with markdown formatting...",
-                "summary_answer": "A concise summary for chat display..."
-            }}
-            
-            **CRITICAL: For detailed_answer, provide COMPREHENSIVE and THOROUGH analysis:**
-            1. **No Length Restrictions**: Provide as much detail as necessary to fully address the question
-            2. **Complete Coverage**: Include all relevant background information, methodology, and statistical details
-            3. **Rich Context**: Provide comprehensive medical and research context
-            4. **Detailed Data**: Include specific numbers, percentages, research findings, and comparative analysis
-            5. **Clinical Implications**: Thoroughly discuss clinical significance and practical applications
-            6. **Structured Organization**: Use clear headings, subheadings, and well-organized sections
-            7. **Comprehensive Analysis**: Cover all aspects of the question with in-depth explanations
-            
-            **For summary_answer (separate from detailed answer):**
+            {inputs["context"]}
+            {inputs["context_info"]}
+            
+            **Requirements:**
             1. Keep concise (3-4 sentences, 200-300 words)
             2. Extract only the most critical findings
-            3. Suitable for quick chat display
+            3. Suitable for quick chat display, no headings or code blocks
+            4. Reply with the summary text only
+            """
+            
+            messages = [
+                {"role": "system", "content": inputs["system_content"]},
+                {"role": "user", "content": summary_prompt}
+            ]
+            summary_answer = (await self.llm_client.agenerate_response(messages, stage="summarize")).strip()
+            
+            # Listeners can show the summary while the detailed answer is still streaming
+            if state.get("stream_answer"):
+                from langgraph.config import get_stream_writer
+                get_stream_writer()({"type": "summary", "summary_answer": summary_answer})
+            
+            processing_steps.append("Summary generation completed")
+            return {
+                "summary_answer": summary_answer,
+                "processing_steps": processing_steps
+            }
+        
+        except Exception as e:
+            return {
+                "error": f"Summary generation failed: {str(e)}",
+                "summary_answer": "Unable to process your question at this time.",
+                "processing_steps": processing_steps + [f"Summary generation failed: {str(e)}"]
+            }
+    
+    async def _generate_detailed_answer(self, state: WHIRAGState) -> Dict[str, Any]:
+        """Detailed answer generation - Second LLM call."""
+        processing_steps = []
+        try:
+            processing_steps.append("Starting detailed answer generation")
+            inputs = self._answer_inputs(state)
+            
+            # Verbosity decides the prompt variant and the hard output token budget
+            verbosity = self._resolve_verbosity(state.get("verbosity"), state.get("question_type", "general"))
+            verbosity_instruction = self.VERBOSITY_INSTRUCTIONS[verbosity]
+            max_tokens = WHIConfig.VERBOSITY_MAX_TOKENS[verbosity]
+            processing_steps.append(f"Answer verbosity: {verbosity} (max {max_tokens} tokens)")
             
-            **Formatting requirements for detailed_answer:**
+            detailed_prompt = f"""
+            {inputs["language_instruction"]}
+            
+            You are a professional WHI medical data analysis assistant. Please answer the question at the level of detail set out below.
+            
+            User's current question: {state["question"]}
+            
+            Document context:
+            {inputs["context"]}
+            {inputs["context_info"]}
+            
+            {verbosity_instruction}
+            
+            **Formatting requirements:**
+            - Reply with the markdown answer only, not wrapped in a code block
             - Use ## for main titles, ### for subtitles
             - Use - for lists, **bold** for emphasis
             - Include specific data points and statistical values
-            - Provide comprehensive background and context
             - Maintain professional medical terminology
-            - Add detailed explanations and interpretations
-            
-            IMPORTANT: The detailed_answer should be as comprehensive and thorough as possible, with NO length limitations. Provide complete, in-depth analysis that fully addresses all aspects of the question.
             """
             
             messages = [
-                {"role": "system", "content": system_content},
-                {"role": "user", "content": combined_prompt}
+                {"role": "system", "content": inputs["system_content"]},
+                {"role": "user", "content": detailed_prompt}
             ]
             
-            combined_response = self.llm_client.generate_response(messages)
-            
-            try:
-                # Clean possible markdown format
-                if "```json" in combined_response:
-                    combined_response = combined_response.split("```json")[1].split("```")[0].strip()
-                elif "```" in combined_response:
-                    combined_response = combined_response.split("```")[1].strip()
-                
-                response_data = json.loads(combined_response)
-                detailed_answer = response_data.get("detailed_answer", "")
-                summary_answer = response_data.get("summary_answer", "")
-                
-            except Exception as e:
-                # Fallback: split the response manually if JSON parsing fails
-                lines = combined_response.split('\n')
-                detailed_answer = combined_response
-                summary_answer = ' '.join(lines[:3]) if len(lines) >= 3 else combined_response[:200]
+            if state.get("stream_answer"):
+                detailed_answer = await self._stream_detailed_answer(messages, max_tokens=max_tokens)
+            else:
+                detailed_answer = await self.llm_client.agenerate_response(messages, stage="generate", max_tokens=max_tokens)
             
             # Apply markdown format standardization to detailed answer
-            detailed_answer = self._ensure_markdown_format(detailed_answer)
+            detailed_answer = self._ensure_markdown_format(self._strip_code_fence(detailed_answer))
             
             # Extract source information
-            sources = self._extract_sources(retrieved_docs)
+            sources = self._extract_sources(state.get("retrieved_documents", []))
             
-            processing_steps.append("Combined answer generation and summarization completed")
+            processing_steps.append("Detailed answer generation completed")
             
             return {
-                "context": context,
                 "answer": detailed_answer,
-                "summary_answer": summary_answer,
                 "sources": sources,
                 "processing_steps": processing_steps
             }
-            
+        
         except Exception as e:
             return {
-                "error": f"Combined answer generation failed: {str(e)}",
+                "error": f"Detailed answer generation failed: {str(e)}",
                 "answer": "Sorry, an error occurred while generating the answer.",
-                "summary_answer": "Unable to process your question at this time.",
-                "processing_steps": processing_steps + [f"Combined answer generation failed: {str(e)}"]
+                "processing_steps": processing_steps + [f"Detailed answer generation failed: {str(e)}"]
             }
     
-    def _build_context(self, documents: List) -> str:
-        """Build context string from retrieved documents."""
-        if not documents:
-            return "No relevant information found."
+    async def _stream_detailed_answer(self, messages: List[Dict[str, str]], **kwargs) -> str:
+        """Stream the detailed answer completion, forwarding each new piece of text to graph listeners."""
+        from langgraph.config import get_stream_writer
+        writer = get_stream_writer()
+        chunks = []
+        fenced = None  # Whether the answer is wrapped in a ```markdown block, undecided until its first line
+        pending = ""  # Text held back until it is known not to be a code fence line
         
-        context_parts = []
-        for i, doc in enumerate(documents, 1):
-            context_parts.append(f"Information {i}:\n{doc.page_content}\n")
+        async for delta in self.llm_client.astream_response(messages, stage="generate", **kwargs):
+            chunks.append(delta)
+            pending += delta
+            if fenced is None:
+                head = pending.lstrip()
+                if head.startswith("```"):
+                    if "\n" not in head:
+                        continue
+                    fenced, pending = True, head.split("\n", 1)[1]
+                elif "```".startswith(head):
+                    continue
+                else:
+                    fenced = False
+            
+            text, pending = pending, ""
+            if fenced:
+                # Hold back a last line that may still become the closing fence
+                line_start = text.rfind("\n")
+                if line_start != -1 and "```".startswith(text[line_start:].strip()):
+                    text, pending = text[:line_start], text[line_start:]
+            if text:
+                writer({"type": "answer_delta", "delta": text})
         
-        return "\n".join(context_parts)
+        if pending and not fenced:
+            writer({"type": "answer_delta", "delta": pending})
+        return "".join(chunks)
+    
+    @staticmethod
+    def _strip_code_fence(text: str) -> str:
+        """Unwrap an answer the model put inside a ```markdown block, even an unterminated one."""
+        stripped = text.strip()
+        if not stripped.startswith("```"):
+            return text
+        body = stripped.split("\n", 1)[1] if "\n" in stripped else ""
+        return body[:-3].rstrip() if body.rstrip().endswith("```") else body
+    
+    @staticmethod
+    def _resolve_verbosity(requested: str, question_type: str) -> str:
+        """Requested verbosity, or the default for the question type."""
+        if requested in WHIConfig.VERBOSITY_MODES:
+            return requested
+        return WHIConfig.DEFAULT_VERBOSITY.get(question_type, "standard")
+    
+    def _build_context(self, documents: List) -> str:
+        """Build context string from retrieved documents, every document in full."""
+        return WHIContextPacker.plain_context(documents)
     
     def _extract_sources(self, documents: List) -> List[Dict[str, Any]]:
         """Extract source information from documents."""
         sources = []
         for doc in documents:
+            dataset_name = doc.metadata.get("dataset_name", "N/A")
+            dataset_count = doc.metadata.get("dataset_count", 1)
+            if dataset_count > 1:
+                # Merged variable definition: the first few datasets that contain it and a count
+                listed = doc.metadata.get("dataset_names") or [dataset_name]
+                more = dataset_count - len(listed)
+                dataset_name = ", ".join(listed) + (f" and {more} more" if more > 0 else "")
             source_info = {
                 "type": doc.metadata.get("type", "unknown"),
-                "dataset_name": doc.metadata.get("dataset_name", "N/A"),
+                "dataset_name": dataset_name,
                 "variable_name": doc.metadata.get("variable_name", "N/A"),
                 "study": doc.metadata.get("study", "N/A")
             }
             sources.append(source_info)
         return sources
     
-    def _validate_answer(self, state: WHIRAGState) -> Dict[str, Any]:
+    async def _validate_answer(self, state: WHIRAGState) -> Dict[str, Any]:
         """Answer validation node."""
         try:
             answer = state.get("answer", "")
             sources = state.get("sources", [])
-            processing_steps = state.get("processing_steps", [])
+            processing_steps = []
             processing_steps.append("Starting answer validation")
             
             # Simple confidence assessment
@@ -0,0 +1,43 @@
+from langchain_core.documents import Document
+from rag.context_packer import WHIContextPacker
+
+def variable(name):
+    return Document(
+        page_content=f"Variable Name: {name}\nVariable Description: {name} measured at baseline\nDataset: f80_rel1\nStudy: phs000200\nDatabase: whi",
+        metadata={"type": "variable", "variable_accession": f"phv_{name}"}
+    )
+
+def test_packed_context_is_never_longer_than_the_plain_one():
+    packer = WHIContextPacker()
+    for documents in ([], [Document(page_content="Variable Name: HGB", metadata={"type": "variable"})], [variable(f"V{i}") for i in range(10)]):
+        context, stats = packer.pack_documents(documents)
+        plain = WHIContextPacker.plain_context(documents)
+        assert stats["context_tokens"] == packer.counter.count(context) <= packer.counter.count(plain)
+
+def test_stats_have_the_same_keys_without_documents():
+    packer = WHIContextPacker()
+    assert packer.pack_documents([])[1].keys() == packer.pack_documents([variable("HGB")])[1].keys()
+
+def lung_ct_variable(accession, name, description):
+    return Document(
+        page_content=f"Variable Name: {name}\nVariable Description: {description}\nVariable Type: Numeric\nDataset: MESA_AncilMesaLungExam2CT\nStudy: phs000209\nDatabase: mesa",
+        metadata={"type": "variable", "variable_accession": accession, "variable_name": name, "dataset_accession": "pht002101"}
+    )
+
+def test_similar_variables_are_all_kept():
+    documents = [
+        lung_ct_variable("phv00144708", "B_be_960", "BOTH LUNGS: NUMBER VOXELS BELOW OR EQUAL TO -960 HOUNSFIELD UNITS"),
+        lung_ct_variable("phv00144765", "BC_be_960", "BOTH LUNGS, CORE: NUMBER VOXELS BELOW OR EQUAL TO -960 HOUNSFIELD UNITS"),
+        lung_ct_variable("phv00144822", "BP_be_960", "BOTH LUNGS, PEEL: NUMBER VOXELS BELOW OR EQUAL TO -960 HOUNSFIELD UNITS")
+    ]
+    context, stats = WHIContextPacker().pack_documents(documents)
+    assert stats["documents"] == 3 and stats["duplicates_dropped"] == 0
+    assert all(name in context for name in ("B_be_960", "BC_be_960", "BP_be_960"))
+
+def test_repeated_documents_are_dropped():
+    hemoglobin = variable("HGB")
+    untagged = Document(page_content="Study overview:  WHI clinical trial", metadata={})
+    documents = [hemoglobin, variable("HCT"), hemoglobin, untagged, Document(page_content="Study overview: WHI clinical trial", metadata={})]
+    context, stats = WHIContextPacker().pack_documents(documents)
+    assert stats["documents"] == 3 and stats["duplicates_dropped"] == 2
+    assert context.count("HGB measured at baseline") == 1
@@ -0,0 +1,63 @@
+import re
+import zlib
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+from config.settings import WHIConfig
+from vector_store.manager import WHIVectorStoreManager
+
+class HashingEmbeddings:
+    """Bag-of-words vectors, so the test needs no embedding model."""
+
+    DIM = 256
+
+    def embed_query(self, text):
+        vector = np.zeros(self.DIM, dtype=np.float32)
+        for word in re.findall(r"[a-z]+", text.lower()):
+            vector[zlib.crc32(word.encode()) % self.DIM] += 1.0
+        return vector / max(np.linalg.norm(vector), 1.0)
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+def variable(accession, name, description):
+    return Document(
+        page_content=f"Variable Name: {name}\nVariable Description: {description}\nDataset: f80_rel1\nStudy: phs000200\nDatabase: whi",
+        metadata={"type": "variable", "database": "whi", "variable_accession": accession, "variable_name": name}
+    )
+
+def dataset(accession, name, description):
+    return Document(
+        page_content=f"Dataset Name: {name}\nDataset Description: {description}\nStudy: phs000200\nDatabase: whi",
+        metadata={"type": "dataset", "database": "whi", "dataset_accession": accession, "dataset_name": name}
+    )
+
+DOCUMENTS = [
+    variable("phv1", "BMI", "Body mass index, weight in kg divided by height in m squared"),
+    variable("phv2", "WEIGHT", "Body weight in kg"),
+    variable("phv3", "HEIGHT", "Standing height in cm"),
+    variable("phv4", "WAIST", "Waist circumference in cm"),
+    variable("phv5", "SYST", "Systolic blood pressure"),
+    dataset("pht1", "f80_rel1", "Form 80 physical measurements: body mass index, weight, height and waist"),
+    dataset("pht2", "f2_rel1", "Form 2 demographics"),
+    dataset("pht3", "f30_rel1", "Form 30 medical history"),
+    dataset("pht4", "f45_rel1", "Form 45 current supplements"),
+    dataset("pht5", "f134_rel1", "Form 134 hormone use"),
+]
+
+@pytest.fixture
+def manager(tmp_path, monkeypatch):
+    monkeypatch.setattr(WHIConfig, "VECTOR_STORE_PATH", str(tmp_path))
+    monkeypatch.setattr(WHIConfig, "FAISS_INDEX_TYPE", "flat")
+    manager = WHIVectorStoreManager(embeddings=HashingEmbeddings())
+    manager.create_vector_store(DOCUMENTS)
+    return manager
+
+def test_mixed_question_gets_variables_despite_a_dataset_label(manager):
+    # The local classifier labels questions like this one "dataset"
+    question = "How is body mass index calculated and which dataset contains it?"
+    # Five dataset documents: a strict type filter would fill all k slots with them
+    documents = manager.similarity_search(question, k=5, filters={"type": "dataset"})
+    names = [doc.metadata.get("variable_name") or doc.metadata.get("dataset_name") for doc in documents]
+    assert "BMI" in names
+    assert "f80_rel1" in names
@@ -0,0 +1,11 @@
+import os
+import pytest
+from benchmarks.import_time import BUDGETS_MS, check
+
+# Budgets are set on a developer machine; CI runners are slower, raise it there rather than the budgets
+SCALE = float(os.getenv("IMPORT_BUDGET_SCALE", "1.5"))
+
+@pytest.mark.slow
+def test_imports_within_budget_and_lazy():
+    budgets = {module: budget * SCALE for module, budget in BUDGETS_MS.items()}
+    assert check(budgets, runs=3), "Import time budget exceeded or heavy dependency imported eagerly, see the table above"
@@ -0,0 +1,23 @@
+from llm.json_stream import PartialJSONStream
+
+def feed_in_chunks(text, size=3):
+    parser = PartialJSONStream()
+    events = []
+    for start in range(0, len(text), size):
+        events += parser.feed(text[start:start + size])
+    return parser, events
+
+def test_field_events_arrive_before_the_object_is_complete():
+    reply = '```json\n{"question_classification": {"question_type": "variable"}, "context_analysis": {"is_related": false}}\n```'
+    cut = reply.index('"context_analysis"')
+    parser, events = feed_in_chunks(reply[:cut])
+    assert {"field": "question_classification", "value": {"question_type": "variable"}} in events
+    assert not parser.complete
+
+def test_truncated_reply_keeps_its_fields():
+    reply = '<think>{not json}</think>{"question_classification": {"question_type": "dataset"}, "context_analysis": {"related_qa_indices": [0, 1], "context_summary": "Earlier question about \\u00e9'
+    parser, _ = feed_in_chunks(reply)
+    assert parser.close() == {
+        "question_classification": {"question_type": "dataset"},
+        "context_analysis": {"related_qa_indices": [0, 1], "context_summary": "Earlier question about é"}
+    }
@@ -0,0 +1,82 @@
+import asyncio
+import socket
+import threading
+import time
+import pytest
+from langchain_core.documents import Document
+from config.settings import WHIConfig
+from benchmarks.fake_llm_server import FakeLLMSettings, create_app
+import rag.system
+from rag.system import WHIRAGSystem
+
+class FakeVectorStore:
+    """Vector store returning one fixed document, so the test needs no embedding model or index."""
+    
+    DOCUMENT = Document(
+        page_content="Variable Name: HGB\nVariable Description: Hemoglobin (g/dL)\nVariable Type: NUMERIC\nDataset: f80_rel1\nStudy: phs000200\nDatabase: whi",
+        metadata={"type": "variable", "variable_name": "HGB", "dataset_name": "f80_rel1", "study": "phs000200"}
+    )
+    
+    def similarity_search(self, query, k=5, **kwargs):
+        return [self.DOCUMENT]
+    
+    async def asimilarity_search(self, query, k=5, **kwargs):
+        return [self.DOCUMENT]
+    
+    def query_cache_stats(self):
+        return {"size": 0, "hits": 0, "misses": 0}
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    """Fake chat-completions server answering instantly, with the LLM configuration pointed at it."""
+    import uvicorn
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    settings = FakeLLMSettings(latency_ms=0, latency_sigma=0, tokens_per_second=0, output_tokens=30, seed=0)
+    server = uvicorn.Server(uvicorn.Config(create_app(settings), host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 10
+    while not server.started:
+        if time.monotonic() > deadline:
+            raise Exception("Fake LLM server did not start")
+        time.sleep(0.05)
+    
+    monkeypatch.setattr(WHIConfig, "DASHSCOPE_BASE_URL", f"http://127.0.0.1:{port}/v1")
+    monkeypatch.setattr(WHIConfig, "DASHSCOPE_API_KEY", "test")
+    yield
+    server.should_exit = True
+    thread.join()
+
+@pytest.fixture
+def system(fake_llm, monkeypatch):
+    monkeypatch.setattr(WHIConfig, "LLM_CASSETTE_MODE", None)
+    monkeypatch.setattr(WHIConfig, "ANSWER_CACHE_ENABLED", False)
+    monkeypatch.setattr(WHIConfig, "LOCAL_CLASSIFIER_ENABLED", False)  # Every question makes the classification call
+    monkeypatch.setattr(rag.system, "WHIVectorStoreManager", FakeVectorStore)
+    monkeypatch.setattr(WHIRAGSystem, "_initialize_system", lambda self: None)
+    return WHIRAGSystem()
+
+def assert_answered(result):
+    assert not result.get("error"), result.get("error")
+    assert result["answer"] and result["summary_answer"]
+    calls = result["metrics"]["llm_calls"]
+    assert {call["stage"] for call in calls} == {"classify", "summarize", "generate"}
+    assert all(call["status"] == "ok" for call in calls), calls
+
+def test_process_question_twice(system):
+    for _ in range(2):
+        assert_answered(system.process_question("What are the units of the hemoglobin variable?"))
+
+def test_async_calls_on_new_event_loops(system):
+    async def stream():
+        events = [event async for event in system.astream_question("Which dataset contains hemoglobin?")]
+        streamed = "".join(event["delta"] for event in events if event["type"] == "answer_delta")
+        assert streamed.split() == events[-1]["result"]["answer"].split()  # Final answer only has its whitespace normalized
+        return events[-1]["result"]
+    
+    assert_answered(system.process_question("What are the units of the hemoglobin variable?"))
+    for _ in range(2):
+        assert_answered(asyncio.run(stream()))
+        assert_answered(asyncio.run(system.aprocess_question("What are the units of the hemoglobin variable?")))
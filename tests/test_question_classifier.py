@@ -0,0 +1,52 @@
+import pytest
+from config.settings import WHIConfig
+from data.processor import WHIDataProcessor
+from rag.question_classifier import WHIQuestionClassifier
+
+# General questions about catalog topics, none of them in the training set
+HELD_OUT_GENERAL = [
+    "What did the hormone trials show about breast cancer?",
+    "Is hemoglobin lower in women with heart failure?",
+    "How does smoking affect lung cancer risk in older women?",
+    "What is the link between blood pressure and stroke after menopause?",
+    "Why were hip fractures an outcome of the calcium trial?",
+    "Does physical activity lower the risk of diabetes?",
+    "How do I compare dementia rates between study arms?",
+    "What explains the higher rate of atrial fibrillation in older participants?",
+    "Is coronary calcium a good predictor of heart attacks?",
+    "How did WHI measure the effect of diet on colorectal cancer?",
+]
+
+@pytest.fixture(scope="module")
+def classifier():
+    processor = WHIDataProcessor()
+    processor.load_data()
+    classifier = WHIQuestionClassifier()
+    classifier.train(*WHIQuestionClassifier.training_questions(processor))
+    return classifier
+
+@pytest.mark.slow
+def test_general_questions_are_not_confidently_mislabeled(classifier):
+    # A confident variable or dataset label skips the LLM call and narrows retrieval to that type
+    mislabeled = []
+    for question in HELD_OUT_GENERAL:
+        label, probability = classifier.predict(question)
+        if label != "general" and probability >= WHIConfig.CLASSIFIER_CONFIDENCE_THRESHOLD:
+            mislabeled.append((question, label, round(probability, 2)))
+    assert not mislabeled, mislabeled
+
+@pytest.mark.slow
+def test_catalog_questions_keep_their_type(classifier):
+    assert classifier.predict("What does the variable rbc5 measure?")[0] == "variable"
+    assert classifier.predict("What is in the spec_draws_rel4 dataset?")[0] == "dataset"
+
+@pytest.mark.slow
+def test_accession_questions_skip_the_llm(classifier):
+    for question, question_type in [
+        ("What is phv00218990?", "variable"),
+        ("Which datasets contain PHV00218990.v1?", "variable"),
+        ("What is pht000998?", "dataset"),
+    ]:
+        label, probability = classifier.predict(question)
+        assert label == question_type
+        assert probability >= WHIConfig.CLASSIFIER_CONFIDENCE_THRESHOLD
@@ -0,0 +1,168 @@
+import json
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterator, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from langchain_core.documents import Document
+
+class WHIVectorArtifact:
+    """On-disk vector store: a memory-mapped FAISS index plus a SQLite document table.
+
+    Row ``position`` of the documents table holds the document stored at that FAISS
+    position. Nothing is unpickled on load: index pages are mapped from the file and
+    shared between worker processes through the page cache, and documents are read
+    only for the positions a search returns.
+    """
+    
+    INDEX_FILE = "vectors.faiss"
+    DOCUMENTS_FILE = "documents.sqlite"
+    LEGACY_FILES = ("index.faiss", "index.pkl")  # LangChain FAISS.save_local output
+    
+    def __init__(self, index, documents_path: str):
+        self.index = index
+        self._documents_path = documents_path
+        self._local = threading.local()  # SQLite connections cannot be shared between threads
+    
+    @classmethod
+    def exists(cls, directory: str) -> bool:
+        return all(os.path.exists(os.path.join(directory, name)) for name in (cls.INDEX_FILE, cls.DOCUMENTS_FILE))
+    
+    @classmethod
+    def open(cls, directory: str, mmap: bool = True) -> Optional["WHIVectorArtifact"]:
+        """Open an artifact, None if there is none in ``directory``.
+
+        With ``mmap`` the index is mapped read-only; use ``writable_index`` to modify it.
+        """
+        import faiss
+        if not cls.exists(directory):
+            return None
+        
+        flags = 0
+        if mmap:
+            mmap_flag = getattr(faiss, "IO_FLAG_MMAP_IFC", None)  # added in faiss 1.8
+            if mmap_flag is None:
+                print("⚠️ This faiss version cannot memory-map indexes, reading the vector index into memory")
+            else:
+                flags = mmap_flag | faiss.IO_FLAG_READ_ONLY
+        index = faiss.read_index(os.path.join(directory, cls.INDEX_FILE), flags)
+        return cls(index, os.path.join(directory, cls.DOCUMENTS_FILE))
+    
+    @classmethod
+    def write(cls, directory: str, index, ids: List[str], documents: List["Document"]) -> None:
+        """Write the index and its documents (in FAISS position order), replacing any previous artifact."""
+        writer = cls.writer(directory)
+        writer.add(ids, documents)
+        writer.commit(index)
+    
+    @classmethod
+    def writer(cls, directory: str) -> "WHIVectorArtifactWriter":
+        """Writer adding documents batch by batch, for builds that do not hold every document."""
+        return WHIVectorArtifactWriter(directory)
+    
+    def __len__(self) -> int:
+        return self.index.ntotal
+    
+    def writable_index(self):
+        """In-memory copy of the index that can be modified.
+        
+        ``faiss.clone_index`` would keep sharing the read-only mapping, so read the file again.
+        """
+        import faiss
+        return faiss.read_index(os.path.join(os.path.dirname(self._documents_path), self.INDEX_FILE))
+    
+    def documents_at(self, positions: List[int]) -> List["Document"]:
+        """Documents at the given FAISS positions, in the same order."""
+        from langchain_core.documents import Document
+        if not positions:
+            return []
+        rows = self._connection().execute(
+            f"SELECT position, page_content, metadata FROM documents WHERE position IN ({','.join('?' * len(positions))})",
+            [int(pos) for pos in positions]
+        ).fetchall()
+        by_position = {pos: Document(page_content=content, metadata=json.loads(metadata)) for pos, content, metadata in rows}
+        return [by_position[pos] for pos in positions]
+    
+    def documents_with_ids(self) -> List[Tuple[str, "Document"]]:
+        """(id, document) pairs for all documents, in FAISS position order."""
+        from langchain_core.documents import Document
+        rows = self._connection().execute("SELECT id, page_content, metadata FROM documents ORDER BY position")
+        return [(doc_id, Document(page_content=content, metadata=json.loads(metadata))) for doc_id, content, metadata in rows]
+    
+    def metadata_values(self, key: str) -> List[Optional[str]]:
+        """Value of one metadata key for every document in FAISS position order, None where unset."""
+        rows = self._connection().execute(
+            "SELECT json_extract(metadata, ?) FROM documents ORDER BY position", (f'$."{key}"',)
+        )
+        return [None if value is None else str(value) for (value,) in rows]
+    
+    def texts(self) -> Iterator[str]:
+        """Document texts in FAISS position order."""
+        for (content,) in self._connection().execute("SELECT page_content FROM documents ORDER BY position"):
+            yield content
+    
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(f"{Path(self._documents_path).absolute().as_uri()}?mode=ro", uri=True)
+            self._local.connection = connection
+        return connection
+
+class WHIVectorArtifactWriter:
+    """Writes an artifact incrementally: document rows go to a temporary SQLite file as
+    they are added, and ``commit`` writes the index and swaps both files into place.
+    """
+    
+    def __init__(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.count = 0
+        self._documents_path = os.path.join(directory, WHIVectorArtifact.DOCUMENTS_FILE)
+        self._tmp_documents_path = f"{self._documents_path}.tmp"
+        if os.path.exists(self._tmp_documents_path):
+            os.remove(self._tmp_documents_path)
+        self._connection = sqlite3.connect(self._tmp_documents_path)
+        self._connection.execute(
+            "CREATE TABLE documents (position INTEGER PRIMARY KEY, id TEXT NOT NULL UNIQUE, "
+            "page_content TEXT NOT NULL, metadata TEXT NOT NULL)"
+        )
+    
+    def add(self, ids: List[str], documents: List["Document"]) -> None:
+        """Append documents at the next FAISS positions."""
+        if len(ids) != len(documents):
+            raise Exception(f"Got {len(ids)} ids for {len(documents)} documents")
+        self._connection.executemany(
+            "INSERT INTO documents VALUES (?, ?, ?, ?)",
+            (
+                (position, doc_id, doc.page_content, json.dumps(doc.metadata, ensure_ascii=False, default=str))
+                for position, (doc_id, doc) in enumerate(zip(ids, documents), self.count)
+            )
+        )
+        self.count += len(ids)
+    
+    def commit(self, index) -> None:
+        """Write the index holding every added document and replace any previous artifact."""
+        import faiss
+        if index.ntotal != self.count:
+            self.abort()
+            raise Exception(f"Index holds {index.ntotal} vectors for {self.count} documents")
+        self._connection.commit()
+        self._connection.close()
+        
+        index_path = os.path.join(self.directory, WHIVectorArtifact.INDEX_FILE)
+        faiss.write_index(index, f"{index_path}.tmp")
+        os.replace(f"{index_path}.tmp", index_path)
+        os.replace(self._tmp_documents_path, self._documents_path)
+        
+        for name in WHIVectorArtifact.LEGACY_FILES:
+            legacy_path = os.path.join(self.directory, name)
+            if os.path.exists(legacy_path):
+                os.remove(legacy_path)
+    
+    def abort(self) -> None:
+        """Discard the documents added so far, leaving any previous artifact in place."""
+        self._connection.close()
+        if os.path.exists(self._tmp_documents_path):
+            os.remove(self._tmp_documents_path)
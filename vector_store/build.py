@@ -0,0 +1,219 @@
+"""Offline vector store build for the WHI RAG system.
+
+Run from the repository root:
+
+    python -m vector_store.build [--workers N] [--batch-size N] [--full]
+
+Documents are embedded in batches across a process pool. Every finished batch is
+checkpointed to disk under a hash of its contents, so an interrupted build resumes
+where it stopped. When an up-to-date manifest exists only added or changed rows are
+embedded. The web app only loads the index written here.
+"""
+import argparse
+import hashlib
+import multiprocessing
+import os
+import shutil
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Tuple
+import numpy as np
+from langchain_core.documents import Document
+from config.settings import WHIConfig
+from data.processor import WHIDataProcessor
+from vector_store.manager import WHIVectorStoreManager
+from vector_store.manifest import WHIIndexManifest
+from vector_store import faiss_index
+
+# Embedding model of a pool worker process, loaded once by the initializer
+_worker_embeddings = None
+
+def _init_worker(model_name: str, threads: int) -> None:
+    """Load the embedding model in a pool worker."""
+    global _worker_embeddings
+    import torch
+    from langchain_huggingface import HuggingFaceEmbeddings
+    torch.set_num_threads(threads)
+    _worker_embeddings = HuggingFaceEmbeddings(model_name=model_name)
+
+def _embed_texts(texts: List[str]) -> np.ndarray:
+    """Embed a batch of texts in a pool worker."""
+    return np.asarray(_worker_embeddings.embed_documents(texts), dtype=np.float32)
+
+class WHIIndexBuilder:
+    """Builds or incrementally updates the FAISS index with batched, resumable embedding."""
+    
+    def __init__(self, batch_size: int = None, workers: int = None, checkpoint_dir: str = None):
+        self.batch_size = batch_size or WHIConfig.DOCUMENT_BATCH_SIZE
+        self.workers = workers or WHIConfig.EMBEDDING_WORKERS
+        self.checkpoint_dir = checkpoint_dir or f"{WHIConfig.VECTOR_STORE_PATH.rstrip('/')}_checkpoints"
+        self.data_processor = WHIDataProcessor()
+        self.vector_manager = WHIVectorStoreManager()
+        self._started = 0.0
+        self._embedded = 0
+        self._progress_lock = threading.Lock()
+    
+    def build(self, full: bool = False) -> None:
+        """Bring the vector store in line with the data files."""
+        self.data_processor.load_data()
+        fingerprints = WHIIndexManifest.fingerprint_sources(WHIConfig.data_files(), WHIDataProcessor.document_format())
+        model = WHIConfig.EMBEDDING_MODEL_NAME
+        
+        index_type = WHIConfig.FAISS_INDEX_TYPE
+        
+        manifest = None if full else WHIIndexManifest.load(WHIConfig.VECTOR_STORE_PATH)
+        if not full and self.vector_manager.migrate_legacy_store():
+            print("Converted pickled vector store to the memory-mapped format")
+        if not full and self.vector_manager.load_vector_store():
+            if manifest is None:
+                # Index built before manifests existed, reconstruct one from the stored documents
+                manifest = WHIIndexManifest.from_documents(
+                    model, {}, self.vector_manager.get_documents_with_ids(), self.vector_manager.index_type()
+                )
+            if manifest.embedding_model == model and (
+                manifest.index_type == index_type or manifest.index_type in faiss_index.LOSSLESS_TYPES
+            ):
+                if manifest.index_type != index_type:
+                    # Stored vectors are exact, so only the index has to be trained again
+                    print(f"Re-indexing vector store as {index_type}...")
+                    self.vector_manager.rebuild_index(index_type)
+                    manifest.index_type = index_type
+                    manifest.save(WHIConfig.VECTOR_STORE_PATH)
+                self._update(manifest, fingerprints)
+                return
+            print("Embedding model or index type changed, rebuilding vector store...")
+        
+        self._create(fingerprints)
+    
+    def _create(self, fingerprints) -> None:
+        """Embed every document and write a fresh index and manifest."""
+        print("Creating new vector store...")
+        # Batches go to disk and into the index as they are embedded; only the manifest entries are kept
+        manifest = WHIIndexManifest(WHIConfig.EMBEDDING_MODEL_NAME, fingerprints, index_type=WHIConfig.FAISS_INDEX_TYPE)
+        count = self.vector_manager.create_vector_store_from_batches(
+            self._embed_batches(self.data_processor.iter_document_batches(self.batch_size)),
+            on_batch=manifest.record
+        )
+        manifest.save(WHIConfig.VECTOR_STORE_PATH)
+        self._clear_checkpoints()
+        print(f"Vector store creation completed: {count} documents")
+    
+    def _update(self, manifest: WHIIndexManifest, fingerprints) -> None:
+        """Embed only added or changed documents and drop removed ones."""
+        if manifest.is_current(WHIConfig.EMBEDDING_MODEL_NAME, fingerprints, WHIConfig.FAISS_INDEX_TYPE):
+            print("Vector store is up to date")
+            return
+        
+        to_embed, to_delete = manifest.diff(self.data_processor.create_documents())
+        print(f"Updating vector store: {len(to_embed)} to embed, {len(to_delete)} to remove")
+        
+        # Small updates are embedded in-process, starting a pool would cost more than it saves
+        batches = [to_embed[i:i + self.batch_size] for i in range(0, len(to_embed), self.batch_size)]
+        vectors = [v for _, v in self._embed_batches(iter(batches), use_pool=len(batches) > 1)]
+        if to_embed or to_delete:
+            self.vector_manager.update_vector_store(to_embed, to_delete, np.vstack(vectors) if vectors else None)
+        
+        manifest.apply(to_embed, to_delete, fingerprints)
+        manifest.save(WHIConfig.VECTOR_STORE_PATH)
+        self._clear_checkpoints()
+        print("Vector store update completed")
+    
+    def _embed_batches(self, batches: Iterator[List[Document]], use_pool: bool = True) -> Iterator[Tuple[List[Document], np.ndarray]]:
+        """Yield (documents, vectors) per batch, in order, reusing checkpoints from earlier runs."""
+        os.makedirs(self.checkpoint_dir, exist_ok=True)
+        self._started = time.perf_counter()
+        self._embedded = 0
+        
+        if not use_pool or self.workers <= 1:
+            for batch in batches:
+                path = self._checkpoint_path(batch)
+                if os.path.exists(path):
+                    yield batch, np.load(path)
+                else:
+                    vectors = np.asarray(self.vector_manager.embeddings.embed_documents([doc.page_content for doc in batch]), dtype=np.float32)
+                    self._save_checkpoint(path, vectors, len(batch))
+                    yield batch, vectors
+        else:
+            with self._executor() as executor:
+                pending = deque()  # (documents, checkpoint path, future or None) in input order
+                for batch in batches:
+                    path = self._checkpoint_path(batch)
+                    future = None
+                    if not os.path.exists(path):
+                        future = executor.submit(_embed_texts, [doc.page_content for doc in batch])
+                        # Checkpoint as soon as the batch finishes, not when it is consumed
+                        future.add_done_callback(self._checkpoint_callback(path, len(batch)))
+                    pending.append((batch, path, future))
+                    
+                    # Bound the number of batches held in memory
+                    while len(pending) >= self.workers * 2:
+                        yield self._collect(*pending.popleft())
+                
+                while pending:
+                    yield self._collect(*pending.popleft())
+        
+        if self._embedded:
+            elapsed = time.perf_counter() - self._started
+            print(f"Embedded {self._embedded} documents in {elapsed:.1f}s ({self._embedded / elapsed:.1f} docs/sec)")
+    
+    def _collect(self, batch: List[Document], path: str, future) -> Tuple[List[Document], np.ndarray]:
+        """Wait for a batch's vectors, loading them from the checkpoint if it was already embedded."""
+        if future is None:
+            return batch, np.load(path)
+        return batch, future.result()
+    
+    def _checkpoint_callback(self, path: str, count: int):
+        """Future callback that checkpoints a finished batch."""
+        def save(future):
+            if not future.cancelled() and future.exception() is None:
+                with self._progress_lock:
+                    self._save_checkpoint(path, future.result(), count)
+        return save
+    
+    def _save_checkpoint(self, path: str, vectors: np.ndarray, count: int) -> None:
+        """Write batch vectors atomically and report throughput."""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, vectors)
+        os.replace(tmp_path, path)
+        
+        self._embedded += count
+        elapsed = time.perf_counter() - self._started
+        print(f"  embedded {self._embedded} documents, {self._embedded / max(elapsed, 1e-9):.1f} docs/sec")
+    
+    def _executor(self) -> ProcessPoolExecutor:
+        """Process pool whose workers each load the embedding model once."""
+        # Spawn rather than fork, the parent process already holds torch threads
+        threads = max(1, (os.cpu_count() or 1) // self.workers)
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(WHIConfig.EMBEDDING_MODEL_NAME, threads)
+        )
+    
+    def _checkpoint_path(self, batch: List[Document]) -> str:
+        """Checkpoint file named after the model and the batch contents."""
+        digest = hashlib.sha1(WHIConfig.EMBEDDING_MODEL_NAME.encode("utf-8"))
+        for doc in batch:
+            digest.update(WHIIndexManifest.content_hash(doc).encode("ascii"))
+        return os.path.join(self.checkpoint_dir, f"{digest.hexdigest()}.npy")
+    
+    def _clear_checkpoints(self) -> None:
+        """Remove partial vectors once the index has been saved."""
+        shutil.rmtree(self.checkpoint_dir, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or update the WHI FAISS vector store.")
+    parser.add_argument("--workers", type=int, default=WHIConfig.EMBEDDING_WORKERS, help="embedding processes")
+    parser.add_argument("--batch-size", type=int, default=WHIConfig.DOCUMENT_BATCH_SIZE, help="documents per batch and checkpoint")
+    parser.add_argument("--checkpoint-dir", default=None, help="directory for partial vectors")
+    parser.add_argument("--full", action="store_true", help="ignore the existing index and rebuild from scratch")
+    args = parser.parse_args()
+    
+    WHIIndexBuilder(args.batch_size, args.workers, args.checkpoint_dir).build(full=args.full)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+import faiss
+import numpy as np
+from config.settings import WHIConfig
+
+# Index types selectable through WHIConfig.FAISS_INDEX_TYPE
+INDEX_TYPES = ("flat", "ivf_flat", "hnsw", "ivf_pq", "sq_fp16")
+# Index types whose stored vectors can be reconstructed exactly
+LOSSLESS_TYPES = ("flat", "ivf_flat", "hnsw")
+
+# k-means needs this many training points per centroid to be stable
+MIN_POINTS_PER_CENTROID = 39
+
+def create_index(vectors: np.ndarray, index_type: str = None) -> faiss.Index:
+    """Create an empty FAISS index of the configured type, trained on ``vectors`` when required."""
+    index_type = index_type or WHIConfig.FAISS_INDEX_TYPE
+    if index_type not in INDEX_TYPES:
+        raise Exception(f"Unknown FAISS index type '{index_type}', expected one of {', '.join(INDEX_TYPES)}")
+    
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    n_vectors, dim = vectors.shape
+    
+    if index_type == "flat":
+        index = faiss.IndexFlatL2(dim)
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, WHIConfig.FAISS_HNSW_M)
+        index.hnsw.efConstruction = WHIConfig.FAISS_HNSW_EF_CONSTRUCTION
+    elif index_type == "sq_fp16":
+        index = faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_fp16)
+    else:
+        # Keep enough training points per inverted list for small catalogs
+        nlist = max(1, min(WHIConfig.FAISS_IVF_NLIST, n_vectors // MIN_POINTS_PER_CENTROID))
+        quantizer = faiss.IndexFlatL2(dim)
+        if index_type == "ivf_flat":
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist)
+        else:
+            if dim % WHIConfig.FAISS_PQ_M != 0:
+                raise Exception(f"FAISS_PQ_M={WHIConfig.FAISS_PQ_M} must divide the embedding dimension {dim}")
+            if n_vectors < (1 << WHIConfig.FAISS_PQ_NBITS):
+                raise Exception(f"ivf_pq needs at least {1 << WHIConfig.FAISS_PQ_NBITS} vectors to train, got {n_vectors}")
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, WHIConfig.FAISS_PQ_M, WHIConfig.FAISS_PQ_NBITS)
+    
+    if not index.is_trained:
+        index.train(vectors)
+    configure_search(index)
+    return index
+
+def training_sample_size(index_type: str = None) -> int:
+    """Vectors to collect before creating an index of this type, 0 when it needs no training."""
+    index_type = index_type or WHIConfig.FAISS_INDEX_TYPE
+    if index_type in ("ivf_flat", "ivf_pq"):
+        return max(WHIConfig.FAISS_TRAINING_SAMPLE_SIZE, 1 << WHIConfig.FAISS_PQ_NBITS)
+    return 0
+
+def configure_search(index: faiss.Index) -> None:
+    """Apply the configured query-time parameters (nprobe, efSearch) to a built or loaded index."""
+    if isinstance(index, faiss.IndexIVF):
+        index.nprobe = min(WHIConfig.FAISS_IVF_NPROBE, index.nlist)
+    elif isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = WHIConfig.FAISS_HNSW_EF_SEARCH
+
+def index_type_of(index: faiss.Index) -> str:
+    """Name of the index type an existing index was built as."""
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(index, faiss.IndexIVFFlat):
+        return "ivf_flat"
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexScalarQuantizer):
+        return "sq_fp16"
+    return "flat"
+
+def supports_removal(index: faiss.Index) -> bool:
+    """Whether removing vectors renumbers the rest contiguously, as LangChain's delete assumes.
+    
+    Only flat-code indexes (flat, sq_fp16) do; IVF keeps the old labels and HNSW
+    cannot remove at all, so those are rebuilt with ``empty_copy`` instead.
+    """
+    return isinstance(index, faiss.IndexFlatCodes)
+
+def empty_copy(index: faiss.Index) -> faiss.Index:
+    """Copy of an index keeping its training (coarse quantizer, codebooks) but no vectors."""
+    copy = faiss.clone_index(index)
+    copy.reset()
+    configure_search(copy)
+    return copy
+
+def reconstruct_all(index: faiss.Index) -> np.ndarray:
+    """Stored vectors in label order; approximate for ivf_pq and sq_fp16."""
+    if isinstance(index, faiss.IndexIVF):
+        index.make_direct_map()
+    return index.reconstruct_n(0, index.ntotal)
+
+def reconstruct_positions(index: faiss.Index, positions: np.ndarray) -> np.ndarray:
+    """Stored vectors at the given labels; approximate for ivf_pq and sq_fp16."""
+    if isinstance(index, faiss.IndexIVF):
+        index.make_direct_map()
+    return index.reconstruct_batch(np.ascontiguousarray(positions, dtype=np.int64))
+
+def filtered_search_parameters(index: faiss.Index, selector: faiss.IDSelector) -> faiss.SearchParameters:
+    """Search parameters restricting a search to ``selector``, keeping the configured nprobe/efSearch.
+    
+    Parameters passed to ``search`` replace the index's own settings, so they are copied over.
+    """
+    if isinstance(index, faiss.IndexIVF):
+        return faiss.SearchParametersIVF(sel=selector, nprobe=index.nprobe)
+    if isinstance(index, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=index.hnsw.efSearch)
+    return faiss.SearchParameters(sel=selector)
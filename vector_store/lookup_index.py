@@ -0,0 +1,115 @@
+import re
+from bisect import bisect_left
+from typing import TYPE_CHECKING, Dict, List, Tuple
+
+if TYPE_CHECKING:
+    from langchain_core.documents import Document
+
+class WHILookupIndex:
+    """In-memory exact and prefix index over WHI accessions and variable names."""
+    
+    ACCESSION_PATTERN = re.compile(r'\b(ph[vts]\d{4,8})(?:\.v\d+)?(?:\.p\d+)?\b', re.IGNORECASE)
+    TOKEN_PATTERN = re.compile(r'\b[A-Za-z][A-Za-z0-9_]*\b')
+    QUOTED_PATTERN = re.compile(r'[`\'"]([A-Za-z][A-Za-z0-9_]*)[`\'"]')
+    IDENTIFIER_CHARS = re.compile(r'[\d_]')
+    
+    def __init__(self, data_processor):
+        self.data_processor = data_processor
+        self._index: Dict[str, List[Tuple[str, int]]] = {}  # key -> [("variable" | "dataset", document position)]
+        self._sorted_keys: List[str] = []
+    
+    def build(self) -> None:
+        """Build the index from the processor's loaded data."""
+        mesa_data = self.data_processor.mesa_data
+        dataset_desc = self.data_processor.dataset_desc
+        index: Dict[str, List[Tuple[str, int]]] = {}
+        
+        # Dataset descriptions first so dataset accessions list their description before variables
+        for pos, (dataset_acc, study) in enumerate(zip(
+            dataset_desc['Dataset accession'].to_numpy(),
+            dataset_desc['Study'].to_numpy()
+        )):
+            index.setdefault(str(dataset_acc).lower(), []).append(("dataset", pos))
+            index.setdefault(str(study).lower(), []).append(("dataset", pos))
+        
+        # Rows sharing a merged definition point at the same variable document
+        for pos, variable_acc, variable_name, dataset_acc in zip(
+            self.data_processor.variable_document_of_row.tolist(),
+            mesa_data['Variable accession'].to_numpy(),
+            mesa_data['Variable name'].to_numpy(),
+            mesa_data['Dataset accession'].to_numpy()
+        ):
+            index.setdefault(str(variable_acc).lower(), []).append(("variable", pos))
+            index.setdefault(str(variable_name).lower(), []).append(("variable", pos))
+            index.setdefault(str(dataset_acc).lower(), []).append(("variable", pos))
+        index = {key: list(dict.fromkeys(refs)) for key, refs in index.items()}
+        
+        self._index = index
+        self._sorted_keys = sorted(index)
+    
+    def lookup(self, key: str) -> List[Tuple[str, int]]:
+        """Return document references for an exact key."""
+        return self._index.get(key.lower(), [])
+    
+    def prefix_lookup(self, prefix: str, limit: int = 50) -> List[str]:
+        """Return up to ``limit`` index keys starting with ``prefix``."""
+        prefix = prefix.lower()
+        start = bisect_left(self._sorted_keys, prefix)
+        keys = []
+        for key in self._sorted_keys[start:start + limit]:
+            if not key.startswith(prefix):
+                break
+            keys.append(key)
+        return keys
+    
+    def extract_identifiers(self, question: str) -> List[str]:
+        """Extract accession and variable-name keys mentioned in the question, in order."""
+        identifiers = []
+        
+        for match in self.ACCESSION_PATTERN.finditer(question):
+            key = match.group(1).lower()
+            # Studies only describe where to look, they are handled by routing rather than lookup
+            if not key.startswith("phs") and key in self._index and key not in identifiers:
+                identifiers.append(key)
+        
+        # Names like "dead", "club", "MI" or "BMI" are also plain words or acronyms, so
+        # purely alphabetic tokens only count when quoted
+        quoted = {match.group(1).lower() for match in self.QUOTED_PATTERN.finditer(question)}
+        for match in self.TOKEN_PATTERN.finditer(question):
+            key = match.group(0).lower()
+            if key.startswith(("phv", "pht", "phs")) or key not in self._index or key in identifiers:
+                continue
+            if not (key in quoted or self.IDENTIFIER_CHARS.search(key)):
+                continue
+            identifiers.append(key)
+        
+        return identifiers
+    
+    @staticmethod
+    def names_accession(identifiers: List[str]) -> bool:
+        """Whether the identifiers include a variable or dataset accession, which needs no search beyond the lookup."""
+        return any(key.startswith(("phv", "pht")) for key in identifiers)
+    
+    def search(self, question: str, k: int, identifiers: List[str] = None) -> List["Document"]:
+        """Return up to ``k`` documents for identifiers named in the question (or given, from ``extract_identifiers``)."""
+        if identifiers is None:
+            identifiers = self.extract_identifiers(question)
+        # Interleave hits so every identifier is represented even if one has hundreds of rows
+        ref_lists = [self._index[key] for key in identifiers]
+        refs = []
+        seen = set()
+        depth = 0
+        while len(refs) < k and any(depth < len(ref_list) for ref_list in ref_lists):
+            for ref_list in ref_lists:
+                if len(refs) < k and depth < len(ref_list) and ref_list[depth] not in seen:
+                    seen.add(ref_list[depth])
+                    refs.append(ref_list[depth])
+            depth += 1
+        
+        documents = []
+        for kind, pos in refs:
+            if kind == "variable":
+                documents.append(self.data_processor.get_variable_document(pos))
+            else:
+                documents.append(self.data_processor.get_dataset_document(pos))
+        return documents
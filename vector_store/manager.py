@@ -1,47 +1,433 @@
-from langchain_community.vectorstores import FAISS
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain.schema import Document
-from typing import List, Optional
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, List, Optional, Tuple
+import asyncio
+import os
+import threading
+import time
+import numpy as np
 from config.settings import WHIConfig
+from vector_store.artifact import WHIVectorArtifact
+from vector_store.partitions import WHIIndexPartitions
+from vector_store.sparse_index import WHISparseIndex
+from vector_store.manifest import WHIIndexManifest
+from monitoring.metrics import METRICS, add_to_request
+
+# sentence-transformers (torch), FAISS and langchain_core are imported at first use,
+# so importing this module stays cheap
+if TYPE_CHECKING:
+    from langchain_core.documents import Document
 
 class WHIVectorStoreManager:
     """WHI vector store manager for document retrieval."""
     
-    def __init__(self):
-        self.embeddings = HuggingFaceEmbeddings(
-            model_name="sentence-transformers/all-MiniLM-L6-v2"
-        )
-        self.vector_store: Optional[FAISS] = None
+    def __init__(self, embeddings=None):
+        """``embeddings`` replaces the configured embedding model, e.g. with a small fake in tests."""
+        if embeddings is None:
+            from langchain_huggingface import HuggingFaceEmbeddings
+            embeddings = HuggingFaceEmbeddings(
+                model_name=WHIConfig.EMBEDDING_MODEL_NAME
+            )
+        self.embeddings = embeddings
+        self.artifact: Optional[WHIVectorArtifact] = None
+        self.sparse_index: Optional[WHISparseIndex] = None
+        self.partitions: Optional[WHIIndexPartitions] = None
+        self._query_vectors = OrderedDict()  # query string -> embedding, least recently used first
+        self._query_lock = threading.Lock()
+        self._query_hits = 0
+        self._query_misses = 0
     
-    def create_vector_store(self, documents: List[Document]) -> None:
-        """Create vector store from documents."""
-        self.vector_store = FAISS.from_documents(
-            documents=documents,
-            embedding=self.embeddings
-        )
-        self.save_vector_store()
+    def create_vector_store(self, documents: List["Document"], vectors: np.ndarray = None) -> None:
+        """Create vector store from documents, stored under their accession keys.
+        
+        The FAISS index type follows ``WHIConfig.FAISS_INDEX_TYPE`` and is trained on
+        the document vectors. Precomputed ``vectors`` (one row per document) skip the
+        embedding step.
+        """
+        from vector_store import faiss_index
+        if vectors is None:
+            vectors = self.embeddings.embed_documents([doc.page_content for doc in documents])
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        index = faiss_index.create_index(vectors)
+        index.add(vectors)
+        self._save(index, [WHIIndexManifest.document_key(doc) for doc in documents], documents)
+    
+    def create_vector_store_from_batches(self, batches: Iterable[Tuple[List["Document"], np.ndarray]], on_batch: Callable[[List["Document"]], None] = None) -> int:
+        """Create the vector store from (documents, vectors) batches, adding each one as it arrives.
+        
+        Documents are written to disk batch by batch and vectors go straight into the index;
+        only index types that need training hold a bounded sample of vectors until it is trained.
+        ``on_batch`` is called with every batch once it is stored. Returns the document count.
+        """
+        from vector_store import faiss_index
+        writer = WHIVectorArtifact.writer(WHIConfig.VECTOR_STORE_PATH)
+        sample_size = faiss_index.training_sample_size()
+        index, sample = None, []
+        try:
+            for documents, vectors in batches:
+                vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+                writer.add([WHIIndexManifest.document_key(doc) for doc in documents], documents)
+                if on_batch:
+                    on_batch(documents)
+                if index is not None:
+                    index.add(vectors)
+                    continue
+                sample.append(vectors)
+                if sum(len(v) for v in sample) >= sample_size:
+                    index = self._train_index(sample)
+                    sample = []
+            if index is None:
+                if not sample:
+                    raise Exception("No documents to index")
+                index = self._train_index(sample)  # Smaller than the training sample
+            writer.commit(index)
+        except BaseException:
+            writer.abort()
+            raise
+        self.artifact = WHIVectorArtifact.open(WHIConfig.VECTOR_STORE_PATH)
+        return writer.count
+    
+    @staticmethod
+    def _train_index(sample: List[np.ndarray]):
+        """Index of the configured type trained on, and holding, the sampled vectors."""
+        from vector_store import faiss_index
+        vectors = np.vstack(sample)
+        index = faiss_index.create_index(vectors)
+        index.add(vectors)
+        return index
+    
+    def update_vector_store(self, to_embed: List["Document"], to_delete: List[str], vectors: np.ndarray = None) -> None:
+        """Incrementally remove stale documents and add new or changed ones."""
+        from vector_store import faiss_index
+        if not self.artifact:
+            raise Exception("Vector store not initialized")
+        
+        stored = self.artifact.documents_with_ids()
+        ids = [doc_id for doc_id, _ in stored]
+        documents = [doc for _, doc in stored]
+        index = self.artifact.writable_index()
+        
+        if to_delete:
+            deleted = set(to_delete)
+            keep = [pos for pos, doc_id in enumerate(ids) if doc_id not in deleted]
+            if faiss_index.supports_removal(index):
+                index.remove_ids(np.asarray([pos for pos, doc_id in enumerate(ids) if doc_id in deleted], dtype=np.int64))
+            else:
+                # IVF keeps the old labels and HNSW cannot remove at all: re-add the
+                # remaining vectors to an empty copy, keeping its training
+                kept_vectors = faiss_index.reconstruct_all(index)[keep]
+                index = faiss_index.empty_copy(index)
+                index.add(kept_vectors)
+            ids = [ids[pos] for pos in keep]
+            documents = [documents[pos] for pos in keep]
+        
+        if to_embed:
+            if vectors is None:
+                vectors = self.embeddings.embed_documents([doc.page_content for doc in to_embed])
+            index.add(np.ascontiguousarray(vectors, dtype=np.float32))
+            ids += [WHIIndexManifest.document_key(doc) for doc in to_embed]
+            documents += to_embed
+        
+        self._save(index, ids, documents)
+    
+    def rebuild_index(self, index_type: str = None) -> None:
+        """Re-index the stored vectors as another FAISS index type without re-embedding."""
+        from vector_store import faiss_index
+        if not self.artifact:
+            raise Exception("Vector store not initialized")
+        
+        vectors = np.ascontiguousarray(faiss_index.reconstruct_all(self.artifact.index), dtype=np.float32)
+        index = faiss_index.create_index(vectors, index_type)
+        index.add(vectors)
+        stored = self.artifact.documents_with_ids()
+        self._save(index, [doc_id for doc_id, _ in stored], [doc for _, doc in stored])
     
     def load_vector_store(self) -> bool:
-        """Load existing vector store."""
+        """Load existing vector store, memory-mapping the index."""
+        from vector_store import faiss_index
         try:
-            self.vector_store = FAISS.load_local(
-                WHIConfig.VECTOR_STORE_PATH,
-                self.embeddings,
-                allow_dangerous_deserialization=True
-            )
+            self.artifact = WHIVectorArtifact.open(WHIConfig.VECTOR_STORE_PATH)
+            if self.artifact is None:
+                return False
+            faiss_index.configure_search(self.artifact.index)
+            self._build_sparse_index()
+            self._build_partitions()
+            self.load_query_cache()
             return True
-        except:
+        except Exception as e:
+            print(f"Failed to load vector store: {str(e)}")
+            self.artifact = None
+            return False
+    
+    def migrate_legacy_store(self) -> bool:
+        """Convert a pickled LangChain FAISS store to the memory-mapped artifact without re-embedding.
+        
+        Returns True if a legacy store was converted.
+        """
+        from langchain_community.vectorstores import FAISS
+        path = WHIConfig.VECTOR_STORE_PATH
+        legacy_files = [os.path.join(path, name) for name in WHIVectorArtifact.LEGACY_FILES]
+        if WHIVectorArtifact.exists(path) or not all(os.path.exists(f) for f in legacy_files):
             return False
+        
+        # Trusted because this application wrote it; the pickle is deleted once converted
+        store = FAISS.load_local(path, self.embeddings, allow_dangerous_deserialization=True)
+        ids = [store.index_to_docstore_id[pos] for pos in range(store.index.ntotal)]
+        WHIVectorArtifact.write(path, store.index, ids, [store.docstore.search(doc_id) for doc_id in ids])
+        return True
+    
+    def index_type(self) -> str:
+        """Type of the loaded FAISS index, one of ``faiss_index.INDEX_TYPES``."""
+        from vector_store import faiss_index
+        if not self.artifact:
+            raise Exception("Vector store not initialized")
+        return faiss_index.index_type_of(self.artifact.index)
+    
+    def _save(self, index, ids: List[str], documents: List["Document"]) -> None:
+        """Write the vector store and reopen it from disk."""
+        WHIVectorArtifact.write(WHIConfig.VECTOR_STORE_PATH, index, ids, documents)
+        self.artifact = WHIVectorArtifact.open(WHIConfig.VECTOR_STORE_PATH)
+        self._build_sparse_index()
+        self._build_partitions()
+    
+    def get_documents(self) -> List["Document"]:
+        """Return all stored documents in FAISS index order."""
+        return [doc for _, doc in self.get_documents_with_ids()]
+    
+    def get_documents_with_ids(self) -> List[Tuple[str, "Document"]]:
+        """Return (document id, document) pairs for all stored documents, in FAISS index order."""
+        if not self.artifact:
+            raise Exception("Vector store not initialized")
+        return self.artifact.documents_with_ids()
+    
+    def _build_sparse_index(self) -> None:
+        """Build the BM25 index over the documents held by the vector store."""
+        if not WHIConfig.HYBRID_SEARCH_ENABLED:
+            return
+        
+        self.sparse_index = WHISparseIndex()
+        self.sparse_index.build(list(self.artifact.texts()))
+    
+    def _build_partitions(self) -> None:
+        """Group the stored documents by type and database for filtered searches."""
+        if not WHIConfig.PARTITIONED_RETRIEVAL_ENABLED:
+            return
+        
+        self.partitions = WHIIndexPartitions(self.artifact)
     
-    def save_vector_store(self) -> None:
-        """Save vector store to disk."""
-        if self.vector_store:
-            self.vector_store.save_local(WHIConfig.VECTOR_STORE_PATH)
+    def similarity_search(self, query: str, k: int = None, lexical_query: str = None, filters: Dict[str, str] = None) -> List["Document"]:
+        """Perform similarity search, fused with BM25 results when hybrid search is enabled.
+        
+        ``lexical_query`` lets callers give the lexical search the full question while
+        the dense search uses a condensed keyword query. ``filters`` (metadata key ->
+        value, e.g. ``{"database": "mesa"}``) restrict the search to matching documents;
+        when fewer than k match, the filters are relaxed one at a time to fill the rest.
+        Filters on ``WHIConfig.SOFT_PARTITION_KEYS`` (the guessed document type) only
+        favour matching documents: the search restricted to them is fused with the one
+        without them, so a wrong guess cannot shut out the documents asked for.
+        """
+        if not self.artifact:
+            raise Exception("Vector store not initialized")
+        
+        k = k or WHIConfig.RETRIEVAL_K
+        hard, soft = self._split_filters(filters)
+        positions = []
+        for level in self._filter_levels(hard):
+            ranked = self._search_positions(query, k, lexical_query, level)
+            if soft:
+                narrowed = self._search_positions(query, k, lexical_query, {**(level or {}), **soft})
+                ranked = self._reciprocal_rank_fusion([(1.0, narrowed), (1.0, ranked)], k)
+            positions += [pos for pos in ranked if pos not in positions]
+            if len(positions) >= k:
+                break
+        return self._documents_at(positions[:k])
     
-    def similarity_search(self, query: str, k: int = None) -> List[Document]:
-        """Perform similarity search."""
-        if not self.vector_store:
+    async def asimilarity_search(self, query: str, k: int = None, lexical_query: str = None, filters: Dict[str, str] = None) -> List["Document"]:
+        """Perform similarity search in worker threads so the event loop stays free."""
+        if not self.artifact:
             raise Exception("Vector store not initialized")
         
         k = k or WHIConfig.RETRIEVAL_K
-        return self.vector_store.similarity_search(query, k=k)
\ No newline at end of file
+        hard, soft = self._split_filters(filters)
+        positions = []
+        for level in self._filter_levels(hard):
+            if soft:
+                narrowed, ranked = await asyncio.gather(
+                    self._asearch_positions(query, k, lexical_query, {**(level or {}), **soft}),
+                    self._asearch_positions(query, k, lexical_query, level)
+                )
+                ranked = self._reciprocal_rank_fusion([(1.0, narrowed), (1.0, ranked)], k)
+            else:
+                ranked = await self._asearch_positions(query, k, lexical_query, level)
+            positions += [pos for pos in ranked if pos not in positions]
+            if len(positions) >= k:
+                break
+        return await asyncio.to_thread(self._documents_at, positions[:k])
+    
+    def _search_positions(self, query: str, k: int, lexical_query: str, filters: Dict[str, str]) -> List[int]:
+        if not self._hybrid_ready():
+            return self._dense_search(query, k, filters)
+        
+        candidate_k = max(k, WHIConfig.HYBRID_CANDIDATE_K)
+        dense_positions = self._dense_search(query, candidate_k, filters)
+        sparse_positions = self._sparse_search(lexical_query or query, candidate_k, filters)
+        return self._fuse_rankings(dense_positions, sparse_positions, k)
+    
+    async def _asearch_positions(self, query: str, k: int, lexical_query: str, filters: Dict[str, str]) -> List[int]:
+        if not self._hybrid_ready():
+            return await asyncio.to_thread(self._dense_search, query, k, filters)
+        
+        # Run the dense and lexical searches concurrently
+        candidate_k = max(k, WHIConfig.HYBRID_CANDIDATE_K)
+        dense_positions, sparse_positions = await asyncio.gather(
+            asyncio.to_thread(self._dense_search, query, candidate_k, filters),
+            asyncio.to_thread(self._sparse_search, lexical_query or query, candidate_k, filters)
+        )
+        return self._fuse_rankings(dense_positions, sparse_positions, k)
+    
+    def _split_filters(self, filters: Dict[str, str]) -> Tuple[Optional[Dict[str, str]], Optional[Dict[str, str]]]:
+        """(hard, soft) filters on partitioned keys, None where there are none."""
+        if not filters or self.partitions is None:
+            return None, None
+        filters = self.partitions.applicable(filters)
+        hard = {key: value for key, value in filters.items() if key not in WHIConfig.SOFT_PARTITION_KEYS}
+        soft = {key: value for key, value in filters.items() if key in WHIConfig.SOFT_PARTITION_KEYS}
+        return hard or None, soft or None
+    
+    def _filter_levels(self, filters: Dict[str, str]) -> List[Optional[Dict[str, str]]]:
+        """Filters to search with in turn: all of them, then dropping the last partition key first, down to none."""
+        filters = self.partitions.applicable(filters) if filters and self.partitions is not None else None
+        if not filters:
+            return [None]
+        
+        levels = [filters]
+        for key in reversed(self.partitions.keys):
+            if key in levels[-1]:
+                levels.append({name: value for name, value in levels[-1].items() if name != key})
+        return [level or None for level in levels]
+    
+    def embed_query(self, query: str) -> np.ndarray:
+        """Embed a query, reusing the vector of an identical earlier query."""
+        with self._query_lock:
+            vector = self._query_vectors.get(query)
+            if vector is not None:
+                self._query_vectors.move_to_end(query)
+                self._query_hits += 1
+            else:
+                self._query_misses += 1
+        add_to_request("query_cache_hits" if vector is not None else "query_cache_misses", 1)
+        if vector is not None:
+            return vector
+        
+        start = time.perf_counter()
+        vector = np.asarray(self.embeddings.embed_query(query), dtype=np.float32)
+        self._observe_step("embed", start)
+        vector.flags.writeable = False  # Shared between callers
+        self._remember_query(query, vector)
+        return vector
+    
+    def query_cache_stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and hit rate of the query-embedding cache."""
+        with self._query_lock:
+            hits, misses, size = self._query_hits, self._query_misses, len(self._query_vectors)
+        return {
+            "hits": hits,
+            "misses": misses,
+            "size": size,
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0
+        }
+    
+    def load_query_cache(self, path: str = None) -> int:
+        """Warm the query-embedding cache from disk, returning the number of queries loaded."""
+        path = path or WHIConfig.QUERY_EMBEDDING_CACHE_PATH
+        if not path or not os.path.exists(path):
+            return 0
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                if str(data["model"]) != WHIConfig.EMBEDDING_MODEL_NAME:
+                    return 0
+                queries, vectors = data["queries"].tolist(), data["vectors"]
+        except Exception as e:
+            print(f"Failed to load query embedding cache: {str(e)}")
+            return 0
+        
+        for query, vector in zip(queries, vectors):
+            vector.flags.writeable = False
+            self._remember_query(query, vector)
+        return len(queries)
+    
+    def save_query_cache(self, path: str = None) -> None:
+        """Persist the cached query embeddings as the warm set for the next start."""
+        path = path or WHIConfig.QUERY_EMBEDDING_CACHE_PATH
+        with self._query_lock:
+            queries = list(self._query_vectors)
+            vectors = list(self._query_vectors.values())
+        if not path or not queries:
+            return
+        
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, model=WHIConfig.EMBEDDING_MODEL_NAME, queries=np.asarray(queries), vectors=np.vstack(vectors))
+        os.replace(tmp_path, path)
+    
+    def _remember_query(self, query: str, vector: np.ndarray) -> None:
+        with self._query_lock:
+            self._query_vectors[query] = vector
+            self._query_vectors.move_to_end(query)
+            while len(self._query_vectors) > WHIConfig.QUERY_EMBEDDING_CACHE_SIZE:
+                self._query_vectors.popitem(last=False)
+    
+    def _hybrid_ready(self) -> bool:
+        return WHIConfig.HYBRID_SEARCH_ENABLED and self.sparse_index is not None and self.sparse_index.is_ready
+    
+    def _dense_search(self, query: str, k: int, filters: Dict[str, str] = None) -> List[int]:
+        """Return FAISS positions of the k nearest documents, among those matching ``filters`` if given."""
+        if not self.artifact:
+            raise Exception("Vector store not initialized")
+        
+        vector = self.embed_query(query)
+        start = time.perf_counter()
+        if filters:
+            positions = self.partitions.search(vector, k, filters)
+        else:
+            _, found = self.artifact.index.search(vector[None, :], k)
+            positions = [int(pos) for pos in found[0] if pos != -1]
+        self._observe_step("dense", start)
+        return positions
+    
+    def _sparse_search(self, query: str, k: int, filters: Dict[str, str] = None) -> List[int]:
+        """Return FAISS positions of the k best BM25 matches, among those matching ``filters`` if given."""
+        start = time.perf_counter()
+        positions = self.sparse_index.search(query, k, self.partitions.positions(filters) if filters else None)
+        self._observe_step("sparse", start)
+        return positions
+    
+    @staticmethod
+    def _observe_step(step: str, start: float) -> None:
+        seconds = time.perf_counter() - start
+        METRICS.observe("whi_retrieval_step_duration_seconds", seconds, step=step)
+        add_to_request(f"{step}_ms", seconds * 1000)
+    
+    def _fuse_rankings(self, dense_positions: List[int], sparse_positions: List[int], k: int) -> List[int]:
+        """Merge the dense and lexical rankings."""
+        return self._reciprocal_rank_fusion([
+            (WHIConfig.HYBRID_DENSE_WEIGHT, dense_positions),
+            (WHIConfig.HYBRID_SPARSE_WEIGHT, sparse_positions)
+        ], k)
+    
+    @staticmethod
+    def _reciprocal_rank_fusion(rankings: List[Tuple[float, List[int]]], k: int) -> List[int]:
+        """Merge (weight, positions) rankings with weighted reciprocal-rank fusion."""
+        scores = {}
+        for weight, positions in rankings:
+            for rank, pos in enumerate(positions, 1):
+                scores[pos] = scores.get(pos, 0.0) + weight / (WHIConfig.HYBRID_RRF_K + rank)
+        
+        return sorted(scores, key=scores.get, reverse=True)[:k]
+    
+    def _documents_at(self, positions: List[int]) -> List["Document"]:
+        """Look up stored documents by FAISS position, reading only those rows."""
+        start = time.perf_counter()
+        documents = self.artifact.documents_at(positions)
+        self._observe_step("documents", start)
+        return documents
\ No newline at end of file
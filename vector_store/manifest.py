@@ -0,0 +1,134 @@
+import hashlib
+import json
+import os
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from langchain_core.documents import Document
+
+class WHIIndexManifest:
+    """Manifest stored next to the FAISS index describing what it was built from.
+
+    Tracks the embedding model, the FAISS index type, a fingerprint per source CSV
+    and, for every document key (variable or dataset accession), the docstore id and
+    content hash.
+    """
+    
+    FILENAME = "manifest.json"
+    VERSION = 1
+    
+    def __init__(self, embedding_model: str, data_files: Dict[str, str] = None, documents: Dict[str, List[str]] = None, index_type: str = "flat"):
+        self.embedding_model = embedding_model
+        self.index_type = index_type
+        self.data_files = data_files or {}  # path -> sha256 of file contents
+        self.documents = documents or {}  # document key -> [docstore id, content hash]
+    
+    @classmethod
+    def load(cls, directory: str) -> Optional["WHIIndexManifest"]:
+        """Load manifest from the vector store directory, None if missing or unreadable."""
+        try:
+            with open(os.path.join(directory, cls.FILENAME), encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") != cls.VERSION:
+                return None
+            return cls(data["embedding_model"], data.get("data_files"), data.get("documents"), data.get("index_type", "flat"))
+        except Exception:
+            return None
+    
+    def save(self, directory: str) -> None:
+        """Write manifest atomically into the vector store directory."""
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, self.FILENAME)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "version": self.VERSION,
+                "embedding_model": self.embedding_model,
+                "index_type": self.index_type,
+                "data_files": self.data_files,
+                "documents": self.documents
+            }, f)
+        os.replace(tmp_path, path)
+    
+    @staticmethod
+    def fingerprint_file(path: str) -> str:
+        """Return the sha256 of a file's contents."""
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        return digest.hexdigest()
+    
+    @classmethod
+    def fingerprint_files(cls, paths: List[str]) -> Dict[str, str]:
+        return {path: cls.fingerprint_file(path) for path in paths}
+    
+    @classmethod
+    def fingerprint_sources(cls, paths: List[str], document_format: str) -> Dict[str, str]:
+        """Fingerprints of the data files plus how documents are built from them."""
+        return {**cls.fingerprint_files(paths), "document_format": document_format}
+    
+    @staticmethod
+    def document_key(doc: "Document") -> str:
+        """Stable key of a document: its variable accession, or dataset accession for dataset rows."""
+        if doc.metadata.get("type") == "variable":
+            return str(doc.metadata["variable_accession"])
+        return str(doc.metadata["dataset_accession"])
+    
+    @staticmethod
+    def content_hash(doc: "Document") -> str:
+        """Hash of everything that ends up in the index for a document."""
+        payload = json.dumps([doc.page_content, doc.metadata], sort_keys=True, default=str)
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+    
+    @classmethod
+    def from_documents(cls, embedding_model: str, data_files: Dict[str, str], documents: List[Tuple[str, "Document"]], index_type: str = "flat") -> "WHIIndexManifest":
+        """Build a manifest from (docstore id, document) pairs."""
+        manifest = cls(embedding_model, data_files, index_type=index_type)
+        for doc_id, doc in documents:
+            manifest.documents[cls.document_key(doc)] = [doc_id, cls.content_hash(doc)]
+        return manifest
+    
+    def is_current(self, embedding_model: str, data_files: Dict[str, str], index_type: str) -> bool:
+        """Whether the index was built with this model and index type from exactly these files."""
+        return self.embedding_model == embedding_model and self.index_type == index_type and self.data_files == data_files
+    
+    def diff(self, documents: List["Document"]) -> Tuple[List["Document"], List[str]]:
+        """Compare with current documents.
+
+        Returns documents to embed (new or changed) and docstore ids to delete
+        (removed or superseded by a changed document).
+        """
+        to_embed = []
+        to_delete = []
+        current_keys = set()
+        
+        for doc in documents:
+            key = self.document_key(doc)
+            current_keys.add(key)
+            entry = self.documents.get(key)
+            if entry is None:
+                to_embed.append(doc)
+            elif entry[1] != self.content_hash(doc):
+                to_delete.append(entry[0])
+                to_embed.append(doc)
+        
+        for key, (doc_id, _) in self.documents.items():
+            if key not in current_keys:
+                to_delete.append(doc_id)
+        
+        return to_embed, to_delete
+    
+    def apply(self, embedded: List["Document"], deleted_ids: List[str], data_files: Dict[str, str]) -> None:
+        """Record an incremental update; embedded documents are stored under their key as id."""
+        deleted = set(deleted_ids)
+        if deleted:
+            self.documents = {key: entry for key, entry in self.documents.items() if entry[0] not in deleted}
+        self.record(embedded)
+        self.data_files = data_files
+    
+    def record(self, documents: List["Document"]) -> None:
+        """Record documents stored under their key as docstore id."""
+        for doc in documents:
+            key = self.document_key(doc)
+            self.documents[key] = [key, self.content_hash(doc)]
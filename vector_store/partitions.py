@@ -0,0 +1,86 @@
+import threading
+from typing import Dict, List, Tuple
+import numpy as np
+from config.settings import WHIConfig
+
+class WHIIndexPartitions:
+    """Stored documents grouped by metadata value (type, database) for filtered searches.
+
+    Partitions up to ``WHIConfig.PARTITION_INDEX_MAX_SIZE`` documents, such as the
+    dataset descriptions, get their own flat index built from the stored vectors, so
+    a search only scans them. Larger ones are searched in the memory-mapped main index
+    restricted by a FAISS ID selector, so their vectors are not copied per worker.
+    """
+    
+    def __init__(self, artifact, keys: Tuple[str, ...] = None):
+        self.artifact = artifact
+        self.keys = ()  # Keys set on every document; filters on other keys are ignored
+        self._positions: Dict[Tuple[str, str], np.ndarray] = {}  # (key, value) -> sorted positions
+        for key in keys or WHIConfig.PARTITION_KEYS:
+            values = np.asarray(artifact.metadata_values(key), dtype=object)
+            missing = sum(value is None for value in values)
+            if missing:
+                print(f"⚠️ {missing} stored documents have no '{key}' metadata, searches are not filtered on it; "
+                      f"rebuild with `python -m vector_store.build --full` to enable it")
+                continue
+            self.keys += (key,)
+            for value in set(values):
+                self._positions[(key, value)] = np.flatnonzero(values == value).astype(np.int64)
+        self._searchers = {}  # Sorted filter items -> (positions, flat sub-index or None, search parameters or None)
+        self._lock = threading.Lock()
+    
+    def sizes(self) -> Dict[str, int]:
+        """Document count per partition, as "key=value"."""
+        return {f"{key}={value}": len(positions) for (key, value), positions in sorted(self._positions.items())}
+    
+    def applicable(self, filters: Dict[str, str]) -> Dict[str, str]:
+        """The filters on partitioned keys."""
+        return {key: value for key, value in filters.items() if key in self.keys}
+    
+    def positions(self, filters: Dict[str, str]) -> np.ndarray:
+        """Sorted positions of the documents matching every filter (metadata key -> value)."""
+        result = None
+        for key, value in filters.items():
+            positions = self._positions.get((key, str(value)), np.empty(0, dtype=np.int64))
+            result = positions if result is None else np.intersect1d(result, positions, assume_unique=True)
+        return result if result is not None else np.arange(len(self.artifact), dtype=np.int64)
+    
+    def search(self, vector: np.ndarray, k: int, filters: Dict[str, str]) -> List[int]:
+        """FAISS positions of the k nearest documents matching ``filters``."""
+        positions, sub_index, parameters = self._searcher(filters)
+        k = min(k, len(positions))
+        if k == 0:
+            return []
+        if sub_index is not None:
+            _, found = sub_index.search(vector[None, :], k)
+            return [int(positions[i]) for i in found[0] if i != -1]
+        _, found = self.artifact.index.search(vector[None, :], k, params=parameters[0])
+        return [int(pos) for pos in found[0] if pos != -1]
+    
+    def _searcher(self, filters: Dict[str, str]):
+        key = tuple(sorted(filters.items()))
+        with self._lock:
+            searcher = self._searchers.get(key)
+        if searcher is None:
+            searcher = self._build_searcher(filters)
+            with self._lock:
+                searcher = self._searchers.setdefault(key, searcher)
+        return searcher
+    
+    def _build_searcher(self, filters: Dict[str, str]):
+        import faiss
+        from vector_store import faiss_index
+        index = self.artifact.index
+        positions = self.positions(filters)
+        if len(positions) <= WHIConfig.PARTITION_INDEX_MAX_SIZE:
+            sub_index = faiss.IndexFlat(index.d, index.metric_type)
+            if len(positions):
+                sub_index.add(np.ascontiguousarray(faiss_index.reconstruct_positions(index, positions), dtype=np.float32))
+            return positions, sub_index, None
+        
+        # The selector reads this bitmap without owning it, so both are kept with the parameters
+        bitmap = np.zeros(len(self.artifact), dtype=bool)
+        bitmap[positions] = True
+        bitmap = np.packbits(bitmap, bitorder="little")
+        selector = faiss.IDSelectorBitmap(len(bitmap), faiss.swig_ptr(bitmap))
+        return positions, None, (faiss_index.filtered_search_parameters(index, selector), selector, bitmap)
@@ -0,0 +1,62 @@
+import numpy as np
+from typing import List, Optional
+from config.settings import WHIConfig
+
+class WHISparseIndex:
+    """BM25 lexical index over the same documents as the FAISS store."""
+    
+    def __init__(self, k1: float = None, b: float = None):
+        self.k1 = k1 if k1 is not None else WHIConfig.BM25_K1
+        self.b = b if b is not None else WHIConfig.BM25_B
+        from sklearn.feature_extraction.text import CountVectorizer  # Imported at first use, scikit-learn is slow to import
+        self.vectorizer = CountVectorizer(
+            lowercase=True,
+            token_pattern=r"(?u)\b\w+\b",
+            stop_words="english",
+            dtype=np.float32
+        )
+        self._weights = None  # CSC matrix (documents x terms) of BM25 term weights
+    
+    def build(self, texts: List[str]) -> None:
+        """Build BM25 weights for texts, row i corresponding to FAISS position i."""
+        counts = self.vectorizer.fit_transform(texts).tocsr()
+        n_docs = counts.shape[0]
+        
+        doc_lengths = np.asarray(counts.sum(axis=1)).ravel()
+        avg_length = doc_lengths.mean() if n_docs else 0.0
+        doc_freq = np.bincount(counts.indices, minlength=counts.shape[1])
+        idf = np.log1p((n_docs - doc_freq + 0.5) / (doc_freq + 0.5)).astype(np.float32)
+        
+        # Saturate term frequencies in place: tf * (k1 + 1) / (tf + k1 * (1 - b + b * dl / avgdl))
+        row_norms = self.k1 * (1 - self.b + self.b * doc_lengths / max(avg_length, 1e-9))
+        row_of_entry = np.repeat(np.arange(n_docs), np.diff(counts.indptr))
+        tf = counts.data
+        counts.data = tf * (self.k1 + 1) / (tf + row_norms[row_of_entry]) * idf[counts.indices]
+        
+        self._weights = counts.tocsc()
+    
+    @property
+    def is_ready(self) -> bool:
+        return self._weights is not None
+    
+    def search(self, query: str, k: int, positions: Optional[np.ndarray] = None) -> List[int]:
+        """Return positions of the top-k documents for query, best first, only among ``positions`` if given."""
+        if self._weights is None:
+            return []
+        
+        term_ids = self.vectorizer.transform([query]).indices
+        if len(term_ids) == 0:
+            return []
+        
+        scores = np.asarray(self._weights[:, term_ids].sum(axis=1)).ravel()
+        if positions is not None:
+            scores = scores[positions]
+        k = min(k, int(np.count_nonzero(scores)))
+        if k == 0:
+            return []
+        
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        if positions is not None:
+            top = positions[top]
+        return [int(pos) for pos in top]